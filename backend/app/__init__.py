@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, send_from_directory, send_file
+from flask import Flask, jsonify, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
@@ -6,6 +6,7 @@ from flask_jwt_extended import JWTManager
 import os
 from .config import Config
 import logging
+import time
 from flask_marshmallow import Marshmallow
 
 # Set up logging
@@ -19,6 +20,7 @@ ma = Marshmallow()
 jwt = JWTManager()
 
 def create_app(config_class=Config):
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
     
@@ -108,6 +110,14 @@ def create_app(config_class=Config):
     # Cấu hình CORS
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
     
+    # Hàng đợi bcrypt đầy: báo client thử lại thay vì để request chờ
+    from app.utils.bcrypt_pool import PasswordHasherBusy
+    
+    @app.errorhandler(PasswordHasherBusy)
+    def handle_password_hasher_busy(e):
+        app.logger.warning(f"Rejected request, bcrypt queue is full: {request.path}")
+        return jsonify({"error": "Hệ thống đang bận, vui lòng thử lại sau"}), 503, {'Retry-After': '1'}
+    
     # Global error handler
     @app.errorhandler(Exception)
     def handle_exception(e):
@@ -143,30 +153,63 @@ def create_app(config_class=Config):
     app.register_blueprint(debug.bp)
     app.register_blueprint(chatbot_blueprint, url_prefix='/api/chatbot')
     
-    # Route đơn giản để phục vụ file ảnh từ thư mục uploads
+    # Phục vụ file ảnh từ thư mục uploads (cache immutable, ETag, Range; không log từng request)
+    from app.utils.static_files import send_upload, send_static
+    
     @app.route('/uploads/<path:filename>')
     def serve_upload(filename):
-        app.logger.info(f"Serving file: {filename}")
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return send_upload(filename)
     
     # Route API để phục vụ file ảnh từ thư mục uploads
     @app.route('/api/uploads/<path:filename>')
     def serve_upload_api(filename):
-        app.logger.info(f"Serving file via API: {filename}")
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return send_upload(filename)
     
     # Phục vụ file tĩnh từ thư mục static
     @app.route('/static/<path:filename>')
     def serve_static(filename):
-        app.logger.info(f"Serving static file: {filename}")
-        return send_from_directory(app.static_folder, filename)
+        return send_static(app.static_folder, filename)
     
     # Tạo bảng database khi khởi chạy
     with app.app_context():
         db.create_all()
         
+        # Đồng bộ closure table của danh mục nếu dữ liệu được ghi trực tiếp (seed script, DB cũ)
+        from app.models.category import CategoryClosure
+        if CategoryClosure.ensure_built():
+            app.logger.info("Rebuilt category closure table")
+        
+        # Đồng bộ bảng thống kê đơn hàng theo ngày nếu đơn hàng được ghi mà không cập nhật nó
+        if app.config.get('ORDER_STATS_ROLLUP'):
+            from app.models.order_stats import OrderStatsDaily
+            if OrderStatsDaily.ensure_built():
+                app.logger.info("Rebuilt daily order stats")
+        
+        # Chọn backend tìm kiếm ngay khi khởi động để log backend thực sự được dùng
+        # (chỉ mục trong bộ nhớ vẫn chỉ được dựng ở lần tìm kiếm đầu tiên của mỗi worker)
+        from app.search import get_search_backend
+        get_search_backend()
+        
         # Log thông tin về thư mục uploads
         app.logger.info(f"Upload folder path: {app.config['UPLOAD_FOLDER']}")
         app.logger.info(f"Upload folder exists: {os.path.exists(app.config['UPLOAD_FOLDER'])}")
+        
+        # Đóng kết nối đã mở khi khởi động để các worker được fork (preload_app) không dùng chung socket
+        db.session.remove()
+        db.engine.dispose()
+    
+    # Chatbot: chỉ tải khi được bật; preload embedding model trước khi gunicorn fork worker
+    from app.chatbot.loader import loader as chatbot_loader
+    chatbot_loader.configure(app.config.get('CHATBOT_ENABLED', True))
+    chatbot_seconds = None
+    if app.config.get('CHATBOT_ENABLED') and app.config.get('CHATBOT_PRELOAD'):
+        try:
+            chatbot_seconds = chatbot_loader.preload_model()
+        except Exception as e:
+            app.logger.error(f"Failed to preload chatbot model: {str(e)}")
+    
+    chatbot_info = 'disabled' if not app.config.get('CHATBOT_ENABLED') else (
+        f"model preloaded in {chatbot_seconds:.2f}s" if chatbot_seconds is not None else 'lazy')
+    app.logger.info(f"Application created in {time.perf_counter() - started:.2f}s (chatbot: {chatbot_info})")
     
     return app
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Semantic answer cache for the chatbot
+
+Questions are matched by cosine similarity of the query embedding the chatbot
+already computes for retrieval, so rephrasings of the same FAQ ("phí ship bao
+nhiêu?" / "phí vận chuyển là bao nhiêu") reuse one LLM answer. Entries expire
+after a TTL and the whole cache is dropped when the knowledge base index is
+rebuilt. Only answers generated without conversation history are cached, since
+a follow-up question depends on its context.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Bounded cache of (normalized question embedding -> answer)"""
+
+    def __init__(self, threshold=0.92, ttl=3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors = None            # (max_entries, dim) float32, rows [0, size) in use
+        self._expires = np.zeros(max_entries, dtype=np.float64)   # expires_at của từng dòng
+        self._entries = []              # [{'question', 'answer', 'sources', 'expires_at', 'last_used', 'hits'}]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, index):
+        """Xóa entry tại index bằng cách đưa entry cuối vào chỗ trống"""
+        last = len(self._entries) - 1
+        if index != last:
+            self._vectors[index] = self._vectors[last]
+            self._expires[index] = self._expires[last]
+            self._entries[index] = self._entries[last]
+        self._entries.pop()
+
+    def lookup(self, vector):
+        """
+        Tìm câu trả lời cho câu hỏi gần nhất có độ tương đồng >= threshold
+
+        Entry đã hết hạn bị loại trước khi chọn câu gần nhất, nên một entry hết
+        hạn không che mất entry còn hạn đứng ngay sau nó; store() dọn chúng.
+
+        Returns:
+            dict | None: {'answer', 'sources', 'question', 'similarity'}
+        """
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            size = len(self._entries)
+            if size:
+                similarities = np.where(self._expires[:size] > now, self._vectors[:size] @ query, -np.inf)
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                if similarity >= self.threshold:
+                    entry = self._entries[best]
+                    entry['last_used'] = now
+                    entry['hits'] += 1
+                    self.hits += 1
+                    return {
+                        'answer': entry['answer'],
+                        'sources': entry['sources'],
+                        'question': entry['question'],
+                        'similarity': similarity
+                    }
+            self.misses += 1
+            return None
+
+    def store(self, vector, question, answer, sources=None):
+        vector = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._entries = []
+
+            # Câu hỏi gần như trùng: cập nhật entry cũ thay vì thêm mới
+            size = len(self._entries)
+            if size:
+                similarities = self._vectors[:size] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._remove(best)
+
+            if len(self._entries) >= self.max_entries:
+                expired = np.flatnonzero(self._expires[:len(self._entries)] <= now)
+                victim = int(expired[0]) if len(expired) else min(
+                    range(len(self._entries)), key=lambda i: self._entries[i]['last_used']
+                )
+                self._remove(victim)
+                self.evictions += 1
+
+            index = len(self._entries)
+            self._vectors[index] = vector
+            self._expires[index] = now + self.ttl
+            self._entries.append({
+                'question': question,
+                'answer': answer,
+                'sources': list(sources or []),
+                'expires_at': now + self.ttl,
+                'last_used': now,
+                'hits': 0
+            })
+
+    def invalidate(self):
+        """Xóa toàn bộ cache (khi index của knowledge base được build lại)"""
+        with self._lock:
+            self._entries = []
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
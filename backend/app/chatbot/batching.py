@@ -0,0 +1,133 @@
+"""
+Micro-batching of concurrent chatbot work
+
+Each chat request embeds one question and searches the vector index with one
+query vector. Under concurrent traffic, a MicroBatcher collects the requests
+that arrive within a few milliseconds (up to a maximum batch size) and runs
+them as one call: one forward pass of the embedding model over all the
+questions, one vector search with a 2D query matrix. Callers block until
+their own result is ready, so the batching is invisible to them.
+
+Batch sizes and the time items wait in the queue are recorded in
+app.chatbot.metrics ('<name>_batch_size', '<name>_queue_seconds').
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from app.chatbot.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MICROBATCH_ENABLED = os.getenv("CHATBOT_MICROBATCH", "true").lower() == "true"
+BATCH_MAX_SIZE = int(os.getenv("CHATBOT_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT = float(os.getenv("CHATBOT_BATCH_MAX_WAIT_MS", "5")) / 1000
+
+
+class MicroBatcher:
+    """
+    Runs fn(list of items) -> list of results over batches of concurrent submits
+
+    A daemon thread takes the first waiting item, then keeps collecting for at
+    most max_wait seconds or until max_batch_size items are collected. The
+    thread is started on first use, so it belongs to the worker process that
+    uses it (not to the gunicorn master before fork).
+    """
+
+    def __init__(self, name, fn, max_batch_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, item, timeout=None):
+        """Queue one item and wait for its result (exceptions of fn are re-raised)"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Lấy thêm các item đã chờ sẵn mà không đợi
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            metrics.observe(f'{self.name}_batch_size', len(batch))
+            for _, _, submitted in batch:
+                metrics.observe(f'{self.name}_queue_seconds', started - submitted)
+            try:
+                results = self.fn([item for item, _, _ in batch])
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            metrics.observe(f'{self.name}_run_seconds', time.perf_counter() - started)
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+
+def embed_batch(embeddings, questions):
+    """One forward pass of the embedding model over every question of the batch"""
+    return embeddings.embed_documents(list(questions))
+
+
+def search_batch(requests):
+    """
+    Batched vector search
+
+    Args:
+        requests: [(vector_index, query_vector, k)]; requests against the same
+            index (an index version can be swapped while a batch is queued)
+            are searched together with one 2D query matrix
+
+    Returns:
+        list: search results in the order of the requests
+    """
+    results = [None] * len(requests)
+    groups = {}
+    for position, (index, vector, k) in enumerate(requests):
+        groups.setdefault(id(index), (index, []))[1].append((position, vector, k))
+    for index, items in groups.values():
+        vectors = np.asarray([vector for _, vector, _ in items], dtype=np.float32)
+        hits = index.search_batch(vectors, max(k for _, _, k in items))
+        for (position, _, k), result in zip(items, hits):
+            results[position] = result[:k]
+    return results
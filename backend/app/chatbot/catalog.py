@@ -0,0 +1,254 @@
+"""
+Product catalog retrieval for the chatbot
+
+Product rows are embedded into a per-worker vector index (separate from the
+policy/FAQ index built from knowledge_base/*.txt) and kept current through the
+catalog_changes queue: each sync reads the changes after the last applied id,
+plus recent changes with lower ids that committed late, re-embeds the upserted
+products in one batch and drops deleted ones.
+
+Retrieval is hybrid: BM25 over the same Vietnamese analyzer as product search
+(app.search) finds exact names and sizes, the embeddings find paraphrases, and
+the two normalized scores are blended. The context sent to the LLM is rendered
+from the live rows, so price and stock in answers are always current.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import has_app_context
+from sqlalchemy.orm import joinedload
+
+from app.chatbot.indexer import VectorIndex
+from app.search.analyzer import product_fields
+from app.search.memory_index import InvertedIndex
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = 2.0             # giây giữa hai lần đọc hàng đợi thay đổi
+SYNC_BATCH_SIZE = 1000
+CHANGE_RETENTION = timedelta(days=7)
+HYBRID_ALPHA = 0.6              # trọng số của điểm vector, phần còn lại là BM25
+MIN_SCORE = 0.35                # dưới ngưỡng này câu hỏi không nói về sản phẩm
+CANDIDATES_PER_RESULT = 4
+
+# Trọng số BM25 theo trường (size giúp trả lời "áo này có size XL không")
+CATALOG_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'sizes': 1.5,
+    'description': 1.0
+}
+
+
+def product_text(product):
+    """Văn bản của sản phẩm dùng để embed và làm context cho chatbot"""
+    lines = [f"Sản phẩm: {product.name}"]
+    if product.category:
+        lines.append(f"Danh mục: {product.category.name}")
+    if product.discount_price and product.discount_price < product.price:
+        lines.append(f"Giá: {product.discount_price:,.0f}đ (giá gốc {product.price:,.0f}đ)")
+    else:
+        lines.append(f"Giá: {product.price:,.0f}đ")
+    if product.sizes:
+        lines.append(f"Size: {product.sizes}")
+    lines.append(f"Tồn kho: còn {product.stock} sản phẩm" if product.stock else "Tồn kho: hết hàng")
+    if product.description:
+        lines.append(f"Mô tả: {product.description}")
+    return "\n".join(lines)
+
+
+class CatalogIndex:
+    """Hybrid (BM25 + vector) index of the Product table, updated from catalog_changes"""
+
+    def __init__(self, embeddings, alpha=HYBRID_ALPHA, min_score=MIN_SCORE):
+        self.embeddings = embeddings
+        self.alpha = alpha
+        self.min_score = min_score
+        self.vectors = None
+        self.keywords = InvertedIndex(CATALOG_FIELD_WEIGHTS)
+        self.last_change_id = None
+        # Id các thay đổi gần đây (trong CatalogChange.COMMIT_LAG) đã áp dụng
+        self._seen_change_ids = set()
+        self._checked_at = 0.0
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.vectors.size if self.vectors else 0
+
+    def _embed(self, products):
+        vectors = np.asarray(
+            self.embeddings.embed_documents([product_text(product) for product in products]),
+            dtype=np.float32
+        )
+        # Chuẩn hóa để khoảng cách L2 đổi được sang cosine
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _apply(self, products, deleted_ids):
+        """Cập nhật hai chỉ mục cho các sản phẩm đã ghi và đã xóa"""
+        product_ids = [product.id for product in products]
+        self.vectors.remove(product_ids + list(deleted_ids))
+        for product_id in deleted_ids:
+            self.keywords.remove(product_id)
+        if not products:
+            return
+        self.vectors.add(product_ids, self._embed(products), [{'product_id': product_id} for product_id in product_ids])
+        for product in products:
+            fields = product_fields(product)
+            fields['sizes'] = product.sizes or ''
+            self.keywords.add(product.id, fields)
+
+    @staticmethod
+    def _load_products(product_ids=None):
+        from app.models.product import Product
+
+        query = Product.query.options(joinedload(Product.category))
+        if product_ids is not None:
+            query = query.filter(Product.id.in_(product_ids))
+        return query.all()
+
+    def rebuild(self):
+        """Embed toàn bộ catalog (lần đầu, hoặc khi worker bị trễ quá xa)"""
+        from app import db
+        from app.models.catalog_change import CatalogChange
+
+        started = time.perf_counter()
+        # Đọc id trước khi đọc sản phẩm: thay đổi chen giữa sẽ được áp dụng lại, không bị mất.
+        # Thay đổi gần đây đã commit được ghi nhận là đã thấy; các id nhỏ hơn commit sau đó
+        # không có trong tập này nên sync() sẽ áp dụng chúng.
+        seen_change_ids = CatalogChange.recent_ids()
+        last_change_id = CatalogChange.latest_id()
+        products = self._load_products()
+        dimension = len(self.embeddings.embed_query('dimension'))
+        self.vectors = VectorIndex.empty(dimension)
+        self.keywords.clear()
+        self._apply(products, [])
+        self.last_change_id = last_change_id
+        self._seen_change_ids = seen_change_ids
+        self._synced_at = time.monotonic()
+
+        if CatalogChange.purge(datetime.utcnow() - CHANGE_RETENTION):
+            db.session.commit()
+        logger.info(f"Catalog index built: {len(products)} products in {time.perf_counter() - started:.2f}s")
+
+    def sync(self, force=False):
+        """
+        Áp dụng các thay đổi mới trong catalog_changes
+
+        Returns:
+            int: Number of products updated or removed
+        """
+        now = time.monotonic()
+        if not force and self.vectors is not None and now - self._checked_at < SYNC_INTERVAL:
+            return 0
+        from app.models.catalog_change import CatalogChange
+
+        with self._lock:
+            self._checked_at = now
+            if self.vectors is None or now - self._synced_at > CHANGE_RETENTION.total_seconds() / 2:
+                self.rebuild()
+                return self.size
+
+            # Thay đổi có id <= last_change_id nhưng chưa thấy: giao dịch commit muộn
+            recent = CatalogChange.recent_ids()
+            self._seen_change_ids &= recent
+            late = {change_id for change_id in recent - self._seen_change_ids if change_id <= self.last_change_id}
+
+            applied = 0
+            while True:
+                last_id, changes, read_ids = CatalogChange.since(self.last_change_id, late, SYNC_BATCH_SIZE)
+                if not read_ids:
+                    break
+                deleted = [product_id for product_id, op in changes.items() if op == CatalogChange.DELETE]
+                upserted = [product_id for product_id, op in changes.items() if op != CatalogChange.DELETE]
+                products = self._load_products(upserted) if upserted else []
+                # Sản phẩm đã bị xóa sau thay đổi 'upsert' cũng phải bỏ khỏi chỉ mục
+                found = {product.id for product in products}
+                deleted.extend(product_id for product_id in upserted if product_id not in found)
+                self._apply(products, deleted)
+                self.last_change_id = last_id
+                self._seen_change_ids |= read_ids
+                late -= read_ids
+                applied += len(changes)
+            self._synced_at = now
+            if applied:
+                logger.info(f"Catalog index: applied {applied} product changes")
+            return applied
+
+    def search(self, question, query_vector, k=3):
+        """
+        Sản phẩm liên quan đến câu hỏi, điểm = alpha * cosine + (1 - alpha) * BM25 chuẩn hóa
+
+        Returns:
+            list: [{'product_id', 'score', 'vector_score', 'keyword_score'}], best first
+        """
+        if not self.size:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        candidates = CANDIDATES_PER_RESULT * k
+        with self._lock:
+            vector_scores = {
+                hit['product_id']: 1.0 - hit['score'] / 2.0  # L2² của vector chuẩn hóa = 2 - 2cos
+                for hit in self.vectors.search(query, candidates)
+            }
+            keyword_hits = self.keywords.search(question, limit=candidates)
+            # Sản phẩm chỉ khớp từ khóa: lấy cosine từ vector đã lưu
+            for product_id, _ in keyword_hits:
+                if product_id not in vector_scores:
+                    vector_scores[product_id] = float(self.vectors.reconstruct(product_id) @ query)
+        best_keyword = keyword_hits[0][1] if keyword_hits else 0.0
+        keyword_scores = {product_id: score / best_keyword for product_id, score in keyword_hits} if best_keyword else {}
+
+        results = []
+        for product_id, vector_score in vector_scores.items():
+            keyword_score = keyword_scores.get(product_id, 0.0)
+            score = self.alpha * vector_score + (1 - self.alpha) * keyword_score
+            if score >= self.min_score:
+                results.append({
+                    'product_id': product_id,
+                    'score': round(score, 4),
+                    'vector_score': round(vector_score, 4),
+                    'keyword_score': round(keyword_score, 4)
+                })
+        results.sort(key=lambda result: -result['score'])
+        return results[:k]
+
+    def context(self, question, query_vector, k=3):
+        """
+        Context về sản phẩm cho câu hỏi, dựng từ dữ liệu hiện tại của bảng products
+
+        Returns:
+            tuple: (list of texts, list of sources)
+        """
+        if not has_app_context():
+            return [], []
+        self.sync()
+        hits = self.search(question, query_vector, k)
+        if not hits:
+            return [], []
+        products = {product.id: product for product in self._load_products([hit['product_id'] for hit in hits])}
+        texts, sources = [], []
+        for hit in hits:
+            product = products.get(hit['product_id'])
+            if product is not None:
+                texts.append(product_text(product))
+                sources.append(f"product:{product.id}")
+        return texts, sources
+
+    def stats(self):
+        return {
+            'products': self.size,
+            'last_change_id': self.last_change_id,
+            'alpha': self.alpha,
+            'min_score': self.min_score
+        }
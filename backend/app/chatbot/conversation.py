@@ -0,0 +1,194 @@
+"""
+Conversation history of chatbot sessions
+
+RAGChatbot.get_answer is stateless; the routes load the history of a session
+from a ConversationStore, pass it in and append the new turn. The backend is
+chosen with CHATBOT_HISTORY_BACKEND:
+- 'memory': per-worker LRU with TTL and a cap on the number of sessions
+- 'database': chat_messages table, shared by all gunicorn workers
+"""
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.chat import ChatMessage
+
+USER = 'user'
+ASSISTANT = 'assistant'
+
+
+class ConversationStore:
+    """Interface of the conversation history backends"""
+
+    name = None
+
+    def __init__(self, max_messages=10, ttl=1800):
+        self.max_messages = max_messages
+        self.ttl = ttl
+
+    def get_history(self, session_id):
+        """
+        Returns:
+            list: [{'role': 'user' | 'assistant', 'content': str}], oldest first
+        """
+        raise NotImplementedError
+
+    def append(self, session_id, question, answer):
+        """Store one question/answer turn"""
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        """
+        Returns:
+            bool: False if the session did not exist
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.name, 'max_messages': self.max_messages, 'ttl': self.ttl}
+
+
+class InMemoryConversationStore(ConversationStore):
+    """Per-process store; sessions expire after ttl seconds of inactivity"""
+
+    name = 'memory'
+
+    def __init__(self, max_messages=10, ttl=1800, max_sessions=10000):
+        super().__init__(max_messages, ttl)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (last_used, deque)
+        self._lock = threading.Lock()
+
+    def _get(self, session_id, now):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        last_used, messages = entry
+        if now - last_used > self.ttl:
+            del self._sessions[session_id]
+            return None
+        return messages
+
+    def get_history(self, session_id):
+        with self._lock:
+            messages = self._get(session_id, time.monotonic())
+            return list(messages) if messages else []
+
+    def append(self, session_id, question, answer):
+        now = time.monotonic()
+        with self._lock:
+            messages = self._get(session_id, now)
+            if messages is None:
+                messages = deque(maxlen=self.max_messages)
+            messages.append({'role': USER, 'content': question})
+            messages.append({'role': ASSISTANT, 'content': answer})
+            self._sessions[session_id] = (now, messages)
+            self._sessions.move_to_end(session_id)
+            # Bỏ các phiên ít dùng nhất khi vượt giới hạn
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def clear(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({'sessions': len(self._sessions), 'max_sessions': self.max_sessions})
+        return stats
+
+
+class DatabaseConversationStore(ConversationStore):
+    """
+    History stored in the chat_messages table
+
+    Each session keeps its last max_messages messages; expired messages are
+    purged from time to time on write.
+    """
+
+    name = 'database'
+    PURGE_PROBABILITY = 0.01
+
+    def get_history(self, session_id):
+        since = datetime.utcnow() - timedelta(seconds=self.ttl)
+        messages = ChatMessage.query.filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.created_at >= since
+        ).order_by(ChatMessage.id.desc()).limit(self.max_messages).all()
+        return [message.to_dict() for message in reversed(messages)]
+
+    def append(self, session_id, question, answer):
+        now = datetime.utcnow()
+        try:
+            db.session.execute(db.insert(ChatMessage), [
+                {'session_id': session_id, 'role': USER, 'content': question, 'created_at': now},
+                {'session_id': session_id, 'role': ASSISTANT, 'content': answer, 'created_at': now}
+            ])
+
+            # Chỉ giữ max_messages tin nhắn mới nhất của phiên
+            oldest_kept = db.session.query(ChatMessage.id).filter(
+                ChatMessage.session_id == session_id
+            ).order_by(ChatMessage.id.desc()).offset(self.max_messages - 1).limit(1).scalar()
+            if oldest_kept is not None:
+                db.session.execute(
+                    db.delete(ChatMessage).where(
+                        ChatMessage.session_id == session_id,
+                        ChatMessage.id < oldest_kept
+                    ).execution_options(synchronize_session=False)
+                )
+
+            if random.random() < self.PURGE_PROBABILITY:
+                self.purge_expired()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def purge_expired(self):
+        """Xóa tin nhắn hết hạn của mọi phiên (người gọi commit)"""
+        since = datetime.utcnow() - timedelta(seconds=self.ttl)
+        return db.session.execute(
+            db.delete(ChatMessage).where(ChatMessage.created_at < since)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+    def clear(self, session_id):
+        deleted = db.session.execute(
+            db.delete(ChatMessage).where(ChatMessage.session_id == session_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return deleted > 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """Lấy conversation store dùng chung trong process"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
+
+
+def _create_store():
+    config = current_app.config
+    options = {
+        'max_messages': config.get('CHATBOT_HISTORY_MAX_MESSAGES', 10),
+        'ttl': config.get('CHATBOT_HISTORY_TTL', 1800)
+    }
+    backend_name = config.get('CHATBOT_HISTORY_BACKEND', 'memory')
+    if backend_name == DatabaseConversationStore.name:
+        return DatabaseConversationStore(**options)
+    if backend_name != InMemoryConversationStore.name:
+        current_app.logger.warning(f"Unknown CHATBOT_HISTORY_BACKEND '{backend_name}', using in-memory store")
+    return InMemoryConversationStore(max_sessions=config.get('CHATBOT_HISTORY_MAX_SESSIONS', 10000), **options)
@@ -0,0 +1,157 @@
+"""
+Embedding backends of the chatbot
+
+CHATBOT_EMBEDDINGS_BACKEND selects how the sentence-transformers model is run:
+- 'torch': langchain HuggingFaceEmbeddings (baseline)
+- 'torch-int8': same model with dynamic int8 quantization of the Linear layers
+- 'onnx': the model exported to ONNX and run with ONNX Runtime; torch is
+  only needed once, to export the model
+- 'onnx-int8': the ONNX model with int8 weights (onnxruntime.quantization)
+
+All backends expose embed_documents / embed_query like the langchain
+embeddings, and produce the same (mean pooled, not normalized) vectors up to
+quantization error. benchmarks/bench_embeddings.py compares their speed,
+memory and retrieval top-k overlap with the torch baseline.
+"""
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TORCH = 'torch'
+TORCH_INT8 = 'torch-int8'
+ONNX = 'onnx'
+ONNX_INT8 = 'onnx-int8'
+BACKENDS = (TORCH, TORCH_INT8, ONNX, ONNX_INT8)
+
+MAX_SEQUENCE_LENGTH = 128   # max_seq_length của paraphrase-multilingual-MiniLM-L12-v2
+ONNX_OPSET = 14
+ONNX_THREADS = int(os.getenv("CHATBOT_ONNX_THREADS", "0"))  # 0: mặc định của ONNX Runtime
+
+
+class QuantizedTorchEmbeddings:
+    """sentence-transformers model with int8 dynamic quantization of the Linear layers"""
+
+    def __init__(self, model_name):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device='cpu')
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed_documents(self, texts):
+        return self.model.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.model.encode(text).tolist()
+
+
+class OnnxEmbeddings:
+    """
+    Transformer exported to ONNX + mean pooling, run with ONNX Runtime
+
+    The exported (and quantized) model is cached in cache_dir; the export is
+    written to a temporary file and renamed, so concurrent workers never load
+    a partial file.
+    """
+
+    def __init__(self, model_name, cache_dir, quantize=False):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        path = self.model_path(model_name, cache_dir, quantize)
+        options = onnxruntime.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    @classmethod
+    def model_path(cls, model_name, cache_dir, quantize=False):
+        """Path of the ONNX model, exported (and quantized) on first use"""
+        os.makedirs(cache_dir, exist_ok=True)
+        base = os.path.join(cache_dir, model_name.replace('/', '__'))
+        path = f'{base}.onnx'
+        if not os.path.exists(path):
+            cls._export(model_name, path)
+        if not quantize:
+            return path
+        quantized_path = f'{base}.int8.onnx'
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            logger.info(f"Quantizing {path} to int8")
+            tmp_path = f'{quantized_path}.{os.getpid()}.tmp'
+            quantize_dynamic(path, tmp_path, weight_type=QuantType.QInt8)
+            os.replace(tmp_path, quantized_path)
+        return quantized_path
+
+    @staticmethod
+    def _export(model_name, path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"Exporting {model_name} to ONNX: {path}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(['xuất mô hình'], return_tensors='pt')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample['input_ids'], sample['attention_mask']),
+                tmp_path,
+                input_names=['input_ids', 'attention_mask'],
+                output_names=['last_hidden_state'],
+                dynamic_axes={
+                    'input_ids': {0: 'batch', 1: 'sequence'},
+                    'attention_mask': {0: 'batch', 1: 'sequence'},
+                    'last_hidden_state': {0: 'batch', 1: 'sequence'}
+                },
+                opset_version=ONNX_OPSET
+            )
+        os.replace(tmp_path, path)
+
+    def _encode(self, texts):
+        encoded = self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=MAX_SEQUENCE_LENGTH, return_tensors='np'
+        )
+        inputs = {name: encoded[name].astype(np.int64) for name in ('input_ids', 'attention_mask') if name in self.input_names}
+        token_embeddings = self.session.run(None, inputs)[0]
+        # Mean pooling theo attention mask, giống sentence-transformers
+        mask = encoded['attention_mask'][..., None].astype(np.float32)
+        return (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+def create_embeddings(backend, model_name, cache_dir):
+    """Instantiate the embeddings of a backend (see BACKENDS)"""
+    if backend == TORCH_INT8:
+        return QuantizedTorchEmbeddings(model_name)
+    if backend in (ONNX, ONNX_INT8):
+        return OnnxEmbeddings(model_name, cache_dir, quantize=(backend == ONNX_INT8))
+    if backend != TORCH:
+        logger.warning(f"Unknown embeddings backend '{backend}', using {TORCH}")
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def index_key(backend, model_name):
+    """
+    Model identifier stored in the index manifest
+
+    Vectors of different backends differ slightly, so switching backend
+    re-embeds the knowledge base; the torch baseline keeps the bare model name
+    so existing indexes stay valid.
+    """
+    return model_name if backend == TORCH else f'{model_name}:{backend}'
@@ -0,0 +1,44 @@
+"""
+Canned answers for common questions
+
+Used when the chatbot cannot answer: warming up, LLM errors, or the LLM
+circuit breaker is open (see app.chatbot.llm).
+"""
+
+
+def get_fallback_answer(question):
+    """Provide fallback answers for common questions when the chatbot fails"""
+    question_lower = question.lower()
+    
+    # Common question patterns and answers
+    fallbacks = {
+        "theo dõi đơn hàng": "Bạn có thể theo dõi đơn hàng bằng cách đăng nhập vào tài khoản của bạn, sau đó vào mục 'Đơn hàng của tôi'. Tại đây, bạn sẽ thấy tất cả các đơn hàng đã đặt, tình trạng và thông tin vận chuyển của từng đơn.",
+        
+        "phí vận chuyển": "Phí vận chuyển phụ thuộc vào địa điểm và phương thức vận chuyển bạn chọn. Đối với các đơn hàng trên 500.000 VND, chúng tôi miễn phí vận chuyển toàn quốc. Đối với các đơn hàng dưới 500.000 VND, phí vận chuyển sẽ từ 30.000 VND đến 50.000 VND tùy theo khu vực.",
+        
+        "chính sách đổi trả": "Cửa hàng chúng tôi chấp nhận đổi trả trong vòng 30 ngày kể từ ngày mua hàng, với điều kiện sản phẩm còn nguyên tem nhãn, chưa qua sử dụng và có hóa đơn mua hàng. Đối với sản phẩm giảm giá, thời gian đổi trả là 14 ngày.",
+        
+        "thời gian giao hàng": "Thời gian giao hàng thông thường là 2-3 ngày làm việc đối với các thành phố lớn và 3-5 ngày làm việc đối với các tỉnh thành khác. Đối với khu vực miền núi và hải đảo, thời gian giao hàng có thể kéo dài từ 5-7 ngày làm việc.",
+        
+        "tài khoản": "Để tạo tài khoản mới, bạn chỉ cần nhấp vào biểu tượng người dùng ở góc phải trên cùng của trang web, sau đó chọn 'Đăng ký'. Điền thông tin cá nhân của bạn như tên, email và mật khẩu, sau đó nhấp vào nút 'Đăng ký'.",
+        
+        "phương thức thanh toán": "Chúng tôi chấp nhận nhiều phương thức thanh toán khác nhau bao gồm: thẻ tín dụng/ghi nợ (Visa, MasterCard, JCB), ví điện tử (Momo, VNPay, ZaloPay), chuyển khoản ngân hàng và thanh toán khi nhận hàng (COD).",
+        
+        "liên hệ": "Bạn có thể liên hệ với bộ phận chăm sóc khách hàng của chúng tôi thông qua các kênh sau: Hotline: 1900-1234 (8h-22h hàng ngày), Email: support@example.com, Live chat trên website, hoặc qua trang Fanpage Facebook chính thức của chúng tôi.",
+        
+        "mã giảm giá": "Để áp dụng mã giảm giá, bạn cần thêm sản phẩm vào giỏ hàng, sau đó chuyển đến trang thanh toán. Tại đây, bạn sẽ thấy ô 'Mã giảm giá' - hãy nhập mã của bạn và nhấp vào 'Áp dụng'."
+    }
+    
+    # Check for matching patterns
+    for key, answer in fallbacks.items():
+        if key in question_lower:
+            return answer
+    
+    # Check for generic greetings
+    greetings = ["xin chào", "chào", "hello", "hi", "hey"]
+    for greeting in greetings:
+        if greeting in question_lower:
+            return "Xin chào! Tôi là trợ lý ảo của cửa hàng. Tôi có thể giúp bạn trả lời các câu hỏi về sản phẩm, đơn hàng, vận chuyển và các chính sách của cửa hàng."
+    
+    # No match found
+    return None
@@ -0,0 +1,522 @@
+"""
+Incremental indexing of the chatbot knowledge base
+
+Layout of FAISS_INDEX_PATH:
+    CURRENT             name of the active version (replaced atomically)
+    versions/<version>/ vectors.npy + vector_ids.npy (vectors),
+                        docs.idx + docs.bin + sources.json (docstore),
+                        manifest.json
+    .lock               serializes builders (rebuild_index.py, workers)
+
+The manifest records the sha256 of every knowledge_base/*.txt file and the
+ids of its chunks in the vector index. An update re-embeds only the files
+whose hash changed, removes the vectors of changed or deleted files and writes
+the result to a new version directory; CURRENT is switched last, so readers
+always see a complete index. Running workers notice the new CURRENT and swap
+it in (see RAGChatbot.refresh_index). The index is not kept in the repository:
+entrypoint.sh runs rebuild_index.py before starting gunicorn.
+
+Workers open a version read-only and memory-mapped (the vectors as a numpy
+matrix searched with numpy, the docstore as an offsets table into a UTF-8
+text blob), so every gunicorn worker shares the same page-cache pages instead
+of holding a private copy, and loading a version does not deserialize
+anything. FAISS is not used for this: faiss 1.7.4 does not memory-map an
+IndexIDMap2(IndexFlatL2), IO_FLAG_MMAP still reads a private copy into every
+worker. Versions written by the FAISS indexer (index.faiss) still load, as a
+private copy, when faiss is installed.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa trong process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+VERSIONS_DIR = 'versions'
+VECTORS_FILE = 'vectors.npy'
+VECTOR_IDS_FILE = 'vector_ids.npy'
+LEGACY_INDEX_FILE = 'index.faiss'
+DOCS_INDEX_FILE = 'docs.idx'
+DOCS_BLOB_FILE = 'docs.bin'
+SOURCES_FILE = 'sources.json'
+LEGACY_DOCSTORE_FILE = 'docstore.json'
+MANIFEST_FILE = 'manifest.json'
+KEEP_VERSIONS = 3
+
+SAMPLE_KNOWLEDGE = (
+    "Câu hỏi: Làm thế nào để tạo tài khoản mới?\n"
+    "Trả lời: Để tạo tài khoản mới, bạn có thể nhấn vào nút 'Đăng ký' ở góc phải trên cùng của trang web.\n\n"
+)
+
+_process_lock = threading.Lock()
+
+# Một dòng mỗi chunk, sắp xếp theo chunk_id; text là blob[offset:offset + length]
+DOCS_INDEX_DTYPE = np.dtype([('chunk_id', '<i8'), ('offset', '<i8'), ('length', '<i4'), ('source', '<i4')])
+
+
+def _load_array(path, mmap=True):
+    """np.load, memory-mapped read-only nếu được"""
+    if mmap:
+        try:
+            return np.load(path, mmap_mode='r', allow_pickle=False)
+        except ValueError:
+            # Mảng rỗng không mmap được
+            pass
+    return np.load(path, allow_pickle=False)
+
+
+class MmapDocstore:
+    """
+    Read-only docstore: chunk id -> {'text', 'source'}
+
+    docs.idx is a numpy array of (chunk_id, offset, length, source) sorted by
+    chunk id and docs.bin the concatenated UTF-8 texts; both are memory-mapped
+    and a lookup is a binary search plus one slice.
+    """
+
+    def __init__(self, directory):
+        self._rows = _load_array(os.path.join(directory, DOCS_INDEX_FILE))
+        self._ids = self._rows['chunk_id']
+        with open(os.path.join(directory, SOURCES_FILE), 'r', encoding='utf-8') as f:
+            self._sources = json.load(f)
+        with open(os.path.join(directory, DOCS_BLOB_FILE), 'rb') as f:
+            # mmap của file rỗng không hợp lệ
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b''
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _position(self, chunk_id):
+        position = int(np.searchsorted(self._ids, chunk_id))
+        if position < len(self._ids) and self._ids[position] == chunk_id:
+            return position
+        return None
+
+    def __contains__(self, chunk_id):
+        return self._position(chunk_id) is not None
+
+    def get(self, chunk_id, default=None):
+        position = self._position(chunk_id)
+        if position is None:
+            return default
+        row = self._rows[position]
+        offset, length = int(row['offset']), int(row['length'])
+        return {
+            'text': self._blob[offset:offset + length].decode('utf-8'),
+            'source': self._sources[int(row['source'])]
+        }
+
+    def __getitem__(self, chunk_id):
+        doc = self.get(chunk_id)
+        if doc is None:
+            raise KeyError(chunk_id)
+        return doc
+
+    def items(self):
+        for chunk_id in self._ids:
+            yield int(chunk_id), self[int(chunk_id)]
+
+    def to_dict(self):
+        """Bản sao có thể sửa (dùng khi build version mới)"""
+        return dict(self.items())
+
+    @staticmethod
+    def write(directory, docstore):
+        """Ghi docstore dạng dict {chunk_id: {'text', 'source'}}"""
+        sources = sorted({doc['source'] for doc in docstore.values()})
+        source_ids = {source: position for position, source in enumerate(sources)}
+        rows = np.zeros(len(docstore), dtype=DOCS_INDEX_DTYPE)
+        offset = 0
+        with open(os.path.join(directory, DOCS_BLOB_FILE), 'wb') as blob:
+            for position, chunk_id in enumerate(sorted(docstore)):
+                doc = docstore[chunk_id]
+                data = doc['text'].encode('utf-8')
+                blob.write(data)
+                rows[position] = (chunk_id, offset, len(data), source_ids[doc['source']])
+                offset += len(data)
+        np.save(os.path.join(directory, DOCS_INDEX_FILE), rows, allow_pickle=False)
+        # np.save thêm đuôi .npy vào tên file
+        os.replace(os.path.join(directory, DOCS_INDEX_FILE + '.npy'), os.path.join(directory, DOCS_INDEX_FILE))
+        with open(os.path.join(directory, SOURCES_FILE), 'w', encoding='utf-8') as f:
+            json.dump(sources, f, ensure_ascii=False)
+
+
+class VectorIndex:
+    """
+    Chunk vectors addressed by chunk id, searched exactly (brute-force L2)
+
+    vectors.npy holds one float32 row per chunk and vector_ids.npy the chunk id
+    of each row. A loaded version memory-maps both read-only, so every worker
+    searches the same page-cache pages; add() and remove() build new in-memory
+    arrays, so the vectors of one file can be removed without renumbering the
+    rest of the index.
+    """
+
+    def __init__(self, vectors, ids, docstore):
+        self.vectors = vectors      # (n, dimension) float32
+        self.ids = ids              # (n,) int64, chunk id của từng dòng
+        self.docstore = docstore    # chunk id -> {'text', 'source'}
+        self._norms = None
+        self._positions = None
+
+    @classmethod
+    def empty(cls, dimension):
+        return cls(np.zeros((0, dimension), dtype=np.float32), np.zeros(0, dtype=np.int64), {})
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Open a saved index
+
+        Args:
+            mmap: Memory-map the vectors and the docstore read-only (shared
+                between processes); False loads a private copy that add() and
+                remove() can modify
+        """
+        if os.path.exists(os.path.join(directory, VECTORS_FILE)):
+            vectors = _load_array(os.path.join(directory, VECTORS_FILE), mmap)
+            ids = _load_array(os.path.join(directory, VECTOR_IDS_FILE), mmap)
+        else:
+            vectors, ids = cls._read_faiss(os.path.join(directory, LEGACY_INDEX_FILE))
+            if mmap:
+                logger.warning(f"{directory} is a FAISS version, loaded a private copy (run rebuild_index.py)")
+
+        legacy_path = os.path.join(directory, LEGACY_DOCSTORE_FILE)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                docstore = {int(chunk_id): doc for chunk_id, doc in json.load(f).items()}
+        else:
+            docstore = MmapDocstore(directory)
+            if not mmap:
+                docstore = docstore.to_dict()
+        return cls(vectors, ids, docstore)
+
+    @staticmethod
+    def _read_faiss(path):
+        """Vector và id của version cũ (IndexIDMap2 ghi bởi faiss); chỉ khi đó mới cần faiss"""
+        import faiss
+
+        index = faiss.read_index(path)
+        if not index.ntotal:
+            return np.zeros((0, index.d), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        return np.asarray(vectors, dtype=np.float32), faiss.vector_to_array(index.id_map).astype(np.int64)
+
+    def save(self, directory):
+        np.save(os.path.join(directory, VECTORS_FILE), np.ascontiguousarray(self.vectors), allow_pickle=False)
+        np.save(os.path.join(directory, VECTOR_IDS_FILE), np.ascontiguousarray(self.ids), allow_pickle=False)
+        MmapDocstore.write(directory, self.docstore)
+
+    @property
+    def size(self):
+        return len(self.ids)
+
+    def _changed(self, vectors, ids):
+        self.vectors, self.ids = vectors, ids
+        self._norms = None
+        self._positions = None
+
+    def add(self, ids, vectors, docs):
+        if not len(ids):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        self._changed(
+            np.concatenate([self.vectors, vectors]),
+            np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        )
+        self.docstore.update(zip(ids, docs))
+
+    def remove(self, ids):
+        if not len(ids):
+            return
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        if not keep.all():
+            self._changed(self.vectors[keep], self.ids[keep])
+        for chunk_id in ids:
+            self.docstore.pop(chunk_id, None)
+
+    def reconstruct(self, chunk_id):
+        """Vector đã lưu của một chunk"""
+        positions = self._positions
+        if positions is None:
+            positions = self._positions = {int(chunk_id): position for position, chunk_id in enumerate(self.ids)}
+        return np.array(self.vectors[positions[int(chunk_id)]])
+
+    def search(self, vector, k):
+        """
+        Returns:
+            list: [{'text', 'source', 'score'}], closest first; score is the
+                squared L2 distance
+        """
+        return self.search_batch(np.asarray(vector, dtype=np.float32).reshape(1, -1), k)[0]
+
+    def search_batch(self, vectors, k):
+        """
+        Search several query vectors with one matrix product
+
+        Args:
+            vectors: 2D array, one query per row
+
+        Returns:
+            list: one result list per query (see search)
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.size:
+            return [[] for _ in range(len(vectors))]
+        norms = self._norms
+        if norms is None:
+            norms = self._norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        # |q - v|² = |q|² - 2 q·v + |v|²
+        distances = norms[None, :] - 2.0 * (vectors @ self.vectors.T)
+        distances += np.einsum('ij,ij->i', vectors, vectors)[:, None]
+        np.maximum(distances, 0.0, out=distances)
+
+        k = min(k, self.size)
+        if k < self.size:
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            nearest = np.broadcast_to(np.arange(self.size), distances.shape)
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind='stable')
+        nearest = np.take_along_axis(nearest, order, axis=1)
+        nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+        return [
+            [
+                dict(doc, score=float(distance))
+                for distance, position in zip(row_distances, row_positions)
+                for doc in [self.docstore.get(int(self.ids[position]))]
+                if doc is not None
+            ]
+            for row_distances, row_positions in zip(nearest_distances, nearest)
+        ]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class KnowledgeBaseIndexer:
+    """Builds versioned indexes of knowledge_base/*.txt, re-embedding only changed files"""
+
+    def __init__(self, knowledge_base_dir, index_root, embeddings, model_name,
+                 chunk_size=500, chunk_overlap=50):
+        self.knowledge_base_dir = str(knowledge_base_dir)
+        self.index_root = str(index_root)
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    # Versions
+
+    def current_version(self):
+        """Tên version đang dùng, None nếu chưa có index"""
+        try:
+            with open(os.path.join(self.index_root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        if version and os.path.isdir(self.version_dir(version)):
+            return version
+        return None
+
+    def version_dir(self, version):
+        return os.path.join(self.index_root, VERSIONS_DIR, version)
+
+    def load(self, version=None, mmap=True):
+        """
+        Returns:
+            tuple: (version, VectorIndex), (None, None) if there is no index yet
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None, None
+        return version, VectorIndex.load(self.version_dir(version), mmap=mmap)
+
+    def _read_manifest(self, version):
+        if version is None:
+            return None
+        try:
+            with open(os.path.join(self.version_dir(version), MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @contextmanager
+    def _lock(self):
+        """Chỉ một process build index tại một thời điểm"""
+        os.makedirs(self.index_root, exist_ok=True)
+        with _process_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.index_root, '.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Knowledge base
+
+    def _scan(self):
+        """sha256 của mọi file .txt trong knowledge base"""
+        os.makedirs(self.knowledge_base_dir, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.knowledge_base_dir) if name.endswith('.txt'))
+        if not names:
+            logger.warning("No text files found in knowledge base directory")
+            with open(os.path.join(self.knowledge_base_dir, 'sample.txt'), 'w', encoding='utf-8') as f:
+                f.write(SAMPLE_KNOWLEDGE)
+            logger.info("Created sample knowledge file: sample.txt")
+            names = ['sample.txt']
+        return {name: file_sha256(os.path.join(self.knowledge_base_dir, name)) for name in names}
+
+    def _split(self, name):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        with open(os.path.join(self.knowledge_base_dir, name), 'r', encoding='utf-8') as f:
+            content = f.read()
+        splitter = RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+        return splitter.split_text(content)
+
+    def _compatible(self, manifest):
+        """Đổi model hoặc cách chia chunk thì phải build lại toàn bộ"""
+        return bool(manifest) and (
+            manifest.get('model') == self.model_name
+            and manifest.get('chunk_size') == self.chunk_size
+            and manifest.get('chunk_overlap') == self.chunk_overlap
+        )
+
+    # Update
+
+    def update(self, full=False):
+        """
+        Bring the index up to date with the knowledge base
+
+        Args:
+            full: Ignore the current version and re-embed every file
+
+        Returns:
+            dict: version, whether a new version was written and what changed
+        """
+        started = time.perf_counter()
+        with self._lock():
+            base_version = self.current_version()
+            manifest = None if full else self._read_manifest(base_version)
+            if not self._compatible(manifest):
+                manifest, base_version = None, None
+
+            hashes = self._scan()
+            old_files = manifest['files'] if manifest else {}
+            changed = [name for name, sha in hashes.items() if name in old_files and old_files[name]['sha256'] != sha]
+            added = [name for name in hashes if name not in old_files]
+            removed = [name for name in old_files if name not in hashes]
+
+            stats = {
+                'base_version': base_version,
+                'files_added': added,
+                'files_changed': changed,
+                'files_removed': removed,
+                'files_unchanged': len(hashes) - len(added) - len(changed),
+                'chunks_added': 0,
+                'chunks_removed': 0
+            }
+            if manifest and not (added or changed or removed):
+                stats.update(version=base_version, created=False, seconds=round(time.perf_counter() - started, 3))
+                return stats
+
+            # Chunk + embed chỉ các file mới hoặc đã sửa
+            next_id = manifest['next_id'] if manifest else 1
+            new_ids, new_docs = [], []
+            files = {name: entry for name, entry in old_files.items() if name in hashes and name not in changed}
+            for name in added + changed:
+                chunks = self._split(name)
+                ids = list(range(next_id, next_id + len(chunks)))
+                next_id += len(chunks)
+                new_ids.extend(ids)
+                new_docs.extend({'text': chunk, 'source': name} for chunk in chunks)
+                files[name] = {'sha256': hashes[name], 'chunk_ids': ids}
+            vectors = self.embeddings.embed_documents([doc['text'] for doc in new_docs]) if new_docs else []
+
+            # Bắt đầu từ bản sao trên đĩa của version hiện tại, index đang phục vụ không bị sửa
+            if base_version:
+                _, index = self.load(base_version, mmap=False)
+            else:
+                dimension = len(vectors[0]) if vectors else len(self.embeddings.embed_query('dimension'))
+                index = VectorIndex.empty(dimension)
+            stale_ids = [chunk_id for name in changed + removed for chunk_id in old_files[name]['chunk_ids']]
+            index.remove(stale_ids)
+            index.add(new_ids, vectors, new_docs)
+
+            version = self._write_version(index, {
+                'model': self.model_name,
+                'chunk_size': self.chunk_size,
+                'chunk_overlap': self.chunk_overlap,
+                'next_id': next_id,
+                'files': files
+            })
+            self._prune_versions(keep={version})
+
+        stats.update(
+            version=version,
+            created=True,
+            chunks_added=len(new_ids),
+            chunks_removed=len(stale_ids),
+            total_chunks=index.size,
+            seconds=round(time.perf_counter() - started, 3)
+        )
+        logger.info(
+            f"Knowledge base index {version}: +{len(added)} ~{len(changed)} -{len(removed)} files, "
+            f"+{len(new_ids)}/-{len(stale_ids)} chunks in {stats['seconds']:.2f}s"
+        )
+        return stats
+
+    def _write_version(self, index, manifest):
+        """Ghi version mới vào thư mục tạm, rename, rồi mới đổi CURRENT"""
+        versions_root = os.path.join(self.index_root, VERSIONS_DIR)
+        os.makedirs(versions_root, exist_ok=True)
+        version = f"{time.strftime('%Y%m%d%H%M%S')}{int(time.time() * 1000) % 1000:03d}-{os.getpid()}"
+        tmp_dir = os.path.join(versions_root, f'.tmp-{version}')
+        os.makedirs(tmp_dir)
+        try:
+            index.save(tmp_dir)
+            manifest = dict(manifest, version=version, created_at=time.time())
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            os.rename(tmp_dir, self.version_dir(version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        current_tmp = os.path.join(self.index_root, f'.{CURRENT_FILE}.tmp')
+        with open(current_tmp, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.index_root, CURRENT_FILE))
+        return version
+
+    def _prune_versions(self, keep):
+        """Giữ KEEP_VERSIONS version mới nhất (worker có thể vẫn đang đọc version trước)"""
+        versions_root = os.path.join(self.index_root, VERSIONS_DIR)
+        versions = sorted(name for name in os.listdir(versions_root) if not name.startswith('.'))
+        for name in versions[:-KEEP_VERSIONS]:
+            if name not in keep:
+                shutil.rmtree(os.path.join(versions_root, name), ignore_errors=True)
@@ -0,0 +1,342 @@
+"""
+LLM clients of the chatbot
+
+CHATBOT_LLM_BACKEND selects the implementation:
+- 'gemini': Google Gemini through google-genai (needs GOOGLE_API_KEY)
+- 'stub': local deterministic generator, no network; answers from the
+  retrieved context so the whole chat path (including streaming) can be
+  tested and load-tested offline
+
+get_llm() wraps the backend in a ResilientLLMClient shared by the process:
+one long-lived client (the HTTP connection pool is reused across requests),
+a deadline per call, retries with jittered backoff on transient errors, a cap
+on concurrent calls and a circuit breaker. When a call cannot be made or
+fails for good it raises LLMUnavailable and the chatbot answers from
+app.chatbot.fallback instead of hanging the worker.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from app.chatbot.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv("CHATBOT_LLM_BACKEND", "gemini")
+GEMINI_MODEL = os.getenv("CHATBOT_GEMINI_MODEL", "gemini-2.0-flash")
+LLM_TIMEOUT = float(os.getenv("CHATBOT_LLM_TIMEOUT", "20"))                # giây, cho cả lần gọi kể cả retry
+LLM_RETRIES = int(os.getenv("CHATBOT_LLM_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = 0.5                                                  # giây, nhân đôi mỗi lần retry
+LLM_MAX_CONCURRENCY = int(os.getenv("CHATBOT_LLM_MAX_CONCURRENCY", "8"))    # mỗi worker
+LLM_QUEUE_TIMEOUT = float(os.getenv("CHATBOT_LLM_QUEUE_TIMEOUT", "2"))
+BREAKER_FAILURES = int(os.getenv("CHATBOT_LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("CHATBOT_LLM_BREAKER_RESET", "30"))
+STUB_LATENCY = float(os.getenv("CHATBOT_STUB_LATENCY", "0.3"))              # giây trước token đầu tiên của stub
+STUB_TOKEN_DELAY = float(os.getenv("CHATBOT_STUB_TOKEN_DELAY", "0.02"))    # giây giữa hai token của stub
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when the LLM cannot answer (circuit open, too busy, deadline exceeded)"""
+
+
+class LLMClient:
+    """Interface of the LLM clients"""
+
+    name = None
+
+    def generate(self, prompt, timeout=None):
+        """Return the whole answer"""
+        return "".join(self.stream(prompt, timeout))
+
+    def stream(self, prompt, timeout=None):
+        """Yield the answer in pieces as they are produced"""
+        raise NotImplementedError
+
+    def stats(self):
+        return {'backend': self.name}
+
+
+class GeminiClient(LLMClient):
+    """google-genai client created once; its HTTP connection pool is reused by every call"""
+
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model=GEMINI_MODEL, timeout=LLM_TIMEOUT):
+        from google import genai
+
+        self.model = model
+        # Timeout của từng request HTTP (ms); deadline tổng do ResilientLLMClient kiểm soát
+        self.client = genai.Client(
+            api_key=api_key or os.getenv("GOOGLE_API_KEY"),
+            http_options={'timeout': int(timeout * 1000)}
+        )
+
+    def generate(self, prompt, timeout=None):
+        return self.client.models.generate_content(contents=prompt, model=self.model).text
+
+    def stream(self, prompt, timeout=None):
+        for chunk in self.client.models.generate_content_stream(contents=prompt, model=self.model):
+            if chunk.text:
+                yield chunk.text
+
+
+class StubClient(LLMClient):
+    """
+    Deterministic offline LLM
+
+    The answer is built from the first sentences of the context section of
+    the prompt, so the same prompt always gets the same answer. It waits
+    `latency` seconds before the first token and streams word by word with a
+    fixed delay to mimic a real model under load tests.
+    """
+
+    name = 'stub'
+    MAX_SENTENCES = 3
+
+    def __init__(self, latency=STUB_LATENCY, token_delay=STUB_TOKEN_DELAY):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def answer(self, prompt):
+        match = re.search(r'Thông tin:(.*?)Câu hỏi của khách hàng:', prompt, re.S)
+        context = match.group(1) if match else ''
+        sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+|\n+', context) if s.strip()]
+        if not sentences:
+            return "Xin lỗi, tôi không có thông tin về vấn đề này. Vui lòng liên hệ bộ phận chăm sóc khách hàng."
+        return " ".join(sentences[:self.MAX_SENTENCES])
+
+    def stream(self, prompt, timeout=None):
+        if self.latency:
+            time.sleep(self.latency)
+        words = self.answer(prompt).split(' ')
+        for index, word in enumerate(words):
+            if self.token_delay and index:
+                time.sleep(self.token_delay)
+            yield word if index == 0 else ' ' + word
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open rejects
+    calls for `reset_timeout` seconds, then lets one trial call through
+    (half-open) which closes the circuit on success or reopens it on failure
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release_trial(self):
+        """Lượt thử half-open không được thực hiện (không phải lỗi của upstream)"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"LLM circuit breaker opened after {self.failures} failures")
+                    metrics.increment('llm_breaker_opened')
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
+
+
+def is_retryable(error):
+    """Lỗi tạm thời: timeout, mất kết nối, 429 hoặc 5xx"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if status in RETRYABLE_STATUS:
+        return True
+    # httpx (dùng bởi google-genai) không kế thừa TimeoutError
+    return type(error).__name__ in ('ReadTimeout', 'ConnectTimeout', 'ConnectError', 'RemoteProtocolError')
+
+
+class ResilientLLMClient(LLMClient):
+    """Deadline, retry with jitter, concurrency limit and circuit breaker around a client"""
+
+    def __init__(self, client, timeout=LLM_TIMEOUT, retries=LLM_RETRIES,
+                 max_concurrency=LLM_MAX_CONCURRENCY, queue_timeout=LLM_QUEUE_TIMEOUT, breaker=None):
+        self.client = client
+        self.name = client.name
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _acquire(self):
+        if not self.breaker.allow():
+            metrics.increment('llm_short_circuited')
+            raise LLMUnavailable('LLM circuit breaker is open')
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            metrics.increment('llm_rejected')
+            self.breaker.release_trial()
+            raise LLMUnavailable('Too many concurrent LLM calls')
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _backoff(self, attempt, deadline):
+        """Exponential backoff with full jitter, never past the deadline"""
+        delay = random.uniform(0, LLM_RETRY_BASE_DELAY * (2 ** attempt))
+        remaining = deadline - time.monotonic()
+        if delay >= remaining:
+            return False
+        time.sleep(delay)
+        return True
+
+    def stream(self, prompt, timeout=None):
+        """
+        Stream with retries; a retry is only made before the first piece was
+        yielded, so the caller never receives a repeated prefix
+
+        Raises:
+            LLMUnavailable: Circuit open, limiter full, deadline exceeded or
+                retries exhausted
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                yielded = False
+                try:
+                    for piece in self.client.stream(prompt, timeout):
+                        if time.monotonic() > deadline:
+                            raise TimeoutError('LLM deadline exceeded')
+                        yielded = True
+                        yield piece
+                    self.breaker.record_success()
+                    metrics.observe('llm_seconds', time.perf_counter() - started)
+                    return
+                except GeneratorExit:
+                    # Client ngắt kết nối giữa chừng: không phải lỗi của upstream
+                    self.breaker.release_trial()
+                    raise
+                except Exception as e:
+                    if not yielded and self._should_retry(e, attempt, deadline):
+                        attempt += 1
+                        continue
+                    self._fail(e)
+        finally:
+            self._release()
+
+    def generate(self, prompt, timeout=None):
+        """
+        Raises:
+            LLMUnavailable: Circuit open, limiter full, deadline exceeded or
+                retries exhausted
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._acquire()
+        started = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    answer = self.client.generate(prompt, deadline - time.monotonic())
+                    if time.monotonic() > deadline:
+                        raise TimeoutError('LLM deadline exceeded')
+                    self.breaker.record_success()
+                    metrics.observe('llm_seconds', time.perf_counter() - started)
+                    return answer
+                except Exception as e:
+                    if self._should_retry(e, attempt, deadline):
+                        attempt += 1
+                        continue
+                    self._fail(e)
+        finally:
+            self._release()
+
+    def _should_retry(self, error, attempt, deadline):
+        if attempt >= self.retries or not is_retryable(error) or not self._backoff(attempt, deadline):
+            return False
+        metrics.increment('llm_retries')
+        logger.warning(f"LLM call failed ({error}), retry {attempt + 1}/{self.retries}")
+        return True
+
+    def _fail(self, error):
+        self.breaker.record_failure()
+        metrics.increment('llm_failures')
+        raise LLMUnavailable(f"LLM call failed: {error}") from error
+
+    def stats(self):
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            'backend': self.name,
+            'timeout': self.timeout,
+            'retries': self.retries,
+            'max_concurrency': self.max_concurrency,
+            'in_flight': in_flight,
+            'breaker': self.breaker.stats()
+        }
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def create_client(backend=LLM_BACKEND):
+    if backend == StubClient.name:
+        return StubClient()
+    if backend != GeminiClient.name:
+        logger.warning(f"Unknown CHATBOT_LLM_BACKEND '{backend}', using Gemini")
+    return GeminiClient()
+
+
+def get_llm():
+    """LLM client shared by the process"""
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = ResilientLLMClient(create_client())
+                logger.info(f"Chatbot LLM backend: {_llm.name}")
+    return _llm
@@ -0,0 +1,150 @@
+"""
+Lazy loading and warm-up of the chatbot subsystem
+
+The chatbot is only loaded when CHATBOT_ENABLED is set, and then either:
+- in the gunicorn master before forking (CHATBOT_PRELOAD + preload_app), so
+  the embedding model is shared copy-on-write by all workers, or
+- in a background thread of each worker (warm-up started from the gunicorn
+  post_fork hook, or by the first chat request).
+
+Requests never block on loading: until the chatbot is ready, the routes answer
+from the fallback responses or with 503, and /api/chatbot/ready reports progress.
+"""
+import logging
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+DISABLED = 'disabled'
+IDLE = 'idle'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ChatbotNotReady(RuntimeError):
+    """Raised when the chatbot is disabled or still warming up"""
+
+
+class ChatbotLoader:
+    """Tracks the warm-up of the chatbot in the current process"""
+
+    def __init__(self):
+        self.enabled = True
+        self.state = IDLE
+        self.error = None
+        self.steps = []
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def configure(self, enabled):
+        with self._lock:
+            self.enabled = enabled
+            if not enabled:
+                self.state = DISABLED
+            elif self.state == DISABLED:
+                self.state = IDLE
+
+    def _step(self, name, fn):
+        step = {'name': name, 'status': LOADING, 'seconds': None}
+        self.steps.append(step)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            step['status'] = FAILED
+            raise
+        finally:
+            step['seconds'] = round(time.perf_counter() - started, 3)
+        step['status'] = READY
+        return step['seconds'], result
+
+    def preload_model(self):
+        """
+        Load only the embedding model (run in the gunicorn master before fork)
+
+        Inference is deliberately not run here: torch and tokenizers thread
+        pools must be created in the workers, after the fork.
+        """
+        if not self.enabled:
+            return None
+        from app.chatbot.rag_model import get_embeddings
+
+        seconds, _ = self._step('embeddings_model', get_embeddings)
+        logger.info(f"Preloaded chatbot embeddings model in {seconds:.2f}s")
+        return seconds
+
+    def warm_up(self):
+        """Load the embedding model and the vector index synchronously"""
+        with self._lock:
+            if self.state in (DISABLED, READY, LOADING):
+                return self.state == READY
+            self.state = LOADING
+            self.error = None
+            self.started_at = time.time()
+            self.steps = [step for step in self.steps if step['status'] == READY]
+
+        try:
+            from app.chatbot.rag_model import get_embeddings, get_chatbot_instance
+
+            if not any(step['name'] == 'embeddings_model' for step in self.steps):
+                self._step('embeddings_model', get_embeddings)
+            self._step('vector_index', get_chatbot_instance)
+            with self._lock:
+                self.state = READY
+                self.finished_at = time.time()
+            logger.info(f"Chatbot ready in {self.finished_at - self.started_at:.2f}s")
+            return True
+        except Exception as e:
+            logger.error(f"Chatbot warm-up failed: {e}")
+            logger.error(traceback.format_exc())
+            with self._lock:
+                self.state = FAILED
+                self.error = str(e)
+                self.finished_at = time.time()
+            return False
+
+    def start_background(self):
+        """Start the warm-up in a daemon thread if it is not running or done"""
+        with self._lock:
+            if self.state not in (IDLE, FAILED):
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self.warm_up, name='chatbot-warmup', daemon=True)
+            self._thread.start()
+
+    def get_chatbot(self):
+        """
+        Return the chatbot if it is ready, otherwise start warming up
+
+        Raises:
+            ChatbotNotReady: If the chatbot is disabled or not loaded yet
+        """
+        if self.state == READY:
+            from app.chatbot.rag_model import get_chatbot_instance
+            return get_chatbot_instance()
+        if self.state == DISABLED:
+            raise ChatbotNotReady('Chatbot is disabled')
+        self.start_background()
+        raise ChatbotNotReady('Chatbot is warming up')
+
+    def status(self):
+        with self._lock:
+            elapsed = None
+            if self.started_at:
+                elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+            return {
+                'state': self.state,
+                'ready': self.state == READY,
+                'steps': [dict(step) for step in self.steps],
+                'elapsed_seconds': elapsed,
+                'error': self.error
+            }
+
+
+loader = ChatbotLoader()
@@ -0,0 +1,75 @@
+"""
+Process-local metrics of the chatbot
+
+Each metric keeps its last WINDOW observations; /api/chatbot/metrics reports
+count and percentiles for the worker that serves the request.
+"""
+import threading
+from collections import deque
+
+WINDOW = 1000
+
+
+class Histogram:
+    """Sliding window of observations with percentiles"""
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self._values.append(value)
+
+    def snapshot(self):
+        with self._lock:
+            values = sorted(self._values)
+            count = self.count
+        if not values:
+            return {'count': count}
+
+        def percentile(p):
+            return round(values[min(len(values) - 1, int(p * len(values)))], 4)
+
+        return {
+            'count': count,
+            'mean': round(sum(values) / len(values), 4),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+            'max': round(values[-1], 4)
+        }
+
+
+class Metrics:
+    """Named histograms and counters"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        histogram.observe(value)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            'histograms': {name: histogram.snapshot() for name, histogram in sorted(histograms.items())},
+            'counters': counters
+        }
+
+
+metrics = Metrics()
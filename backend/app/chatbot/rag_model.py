@@ -1,21 +1,22 @@
 """
 RAG (Retrieval Augmented Generation) Chatbot Model
+
+Heavy dependencies (torch, langchain, google-genai) are imported inside
+the functions that need them, so importing this module (e.g. when the chatbot
+blueprint is registered) costs nothing until the chatbot is actually loaded.
 """
 import os
 import logging
+import threading
+import time
 import traceback
-from typing import List, Dict, Any, Optional
-import numpy as np
+from typing import List, Dict, Any, Iterator, Optional
 from pathlib import Path
-from collections import deque
 
-# Langchain imports
-from google import genai
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from langchain.prompts import PromptTemplate
+from app.chatbot.indexer import KnowledgeBaseIndexer
+from app.chatbot.embeddings import create_embeddings, index_key
+from app.chatbot.fallback import get_fallback_answer
+from app.chatbot.llm import LLMUnavailable, get_llm
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -26,11 +27,99 @@ logger = logging.getLogger(__name__)
 KNOWLEDGE_BASE_DIR = Path(os.path.dirname(os.path.abspath(__file__))) / "knowledge_base"
 FAISS_INDEX_PATH = Path(os.path.dirname(os.path.abspath(__file__))) / "vector_store"
 EMBEDDINGS_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"  # Multilingual model supporting Vietnamese
+# torch | torch-int8 | onnx | onnx-int8 (see embeddings.py)
+EMBEDDINGS_BACKEND = os.getenv("CHATBOT_EMBEDDINGS_BACKEND", "torch")
+EMBEDDINGS_CACHE_DIR = Path(os.getenv("CHATBOT_EMBEDDINGS_CACHE", Path(os.path.dirname(os.path.abspath(__file__))) / "models"))
+EMBEDDINGS_INDEX_KEY = index_key(EMBEDDINGS_BACKEND, EMBEDDINGS_MODEL)
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
 TOP_K_RESULTS = 5  # Increased to get more context
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") 
 MAX_HISTORY_LENGTH = 10  # Maximum number of messages to keep in conversation history
+ERROR_ANSWER = "Xin lỗi, tôi đang gặp sự cố kỹ thuật. Vui lòng thử lại sau hoặc liên hệ với bộ phận hỗ trợ của chúng tôi."
+INDEX_CHECK_INTERVAL = float(os.getenv("CHATBOT_INDEX_CHECK_INTERVAL", "10"))  # seconds between checks for a new index version
+
+# Semantic answer cache (see answer_cache.py)
+ANSWER_CACHE_ENABLED = os.getenv("CHATBOT_ANSWER_CACHE", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("CHATBOT_ANSWER_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+ANSWER_CACHE_TTL = int(os.getenv("CHATBOT_ANSWER_CACHE_TTL", "3600"))  # seconds
+ANSWER_CACHE_MAX_ENTRIES = 1000
+
+# Product catalog index (see catalog.py)
+CATALOG_ENABLED = os.getenv("CHATBOT_CATALOG", "true").lower() == "true"
+CATALOG_TOP_K = 3
+
+# Embedding model shared by every chatbot instance of the process
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+_answer_cache = None
+_catalog_index = None
+_embedding_batcher = None
+_search_batcher = None
+
+def get_embeddings():
+    """
+    Load the embedding model once per process
+    
+    When gunicorn preloads the app (see gunicorn.conf.py) this runs in the
+    master, and the forked workers share the model weights copy-on-write.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                logger.info(f"Loading embeddings model: {EMBEDDINGS_MODEL} ({EMBEDDINGS_BACKEND})")
+                _embeddings = create_embeddings(EMBEDDINGS_BACKEND, EMBEDDINGS_MODEL, str(EMBEDDINGS_CACHE_DIR))
+                logger.info("Embeddings model loaded successfully")
+    return _embeddings
+
+def get_answer_cache():
+    """Semantic answer cache of the process, None if disabled"""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        with _embeddings_lock:
+            if _answer_cache is None:
+                from app.chatbot.answer_cache import SemanticAnswerCache
+                _answer_cache = SemanticAnswerCache(
+                    threshold=ANSWER_CACHE_THRESHOLD,
+                    ttl=ANSWER_CACHE_TTL,
+                    max_entries=ANSWER_CACHE_MAX_ENTRIES
+                )
+    return _answer_cache
+
+def get_catalog_index():
+    """Product catalog index of the process, None if disabled"""
+    global _catalog_index
+    if not CATALOG_ENABLED:
+        return None
+    if _catalog_index is None:
+        with _embeddings_lock:
+            if _catalog_index is None:
+                from app.chatbot.catalog import CatalogIndex
+                _catalog_index = CatalogIndex(get_embeddings())
+    return _catalog_index
+
+def get_batchers():
+    """
+    Micro-batchers for question embeddings and vector searches, (None, None) if disabled
+    
+    Concurrent requests of a worker share one model forward pass and one
+    vector search (see batching.py).
+    """
+    global _embedding_batcher, _search_batcher
+    from app.chatbot.batching import MICROBATCH_ENABLED, MicroBatcher, embed_batch, search_batch
+    
+    if not MICROBATCH_ENABLED:
+        return None, None
+    if _embedding_batcher is None:
+        with _embeddings_lock:
+            if _embedding_batcher is None:
+                embeddings = get_embeddings()
+                _search_batcher = MicroBatcher('search', search_batch)
+                _embedding_batcher = MicroBatcher('embed', lambda questions: embed_batch(embeddings, questions))
+    return _embedding_batcher, _search_batcher
 
 class RAGChatbot:
     """RAG-based Chatbot class for customer support"""
@@ -40,7 +129,7 @@ class RAGChatbot:
         Initialize the RAG chatbot
         
         Args:
-            rebuild_index: Whether to rebuild the vector index from knowledge base files
+            rebuild_index: Re-embed every knowledge base file instead of only the changed ones
         """
         try:
             logger.info("Initializing RAG chatbot")
@@ -48,36 +137,28 @@ class RAGChatbot:
             # Create directories if they don't exist
             os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
             
-            # Initialize conversation history as a deque with max length
-            self.conversation_history = deque(maxlen=MAX_HISTORY_LENGTH)
+            from langchain.prompts import PromptTemplate
             
             # Initialize embeddings
-            logger.info(f"Loading embeddings model: {EMBEDDINGS_MODEL}")
-            self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL)
-            logger.info("Embeddings model loaded successfully")
+            self.embeddings = get_embeddings()
             
-            if rebuild_index or not os.path.exists(FAISS_INDEX_PATH):
-                logger.info("Building vector store from knowledge base...")
-                self.vectorstore = self._build_vectorstore()
-            else:
-                try:
-                    logger.info("Loading existing vector store...")
-                    # Check if index file exists before trying to load
-                    index_file = os.path.join(FAISS_INDEX_PATH, "index.faiss")
-                    docstore_file = os.path.join(FAISS_INDEX_PATH, "index.pkl")
-                    
-                    if not (os.path.exists(index_file) and os.path.exists(docstore_file)):
-                        logger.warning(f"Vector store files not found at {FAISS_INDEX_PATH}")
-                        logger.info("Rebuilding vector store...")
-                        self.vectorstore = self._build_vectorstore()
-                    else:
-                        self.vectorstore = FAISS.load_local(str(FAISS_INDEX_PATH), self.embeddings)
-                        logger.info("Vector store loaded successfully")
-                except Exception as e:
-                    logger.error(f"Error loading vector store: {e}")
-                    logger.error(traceback.format_exc())
-                    logger.info("Rebuilding vector store...")
-                    self.vectorstore = self._build_vectorstore()
+            # Index được build tăng dần và ghi theo version (xem indexer.py)
+            self.indexer = KnowledgeBaseIndexer(
+                KNOWLEDGE_BASE_DIR, FAISS_INDEX_PATH, self.embeddings, EMBEDDINGS_INDEX_KEY,
+                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+            )
+            self.index_version = None
+            self.vectorstore = None
+            self._last_index_check = 0.0
+            self._swap_lock = threading.Lock()
+            try:
+                # Đồng bộ với knowledge base: chỉ embed lại file mới hoặc đã sửa
+                self.rebuild(full=rebuild_index)
+            except Exception as e:
+                if rebuild_index or self.indexer.current_version() is None:
+                    raise
+                logger.error(f"Error updating vector index, using the current version: {e}")
+                self.refresh_index(force=True)
             
             # Define the prompt template for customer support
             self.prompt_template = PromptTemplate(
@@ -111,149 +192,243 @@ class RAGChatbot:
             logger.error(traceback.format_exc())
             raise
     
-    def _build_vectorstore(self) -> FAISS:
-        """Build the vector store from knowledge base files"""
+    def rebuild(self, full: bool = False) -> Dict[str, Any]:
+        """
+        Update the index from the knowledge base and swap it in
+        
+        Only new or modified files are re-embedded unless full is set.
+        """
+        stats = self.indexer.update(full=full)
+        self._swap(stats['version'])
+        return stats
+    
+    def refresh_index(self, force: bool = False) -> bool:
+        """
+        Swap in the index version published by another process, if any
+        
+        CURRENT is checked at most every INDEX_CHECK_INTERVAL seconds, so
+        workers pick up a rebuild without restarting.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_index_check < INDEX_CHECK_INTERVAL:
+            return False
+        self._last_index_check = now
+        version = self.indexer.current_version()
+        if version is None or version == self.index_version:
+            return False
+        return self._swap(version)
+    
+    def _swap(self, version: str) -> bool:
+        with self._swap_lock:
+            if version == self.index_version:
+                return False
+            _, vectorstore = self.indexer.load(version)
+            old_version = self.index_version
+            # Gán một lần: request đang chạy vẫn dùng index cũ đến khi xong
+            self.vectorstore = vectorstore
+            self.index_version = version
+        if old_version is not None and _answer_cache is not None:
+            # Câu trả lời đã cache dựa trên index cũ
+            _answer_cache.invalidate()
+        logger.info(f"Using knowledge base index {version} ({vectorstore.size} chunks)")
+        return True
+    
+    def get_product_context(self, question: str, query_vector) -> tuple:
+        """Product context from the catalog index; ([], []) if disabled or unavailable"""
+        catalog = get_catalog_index()
+        if catalog is None:
+            return [], []
         try:
-            # Ensure knowledge base directory exists
-            if not os.path.exists(KNOWLEDGE_BASE_DIR):
-                logger.warning(f"Knowledge base directory not found: {KNOWLEDGE_BASE_DIR}")
-                os.makedirs(KNOWLEDGE_BASE_DIR, exist_ok=True)
-                logger.info(f"Created knowledge base directory: {KNOWLEDGE_BASE_DIR}")
-                
-                # Create a sample knowledge file if none exists
-                if not any(KNOWLEDGE_BASE_DIR.glob("*.txt")):
-                    sample_path = KNOWLEDGE_BASE_DIR / "sample.txt"
-                    with open(sample_path, 'w', encoding='utf-8') as f:
-                        f.write("Câu hỏi: Làm thế nào để tạo tài khoản mới?\n")
-                        f.write("Trả lời: Để tạo tài khoản mới, bạn có thể nhấn vào nút 'Đăng ký' ở góc phải trên cùng của trang web.\n\n")
-                    logger.info(f"Created sample knowledge file: {sample_path}")
-            
-            # Get all text files from knowledge base directory
-            text_files = list(KNOWLEDGE_BASE_DIR.glob("*.txt"))
-            
-            if not text_files:
-                logger.warning("No text files found in knowledge base directory")
-                sample_path = KNOWLEDGE_BASE_DIR / "sample.txt"
-                with open(sample_path, 'w', encoding='utf-8') as f:
-                    f.write("Câu hỏi: Làm thế nào để tạo tài khoản mới?\n")
-                    f.write("Trả lời: Để tạo tài khoản mới, bạn có thể nhấn vào nút 'Đăng ký' ở góc phải trên cùng của trang web.\n\n")
-                text_files = [sample_path]
-                logger.info(f"Created sample knowledge file: {sample_path}")
-            
-            # Load and combine all text documents
-            raw_documents = []
-            for file_path in text_files:
-                try:
-                    logger.info(f"Reading file: {file_path}")
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        raw_documents.append(Document(page_content=content, metadata={"source": file_path.name}))
-                except Exception as e:
-                    logger.error(f"Error reading file {file_path}: {e}")
-            
-            if not raw_documents:
-                logger.warning("No documents loaded from knowledge base files")
-                # Create a dummy document
-                raw_documents.append(Document(
-                    page_content="Đây là nội dung mẫu cho chatbot.",
-                    metadata={"source": "default.txt"}
-                ))
-            
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP
-            )
-            documents = text_splitter.split_documents(raw_documents)
-            logger.info(f"Created {len(documents)} document chunks from {len(text_files)} files")
-            
-            # Create vector store
-            vectorstore = FAISS.from_documents(documents, self.embeddings)
-            
-            # Save the vector store
-            try:
-                os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
-                full_path = os.path.join(FAISS_INDEX_PATH, "index.faiss")
-                # Make sure parent directory exists
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                logger.info(f"Saving vector store to {full_path}")
-                vectorstore.save_local("app/chatbot/vector_store")
-                logger.info(f"Vector store saved to {FAISS_INDEX_PATH}")
-            except Exception as e:
-                logger.error(f"Failed to save vector store: {e}")
-                logger.error(traceback.format_exc())
-                # Continue even if saving fails
-                logger.info("Will continue with in-memory vector store")
-            
-            return vectorstore
+            return catalog.context(question, query_vector, k=CATALOG_TOP_K)
         except Exception as e:
-            logger.error(f"Error building vector store: {e}")
-            logger.error(traceback.format_exc())
-            raise
+            # Chatbot vẫn trả lời từ knowledge base nếu không đọc được catalog
+            logger.error(f"Error retrieving product context: {e}")
+            return [], []
+    
+    @staticmethod
+    def format_history(history: Optional[List[Dict[str, str]]]) -> str:
+        """Format conversation messages ({'role', 'content'}) for the prompt"""
+        labels = {"user": "Khách hàng", "assistant": "Trợ lý"}
+        return "\n".join(
+            f"{labels.get(message['role'], message['role'])}: {message['content']}"
+            for message in (history or [])[-MAX_HISTORY_LENGTH:]
+        )
     
-    def get_answer(self, question: str) -> Dict[str, Any]:
+    def prepare(self, question: str, history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """
+        Retrieve the context of a question and build the LLM prompt
+
+        Returns:
+            Dict with "cached" (the cached result, or None), "prompt", "sources",
+            and what remember() needs to cache the generated answer
+        """
+        self.refresh_index()
+
+        # Embed the question once: used by the answer cache and the retrieval
+        embedding_batcher, search_batcher = get_batchers()
+        if embedding_batcher is not None:
+            query_vector = embedding_batcher.submit(question)
+        else:
+            query_vector = self.embeddings.embed_query(question)
+
+        # Câu hỏi độc lập (không có lịch sử) có thể dùng lại câu trả lời đã cache
+        cache = get_answer_cache() if not history else None
+        if cache is not None:
+            cached = cache.lookup(query_vector)
+            if cached:
+                logger.info(f"Answer cache hit (similarity {cached['similarity']:.3f}): {cached['question']}")
+                return {"cached": {"answer": cached['answer'], "sources": cached['sources'], "cached": True}}
+
+        # Search for relevant documents
+        if search_batcher is not None:
+            docs = search_batcher.submit((self.vectorstore, query_vector, TOP_K_RESULTS))
+        else:
+            docs = self.vectorstore.search(query_vector, k=TOP_K_RESULTS)
+        logger.info(f"Retrieved {len(docs)} relevant documents")
+
+        # Extract and combine relevant contexts
+        contexts = [doc['text'] for doc in docs]
+        # sources = [doc['source'] for doc in docs]
+
+        # Sản phẩm liên quan, dựng từ bảng products nên giá và tồn kho luôn mới
+        product_contexts, sources = self.get_product_context(question, query_vector)
+        if product_contexts:
+            contexts = ["Thông tin sản phẩm hiện tại:\n" + "\n\n".join(product_contexts)] + contexts
+        context_text = "\n\n".join(contexts)
+
+        logger.debug(f"Context for question: {context_text[:500]}...")
+
+        # Format the prompt with the question, context, and conversation history
+        history_text = self.format_history(history)
+        prompt_text = self.prompt_template.format(
+            question=question,
+            context=context_text,
+            history=history_text
+        )
+        return {
+            "cached": None,
+            "prompt": prompt_text,
+            "sources": sources,
+            "question": question,
+            "query_vector": query_vector,
+            # Câu trả lời về sản phẩm không cache: giá và tồn kho thay đổi
+            "cache": cache if not product_contexts else None
+        }
+
+    @staticmethod
+    def remember(prepared: Dict[str, Any], answer: str):
+        """Store a generated answer in the answer cache when allowed"""
+        if prepared.get("cache") is not None and answer:
+            prepared["cache"].store(prepared["query_vector"], prepared["question"], answer)
+
+    def get_answer(self, question: str, history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
         """
         Get answer for a customer question
-        
+
+        The chatbot keeps no per-conversation state: the caller passes the
+        history (see app.chatbot.conversation) and stores the new turn.
+
         Args:
             question: Customer's question in Vietnamese
-            
+            history: Previous messages of the conversation, oldest first
+
         Returns:
-            Dict containing the answer and relevant sources
+            Dict containing the answer and relevant sources ("error" is set if generation failed)
         """
         try:
             logger.info(f"Processing question: {question}")
-            
-            # Search for relevant documents
-            docs = self.vectorstore.similarity_search(question, k=TOP_K_RESULTS)
-            logger.info(f"Retrieved {len(docs)} relevant documents")
-            
-            # Extract and combine relevant contexts
-            contexts = [doc.page_content for doc in docs]
-            # sources = [doc.metadata.get("source", "Unknown") for doc in docs]
-            context_text = "\n\n".join(contexts)
-            
-            logger.debug(f"Context for question: {context_text[:500]}...")
-            
-            # Format the prompt with the question, context, and conversation history
-            history_text = "\n".join(self.conversation_history)
-            prompt_text = self.prompt_template.format(
-                question=question,
-                context=context_text,
-                history=history_text
-            )
+            prepared = self.prepare(question, history)
+            if prepared["cached"]:
+                return prepared["cached"]
 
-            # Use gemini from google
-            client = genai.Client(api_key=GOOGLE_API_KEY)
-            model_name = "gemini-2.0-flash"
-            answer = client.models.generate_content(contents=prompt_text, model=model_name).text
-            
-            # Update conversation history
-            self.conversation_history.append(f"Khách hàng: {question}")
-            self.conversation_history.append(f"Trợ lý: {answer}")
-            
+            answer = get_llm().generate(prepared["prompt"])
             logger.info(f"Generated answer: {answer[:100]}...")
-            
-            return {"answer": answer}
+
+            self.remember(prepared, answer)
+            return {"answer": answer, "sources": prepared["sources"]}
+        except LLMUnavailable as e:
+            logger.warning(f"LLM unavailable, using fallback answer: {e}")
+            return self.fallback_result(question, e)
         except Exception as e:
             logger.error(f"Error getting answer: {e}")
             logger.error(traceback.format_exc())
             return {
-                "answer": "Xin lỗi, tôi đang gặp sự cố kỹ thuật. Vui lòng thử lại sau hoặc liên hệ với bộ phận hỗ trợ của chúng tôi.",
-                "sources": []
+                "answer": ERROR_ANSWER,
+                "sources": [],
+                "error": str(e)
             }
 
+    @staticmethod
+    def fallback_result(question: str, error: Exception) -> Dict[str, Any]:
+        """Canned answer used when the LLM is unavailable ("error" is set if there is none)"""
+        fallback_answer = get_fallback_answer(question)
+        if fallback_answer:
+            return {"answer": fallback_answer, "sources": ["fallback_responses"], "fallback": True}
+        return {"answer": ERROR_ANSWER, "sources": [], "error": str(error)}
+    
+    def stream_answer(self, question: str, history: Optional[List[Dict[str, str]]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question as a stream of events
+
+        Yields:
+            {"type": "token", "text": str} for each piece of the answer, then
+            {"type": "done", "answer", "sources"[, "cached"]} or
+            {"type": "error", "answer", "partial", "error"} if generation failed
+        """
+        pieces = []
+        try:
+            logger.info(f"Processing streamed question: {question}")
+            prepared = self.prepare(question, history)
+            if prepared["cached"]:
+                # Câu trả lời đã cache được gửi trong một token
+                yield {"type": "token", "text": prepared["cached"]["answer"]}
+                yield dict(prepared["cached"], type="done")
+                return
+
+            for text in get_llm().stream(prepared["prompt"]):
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+
+            answer = "".join(pieces)
+            logger.info(f"Streamed answer: {answer[:100]}...")
+            self.remember(prepared, answer)
+            yield {"type": "done", "answer": answer, "sources": prepared["sources"]}
+        except LLMUnavailable as e:
+            logger.warning(f"LLM unavailable, using fallback answer: {e}")
+            result = self.fallback_result(question, e)
+            if "error" in result or pieces:
+                yield {"type": "error", "answer": result["answer"], "partial": "".join(pieces), "error": str(e)}
+            else:
+                yield {"type": "token", "text": result["answer"]}
+                yield dict(result, type="done")
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}")
+            logger.error(traceback.format_exc())
+            yield {"type": "error", "answer": ERROR_ANSWER, "partial": "".join(pieces), "error": str(e)}
+
 
 # Singleton instance
 _chatbot_instance = None
+_instance_lock = threading.Lock()
 
 def get_chatbot_instance(rebuild_index: bool = False) -> RAGChatbot:
-    """Get the singleton chatbot instance"""
+    """
+    Get the singleton chatbot instance
+    
+    Args:
+        rebuild_index: Re-embed the whole knowledge base (the existing
+            instance swaps in the new index instead of being recreated)
+    """
     global _chatbot_instance
     try:
-        if _chatbot_instance is None or rebuild_index:
-            logger.info(f"Creating new chatbot instance (rebuild_index={rebuild_index})")
-            _chatbot_instance = RAGChatbot(rebuild_index=rebuild_index)
+        if _chatbot_instance is None:
+            with _instance_lock:
+                if _chatbot_instance is None:
+                    logger.info(f"Creating new chatbot instance (rebuild_index={rebuild_index})")
+                    _chatbot_instance = RAGChatbot(rebuild_index=rebuild_index)
+                    return _chatbot_instance
+        if rebuild_index:
+            _chatbot_instance.rebuild(full=True)
         return _chatbot_instance
     except Exception as e:
         logger.error(f"Error getting chatbot instance: {e}")
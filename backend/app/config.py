@@ -24,6 +24,52 @@ class Config:
     os.makedirs(STATIC_FOLDER, exist_ok=True)
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
+    # Cấu hình tìm kiếm sản phẩm: 'memory' (chỉ mục BM25 trong bộ nhớ) hoặc 'database' (SQLite FTS5 / PostgreSQL)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'memory'
+    SEARCH_REFRESH_INTERVAL = int(os.environ.get('SEARCH_REFRESH_INTERVAL') or 30)  # giây
+    SEARCH_MAX_RESULTS = 1000
+    
+    # Raise khi một route vượt số query khai báo bằng @query_budget (bật khi chạy test)
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '').lower() == 'true'
+    
+    # bcrypt: cost factor và pool giới hạn số hash chạy đồng thời
+    # (BCRYPT_POOL_SIZE mặc định bằng số core, 0 = hash trực tiếp trên luồng request)
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS') or 12)
+    BCRYPT_POOL_SIZE = int(os.environ['BCRYPT_POOL_SIZE']) if os.environ.get('BCRYPT_POOL_SIZE') else None
+    BCRYPT_MAX_QUEUED = int(os.environ.get('BCRYPT_MAX_QUEUED') or 32)
+    BCRYPT_QUEUE_TIMEOUT = float(os.environ.get('BCRYPT_QUEUE_TIMEOUT') or 2)  # giây
+    
+    # Biến thể ảnh sản phẩm (WebP + JPEG) sinh trên worker nền khi upload
+    IMAGE_VARIANT_WIDTHS = (200, 400, 800)
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 1)
+    
+    # Giao việc gửi file upload cho proxy phía trước:
+    # UPLOADS_ACCEL_REDIRECT = location nội bộ của nginx trỏ tới UPLOAD_FOLDER (vd. '/_uploads/'),
+    # UPLOADS_X_SENDFILE = true cho Apache mod_xsendfile / lighttpd
+    UPLOADS_ACCEL_REDIRECT = os.environ.get('UPLOADS_ACCEL_REDIRECT')
+    UPLOADS_X_SENDFILE = os.environ.get('UPLOADS_X_SENDFILE', '').lower() == 'true'
+    
+    # Chatbot: CHATBOT_ENABLED=false để không tải model/index; CHATBOT_PRELOAD tải embedding model
+    # ngay trong create_app (gunicorn master với preload_app, xem gunicorn.conf.py)
+    CHATBOT_ENABLED = os.environ.get('CHATBOT_ENABLED', 'true').lower() == 'true'
+    CHATBOT_PRELOAD = os.environ.get('CHATBOT_PRELOAD', '').lower() == 'true'
+    # Lịch sử hội thoại: 'memory' (mỗi worker) hoặc 'database' (bảng chat_messages, dùng chung)
+    CHATBOT_HISTORY_BACKEND = os.environ.get('CHATBOT_HISTORY_BACKEND') or 'memory'
+    CHATBOT_HISTORY_TTL = int(os.environ.get('CHATBOT_HISTORY_TTL') or 1800)  # giây
+    CHATBOT_HISTORY_MAX_MESSAGES = 10
+    CHATBOT_HISTORY_MAX_SESSIONS = 10000
+    
+    # Thời gian cache trạng thái admin của người dùng khi kiểm tra quyền (giây)
+    ADMIN_STATUS_CACHE_TTL = int(os.environ.get('ADMIN_STATUS_CACHE_TTL') or 60)
+    
+    # Bảng thống kê đơn hàng theo ngày cho dashboard (tắt thì dashboard tính trực tiếp từ orders)
+    ORDER_STATS_ROLLUP = os.environ.get('ORDER_STATS_ROLLUP', 'true').lower() == 'true'
+    
+    # Giữ hàng khi đặt: đơn VNPay chưa thanh toán sau STOCK_RESERVATION_TIMEOUT giây bị hủy và hoàn kho
+    # (kiểm tra tối đa mỗi STOCK_RESERVATION_SWEEP_INTERVAL giây mỗi worker, hoặc chạy release_reservations.py)
+    STOCK_RESERVATION_TIMEOUT = int(os.environ.get('STOCK_RESERVATION_TIMEOUT') or 900)
+    STOCK_RESERVATION_SWEEP_INTERVAL = int(os.environ.get('STOCK_RESERVATION_SWEEP_INTERVAL') or 60)
+    
     # Giới hạn kích thước upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     
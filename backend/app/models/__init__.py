@@ -1,5 +1,10 @@
 from app.models.user import User
 from app.models.product import Product
-from app.models.category import Category
+from app.models.product_size import ProductSize
+from app.models.category import Category, CategoryClosure
 from app.models.cart import Cart, CartItem
 from app.models.order import Order, OrderItem, OrderStatus, PaymentStatus, PaymentMethod
+from app.models.cache_version import CacheVersion
+from app.models.order_stats import OrderStatsDaily
+from app.models.chat import ChatMessage
+from app.models.catalog_change import CatalogChange
@@ -0,0 +1,31 @@
+from app import db
+
+class CacheVersion(db.Model):
+    """
+    Version stamp for process-local caches
+    
+    Every gunicorn worker keeps its own cached copy of derived data (e.g. the
+    category tree). Writers bump the stamp in the same transaction as the data
+    change, and readers compare it with the version of their cached copy, so
+    all workers see the change on their next request.
+    """
+    __tablename__ = 'cache_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    @classmethod
+    def get(cls, name):
+        """Current version of a cache (0 if it was never bumped)"""
+        version = db.session.query(cls.version).filter(cls.name == name).scalar()
+        return version or 0
+    
+    @classmethod
+    def bump(cls, name):
+        """Increment the version; the caller commits it together with the data change"""
+        updated = db.session.execute(
+            db.update(cls).where(cls.name == name).values(version=cls.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.add(cls(name=name, version=1))
@@ -3,23 +3,81 @@ from datetime import datetime
 from sqlalchemy.orm import relationship
 
 class Cart(db.Model):
+    """
+    Giỏ hàng kèm tổng số lượng và tạm tính được cập nhật dần theo từng thao tác
+
+    total_items / subtotal được cộng trừ bằng UPDATE nguyên tử trong cùng giao
+    dịch với thay đổi cart_items, nên một thao tác không cần đọc lại cả giỏ để
+    trả về tổng mới. version tăng sau mỗi thay đổi: client so sánh với version
+    của bản giỏ hàng đang giữ để biết có thể áp dụng delta hay phải tải lại.
+    """
     __tablename__ = 'carts'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    total_items = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    subtotal = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     items = relationship('CartItem', backref='cart', lazy=True, cascade='all, delete-orphan')
     
+    @classmethod
+    def add_to_totals(cls, cart_id, quantity, amount):
+        """Cộng quantity / amount vào tổng của giỏ và tăng version; người gọi commit"""
+        db.session.execute(
+            db.update(cls).where(cls.id == cart_id).values(
+                total_items=cls.total_items + quantity,
+                subtotal=cls.subtotal + amount,
+                version=cls.version + 1
+            ).execution_options(synchronize_session=False)
+        )
+    
+    @classmethod
+    def recalculate(cls, cart_ids):
+        """Tính lại tổng của các giỏ từ cart_items (khi giá sản phẩm đổi, sau checkout); người gọi commit"""
+        cart_ids = list(cart_ids)
+        if not cart_ids:
+            return
+        from app.models.product import Product
+        
+        total_items = db.select(db.func.coalesce(db.func.sum(CartItem.quantity), 0)).where(
+            CartItem.cart_id == cls.id
+        ).scalar_subquery()
+        subtotal = db.select(db.func.coalesce(db.func.sum(CartItem.quantity * Product.price), 0)).join(
+            Product, Product.id == CartItem.product_id
+        ).where(CartItem.cart_id == cls.id).scalar_subquery()
+        db.session.execute(
+            db.update(cls).where(cls.id.in_(cart_ids)).values(
+                total_items=total_items,
+                subtotal=subtotal,
+                version=cls.version + 1
+            ).execution_options(synchronize_session=False)
+        )
+    
+    @classmethod
+    def recalculate_for_product(cls, product_id):
+        """Tính lại tổng của mọi giỏ có sản phẩm này; người gọi commit"""
+        cart_ids = db.session.query(CartItem.cart_id).filter(CartItem.product_id == product_id).distinct()
+        cls.recalculate(cart_id for cart_id, in cart_ids)
+    
+    @classmethod
+    def totals(cls, cart_id):
+        """(total_items, subtotal, version) hiện tại, kể cả thay đổi chưa commit của giao dịch"""
+        return db.session.execute(
+            db.select(cls.total_items, cls.subtotal, cls.version).where(cls.id == cart_id)
+        ).one()
+    
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'items': [item.to_dict() for item in self.items],
-            'total_items': sum(item.quantity for item in self.items),
-            'total_price': sum(item.product.price * item.quantity for item in self.items if item.product),
+            'total_items': self.total_items,
+            'total_price': self.subtotal,
+            'version': self.version,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
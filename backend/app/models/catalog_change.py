@@ -0,0 +1,90 @@
+from app import db
+from datetime import datetime, timedelta
+
+class CatalogChange(db.Model):
+    """
+    Change queue of the product catalog
+
+    Writers append one row per created/updated/deleted product in the same
+    transaction as the change. Consumers (the chatbot catalog index of each
+    worker) remember the last id they applied and read the rows after it, so
+    they update incrementally instead of re-reading the whole catalog.
+
+    Ids are not handed out in commit order: on PostgreSQL a transaction takes
+    its id from the sequence at INSERT time and may commit after a transaction
+    holding a higher id. Consumers therefore also re-read the ids written in
+    the last COMMIT_LAG (recent_ids) and apply any they have not seen yet.
+    Only a transaction that stays open longer than COMMIT_LAG after writing
+    its change can still be missed, until the periodic full rebuild.
+    """
+    __tablename__ = 'catalog_changes'
+
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+
+    # Thời gian tối đa giữa lúc ghi thay đổi và lúc giao dịch commit mà người đọc còn bắt được
+    COMMIT_LAG = timedelta(minutes=5)
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)  # không dùng FK: sản phẩm có thể đã bị xóa
+    op = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_catalog_changes_created_at', 'created_at'),
+    )
+
+    @classmethod
+    def record(cls, product_id, op=UPSERT):
+        """Ghi nhận thay đổi của một sản phẩm; người gọi commit cùng thay đổi dữ liệu"""
+        db.session.add(cls(product_id=product_id, op=op))
+
+    @classmethod
+    def record_many(cls, product_ids, op=UPSERT):
+        product_ids = list(product_ids)
+        if product_ids:
+            db.session.execute(db.insert(cls), [
+                {'product_id': product_id, 'op': op, 'created_at': datetime.utcnow()}
+                for product_id in product_ids
+            ])
+
+    @classmethod
+    def latest_id(cls):
+        return db.session.query(db.func.max(cls.id)).scalar() or 0
+
+    @classmethod
+    def recent_ids(cls):
+        """Id các thay đổi ghi trong COMMIT_LAG gần nhất (đã commit tại thời điểm đọc)"""
+        cutoff = datetime.utcnow() - cls.COMMIT_LAG
+        return {change_id for change_id, in db.session.query(cls.id).filter(cls.created_at >= cutoff)}
+
+    @classmethod
+    def since(cls, last_id, late_ids=(), limit=1000):
+        """
+        Thay đổi sau last_id cùng các thay đổi late_ids (id nhỏ hơn nhưng commit
+        muộn), gộp theo sản phẩm (thao tác cuối cùng thắng)
+
+        Returns:
+            tuple: (largest id read, {product_id: op}, set of ids read)
+        """
+        condition = cls.id > last_id
+        if late_ids:
+            condition = db.or_(condition, cls.id.in_(list(late_ids)))
+        rows = db.session.query(cls.id, cls.product_id, cls.op).filter(
+            condition
+        ).order_by(cls.id).limit(limit).all()
+        changes = {}
+        read_ids = set()
+        for change_id, product_id, op in rows:
+            changes[product_id] = op
+            read_ids.add(change_id)
+            last_id = max(last_id, change_id)
+        return last_id, changes, read_ids
+
+    @classmethod
+    def purge(cls, older_than):
+        """Xóa các thay đổi cũ hơn older_than (datetime); người gọi commit"""
+        return db.session.execute(
+            db.delete(cls).where(cls.created_at < older_than)
+            .execution_options(synchronize_session=False)
+        ).rowcount
@@ -57,7 +57,23 @@ class Category(db.Model):
             
         return slug
     
-    def to_dict(self):
+    def to_dict(self, product_count=None, has_children=None):
+        """
+        Serialize the category
+        
+        product_count and has_children can be passed in when they were computed
+        in bulk (see Category.get_tree_stats); otherwise they are fetched with
+        COUNT queries instead of loading every product/child row.
+        """
+        if product_count is None:
+            from app.models.product import Product
+            product_count = db.session.query(db.func.count(Product.id))\
+                .filter(Product.category_id == self.id).scalar()
+        if has_children is None:
+            has_children = db.session.query(
+                db.exists().where(Category.parent_id == self.id)
+            ).scalar()
+        
         return {
             'id': self.id,
             'name': self.name,
@@ -67,38 +83,218 @@ class Category(db.Model):
             'parent_id': self.parent_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'has_children': len(self.children) > 0 if self.children else False,
-            'product_count': len(self.products) if self.products else 0
+            'has_children': bool(has_children),
+            'product_count': product_count
         }
     
+    @staticmethod
+    def get_tree_stats():
+        """
+        Product counts and child counts for every category, one GROUP BY each
+        
+        Returns:
+            tuple: ({category_id: product_count}, {category_id: child_count})
+        """
+        from app.models.product import Product
+        product_counts = dict(
+            db.session.query(Product.category_id, db.func.count(Product.id))
+            .group_by(Product.category_id).all()
+        )
+        child_counts = dict(
+            db.session.query(Category.parent_id, db.func.count(Category.id))
+            .filter(Category.parent_id.isnot(None))
+            .group_by(Category.parent_id).all()
+        )
+        return product_counts, child_counts
+    
     def get_all_children(self):
-        """Get all child categories recursively"""
-        all_children = []
-        for child in self.children:
-            all_children.append(child)
-            all_children.extend(child.get_all_children())
-        return all_children
+        """Get all descendant categories (any depth) with a single query"""
+        return Category.query.join(
+            CategoryClosure, CategoryClosure.descendant_id == Category.id
+        ).filter(
+            CategoryClosure.ancestor_id == self.id,
+            CategoryClosure.depth > 0
+        ).order_by(CategoryClosure.depth, Category.id).all()
     
     def get_products_count(self):
         """Count all products in this category and its sub-categories"""
-        count = len(self.products)
-        for child in self.children:
-            count += child.get_products_count()
-        return count
+        from app.models.product import Product
+        return Product.query.filter(
+            Product.category_id.in_(CategoryClosure.subtree_ids(self.id))
+        ).count()
     
     @classmethod
     def get_category_tree(cls):
-        """Return a hierarchical representation of all categories"""
-        # Get all root categories (no parent)
-        root_categories = cls.query.filter_by(parent_id=None).all()
+        """
+        Return a hierarchical representation of all categories
         
-        def build_tree(category):
-            return {
-                'id': category.id,
-                'name': category.name,
-                'slug': category.slug,
-                'image_url': category.image_url,
-                'children': [build_tree(child) for child in category.children]
+        The tree is assembled in Python from one SELECT over categories (as an
+        adjacency map) plus one GROUP BY for product counts.
+        """
+        rows = db.session.query(
+            cls.id, cls.name, cls.slug, cls.image_url, cls.parent_id
+        ).order_by(cls.id).all()
+        product_counts, _ = cls.get_tree_stats()
+        
+        nodes = {}
+        children_map = {}
+        for row in rows:
+            nodes[row.id] = {
+                'id': row.id,
+                'name': row.name,
+                'slug': row.slug,
+                'image_url': row.image_url,
+                'product_count': product_counts.get(row.id, 0),
+                'children': []
             }
+            children_map.setdefault(row.parent_id, []).append(row.id)
+        
+        for parent_id, child_ids in children_map.items():
+            if parent_id in nodes:
+                nodes[parent_id]['children'] = [nodes[child_id] for child_id in child_ids]
+        
+        return [nodes[category_id] for category_id in children_map.get(None, [])]
+
+class CategoryClosure(db.Model):
+    """
+    Closure table of the category tree
+
+    Stores one row per (ancestor, descendant) pair, including the pair of each
+    category with itself at depth 0, so that every "products in this subtree"
+    filter is a single indexed lookup regardless of tree depth.
+    Rows are maintained by CategoryService on create/update/delete.
+    """
+    __tablename__ = 'category_closure'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_category_closure_descendant', 'descendant_id', 'depth'),
+    )
+    
+    @classmethod
+    def subtree_ids(cls, category_id):
+        """Select of the category ID and all its descendant IDs, for use in IN (...) filters"""
+        return db.select(cls.descendant_id).where(cls.ancestor_id == category_id)
+    
+    @classmethod
+    def is_descendant(cls, category_id, ancestor_id):
+        """Check whether category_id is ancestor_id itself or one of its descendants"""
+        return db.session.query(
+            db.exists().where(cls.ancestor_id == ancestor_id, cls.descendant_id == category_id)
+        ).scalar()
+    
+    @classmethod
+    def insert_node(cls, category_id, parent_id=None):
+        """Add closure rows for a new leaf category"""
+        db.session.execute(db.insert(cls).values(ancestor_id=category_id, descendant_id=category_id, depth=0))
+        if parent_id:
+            db.session.execute(
+                db.insert(cls).from_select(
+                    ['ancestor_id', 'descendant_id', 'depth'],
+                    db.select(cls.ancestor_id, db.literal(category_id), cls.depth + 1)
+                    .where(cls.descendant_id == parent_id)
+                )
+            )
+    
+    @classmethod
+    def move_subtree(cls, category_id, new_parent_id=None):
+        """
+        Re-attach the subtree rooted at category_id under new_parent_id
+        
+        Raises:
+            ValueError: If new_parent_id is inside the subtree being moved
+        """
+        if new_parent_id and cls.is_descendant(new_parent_id, category_id):
+            raise ValueError("Cannot move a category under itself or one of its subcategories")
+        
+        # Materialized up front: MySQL cannot delete from a table it selects from in a subquery
+        subtree = db.session.execute(
+            db.select(cls.descendant_id).where(cls.ancestor_id == category_id)
+        ).scalars().all()
+        
+        # Detach the subtree from its old ancestors
+        db.session.execute(
+            db.delete(cls).where(
+                cls.descendant_id.in_(subtree),
+                cls.ancestor_id.not_in(subtree)
+            ).execution_options(synchronize_session=False)
+        )
+        
+        # Link every ancestor of the new parent to every node of the subtree
+        if new_parent_id:
+            ancestors = db.aliased(cls)
+            descendants = db.aliased(cls)
+            db.session.execute(
+                db.insert(cls).from_select(
+                    ['ancestor_id', 'descendant_id', 'depth'],
+                    db.select(
+                        ancestors.ancestor_id,
+                        descendants.descendant_id,
+                        ancestors.depth + descendants.depth + 1
+                    ).where(
+                        ancestors.descendant_id == new_parent_id,
+                        descendants.ancestor_id == category_id
+                    )
+                )
+            )
+    
+    @classmethod
+    def delete_node(cls, category_id):
+        """Remove all closure rows referencing a category"""
+        db.session.execute(
+            db.delete(cls).where(
+                (cls.ancestor_id == category_id) | (cls.descendant_id == category_id)
+            ).execution_options(synchronize_session=False)
+        )
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute the whole closure table from categories.parent_id"""
+        parents = dict(db.session.query(Category.id, Category.parent_id).all())
+        rows = []
+        for category_id in parents:
+            ancestor_id, depth, seen = category_id, 0, set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+                ancestor_id = parents.get(ancestor_id)
+                depth += 1
+        
+        db.session.execute(db.delete(cls).execution_options(synchronize_session=False))
+        if rows:
+            db.session.execute(db.insert(cls), rows)
+        db.session.commit()
+        return len(rows)
+    
+    @classmethod
+    def ensure_built(cls):
+        """
+        Rebuild the closure table if categories were written without maintaining it
+        (e.g. by seed scripts or a database created before the table existed)
+        
+        Returns:
+            bool: True if the table was rebuilt
+        """
+        count = db.func.count
+        category_count, child_count = db.session.query(
+            count(Category.id), count(Category.parent_id)
+        ).one()
+        self_links, parent_links = db.session.query(
+            db.func.sum(db.case((cls.depth == 0, 1), else_=0)),
+            db.func.sum(db.case((cls.depth == 1, 1), else_=0))
+        ).one()
+        matching_self_links = db.session.query(count()).select_from(cls).join(
+            Category, Category.id == cls.descendant_id
+        ).filter(cls.depth == 0, cls.ancestor_id == Category.id).scalar()
+        matching_parent_links = db.session.query(count()).select_from(cls).join(
+            Category, Category.id == cls.descendant_id
+        ).filter(cls.depth == 1, cls.ancestor_id == Category.parent_id).scalar()
         
-        return [build_tree(category) for category in root_categories]
\ No newline at end of file
+        if (self_links or 0) == matching_self_links == category_count and \
+                (parent_links or 0) == matching_parent_links == child_count:
+            return False
+        cls.rebuild()
+        return True
@@ -0,0 +1,23 @@
+from app import db
+from datetime import datetime
+
+class ChatMessage(db.Model):
+    """Tin nhắn của một cuộc trò chuyện với chatbot (DatabaseConversationStore)"""
+    __tablename__ = 'chat_messages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(64), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # user | assistant
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_chat_messages_session_id_id', 'session_id', 'id'),
+        db.Index('ix_chat_messages_created_at', 'created_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'role': self.role,
+            'content': self.content
+        }
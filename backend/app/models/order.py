@@ -32,9 +32,21 @@ class Order(db.Model):
     payment_status = db.Column(db.String(50), default=PaymentStatus.PENDING.value)
     transaction_id = db.Column(db.String(100))  # For VNPAY
     notes = db.Column(db.Text)
+    # Tồn kho đã được trừ cho đơn hàng (hoàn lại khi hủy); reserved_until: hạn thanh toán VNPay
+    stock_reserved = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    reserved_until = db.Column(db.DateTime, nullable=True)
+    # Đơn bị hủy vì quá hạn thanh toán (không phải khách/admin hủy): thanh toán về muộn được mở lại đơn
+    reservation_expired = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Chỉ mục (created_at, id) cho phân trang theo cursor
+    __table_args__ = (
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+        db.Index('ix_orders_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_orders_reserved_until', 'reserved_until'),
+    )
+    
     # Relationship
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
@@ -51,6 +63,7 @@ class Order(db.Model):
             'payment_status': self.payment_status,
             'transaction_id': self.transaction_id,
             'notes': self.notes,
+            'reserved_until': self.reserved_until.isoformat() if self.reserved_until else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -78,6 +91,7 @@ class OrderItem(db.Model):
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, default=1)
+    size = db.Column(db.String(10), nullable=True)
     price = db.Column(db.Float, nullable=False)  # Price at the time of purchase
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -99,6 +113,7 @@ class OrderItem(db.Model):
             'product_id': self.product_id,
             'product': product_data,
             'quantity': self.quantity,
+            'size': self.size,
             'price': self.price,
             'total': self.price * self.quantity,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -1,6 +1,11 @@
+import json
+
+from sqlalchemy.orm import validates
+
 from app import db
 from datetime import datetime
 from app.models.category import Category
+from app.models.product_size import ProductSize
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -13,25 +18,150 @@ class Product(db.Model):
     stock = db.Column(db.Integer, default=0)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     image_url = db.Column(db.String(255))
+    # Bản đồ biến thể responsive {format: {width: path}}, ghi khi sinh xong biến thể (xem ImageService)
+    image_variants = db.Column(db.JSON)
     featured = db.Column(db.Boolean, default=False)
+    # Chuỗi size phân tách bằng dấu phẩy, đồng bộ từ size_rows bởi set_sizes (dùng cho tìm kiếm/chatbot)
     sizes = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Chỉ mục (cột sắp xếp, id) cho phân trang theo cursor
+    __table_args__ = (
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        db.Index('ix_products_price_id', 'price', 'id'),
+        db.Index('ix_products_name_id', 'name', 'id'),
+    )
+    
     # Relationship
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     cart_items = db.relationship('CartItem', backref='product', lazy=True)
+    # Các size đã chuẩn hóa, nạp cùng sản phẩm (selectin: một query IN cho cả trang)
+    size_rows = db.relationship(
+        'ProductSize', lazy='selectin', order_by=ProductSize.position,
+        cascade='all, delete-orphan', passive_deletes=True
+    )
     
-    def to_dict(self):
-        size_list = []
-        if self.sizes:
+    @staticmethod
+    def parse_sizes(value):
+        """
+        Chuẩn hóa dữ liệu size từ API thành [(size, stock hoặc None)]
+        
+        Chấp nhận danh sách size, danh sách {'size', 'stock'}, {size: stock},
+        chuỗi JSON của các dạng trên hoặc chuỗi phân tách bằng dấu phẩy.
+        """
+        if not value:
+            return []
+        if isinstance(value, str):
             try:
-                # Phân tách các size ngăn cách bởi dấu phẩy và loại bỏ khoảng trắng
-                size_list = [size.strip() for size in self.sizes.split(',') if size.strip()]
-            except Exception as e:
-                # Xử lý lỗi khi phân tách chuỗi
-                print(f"Error parsing sizes {self.sizes}: {str(e)}")
+                parsed = json.loads(value)
+            except ValueError:
+                parsed = None
+            value = parsed if isinstance(parsed, (list, dict)) else value.split(',')
+        if isinstance(value, dict):
+            pairs = value.items()
+        elif isinstance(value, list):
+            pairs = [
+                (item.get('size'), item.get('stock')) if isinstance(item, dict) else (item, None)
+                for item in value
+            ]
+        else:
+            raise ValueError('Danh sách size không hợp lệ')
+        
+        result = []
+        seen = set()
+        for size, stock in pairs:
+            size = str(size or '').strip()
+            if not size or size in seen:
+                continue
+            if len(size) > 10:
+                raise ValueError(f"Size '{size}' quá dài (tối đa 10 ký tự)")
+            if stock is not None and (isinstance(stock, bool) or not isinstance(stock, int) or stock < 0):
+                raise ValueError(f"Tồn kho của size '{size}' phải là số nguyên không âm")
+            seen.add(size)
+            result.append((size, stock))
+        return result
+    
+    def set_sizes(self, value):
+        """
+        Ghi danh sách size (xem parse_sizes) vào size_rows và cột sizes
+        
+        Khi mọi size đều có tồn kho riêng, stock của sản phẩm là tổng của chúng.
+        """
+        pairs = Product.parse_sizes(value)
+        joined = ','.join(size for size, _ in pairs)
+        if len(joined) > 100:
+            raise ValueError('Danh sách size quá dài')
+        
+        existing = {row.size: row for row in self.size_rows}
+        rows = []
+        for position, (size, stock) in enumerate(pairs):
+            row = existing.get(size) or ProductSize(size=size)
+            row.stock = stock
+            row.position = position
+            rows.append(row)
+        self.size_rows = rows
+        self.sizes = joined
+        if self.stock_by_size:
+            self.stock = sum(row.stock for row in self.size_rows)
+    
+    @property
+    def stock_by_size(self):
+        """True khi mọi size đều có tồn kho riêng: stock của sản phẩm là tổng của chúng"""
+        return bool(self.size_rows) and all(row.stock is not None for row in self.size_rows)
+    
+    def set_stock(self, stock):
+        """
+        Ghi tồn kho của sản phẩm
+        
+        Khi tồn kho theo size (stock_by_size), stock chỉ được bằng tổng tồn kho các size;
+        muốn đổi tồn kho thì gửi sizes kèm tồn kho từng size.
+        """
+        if not self.stock_by_size:
+            self.stock = stock
+            return
+        total = sum(row.stock for row in self.size_rows)
+        if stock != total:
+            raise ValueError('Sản phẩm có tồn kho theo size: cập nhật tồn kho qua sizes')
+        self.stock = total
+    
+    @property
+    def size_names(self):
+        return [row.size for row in self.size_rows]
+    
+    @property
+    def size_map(self):
+        """{size: ProductSize} để kiểm tra size hợp lệ bằng một lần tra dict"""
+        return {row.size: row for row in self.size_rows}
+    
+    def stock_for(self, size, size_map=None):
+        """Tồn kho áp dụng cho một size: tồn kho riêng của size nếu có, ngược lại stock của sản phẩm"""
+        row = (size_map if size_map is not None else self.size_map).get(size or '')
+        if row is not None and row.stock is not None:
+            return row.stock
+        return self.stock
+    
+    @validates('image_url')
+    def _reset_image_variants(self, key, value):
+        """Đổi ảnh thì bỏ bản đồ biến thể của ảnh cũ"""
+        if value != self.image_url:
+            self.image_variants = None
+        return value
+    
+    def get_image_srcset(self):
+        """
+        Các biến thể responsive của ảnh theo định dạng và chiều rộng, None nếu chưa có
         
+        Chỉ đọc image_variants đã lưu: không kiểm tra file hay sinh biến thể khi serialize.
+        """
+        if not self.image_url or not self.image_variants:
+            return None
+        return {
+            name: {width: f"uploads/{path}" for width, path in paths.items()}
+            for name, paths in self.image_variants.items()
+        }
+    
+    def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
@@ -42,8 +172,10 @@ class Product(db.Model):
             'category_id': self.category_id,
             'category_name': self.category.name if self.category else None,
             'image_url': self.image_url,
+            'image_srcset': self.get_image_srcset(),
             'featured': self.featured,
-            'sizes': size_list,
+            'sizes': self.size_names,
+            'size_stock': [row.to_dict() for row in self.size_rows],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
\ No newline at end of file
@@ -0,0 +1,27 @@
+from app import db
+
+
+class ProductSize(db.Model):
+    """
+    Một size của sản phẩm, kèm tồn kho riêng của size đó
+
+    stock NULL nghĩa là size không theo dõi tồn kho riêng, chỉ dùng
+    products.stock. Khi mọi size đều có stock, products.stock là tổng của chúng.
+    """
+    __tablename__ = 'product_sizes'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    size = db.Column(db.String(10), nullable=False)
+    stock = db.Column(db.Integer, nullable=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('product_id', 'size', name='uq_product_sizes_product_size'),
+    )
+
+    def to_dict(self):
+        return {
+            'size': self.size,
+            'stock': self.stock
+        }
@@ -1,7 +1,7 @@
 from app import db
 from datetime import datetime
 import bcrypt
-from app.utils.security import check_password_hash, generate_password_hash
+from app.utils.security import check_password_hash, generate_password_hash, password_hash_needs_upgrade
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,9 +14,15 @@ class User(db.Model):
     address = db.Column(db.String(255))
     city = db.Column(db.String(100))
     is_admin = db.Column(db.Boolean, default=False)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Tăng khi quyền thay đổi
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Chỉ mục (created_at, id) cho phân trang theo cursor
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+    
     # Relationship
     orders = db.relationship('Order', backref='user', lazy=True)
     cart_items = db.relationship('CartItem', backref='user', lazy=True)
@@ -34,6 +40,18 @@ class User(db.Model):
         # Xác thực mật khẩu
         return check_password_hash(self.password_hash, password)
     
+    def upgrade_password_hash(self, password):
+        """
+        Hash lại mật khẩu (đã xác thực) nếu cost factor của hash cũ thấp hơn cấu hình
+        
+        Returns:
+            bool: True nếu hash đã được thay đổi (người gọi cần commit)
+        """
+        if not password_hash_needs_upgrade(self.password_hash):
+            return False
+        self.password = password
+        return True
+    
     def to_dict(self):
         return {
             'id': self.id,
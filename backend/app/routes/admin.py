@@ -1,35 +1,49 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app import db
 from app.models.user import User
 from app.models.product import Product
-from app.models.category import Category
+from app.models.category import Category, CategoryClosure
 from app.models.order import Order, OrderStatus
-from app.utils.security import admin_required
+from app.models.order_stats import OrderStatsDaily
+from app.utils.security import TOKEN_VERSION_CLAIM, admin_required, get_admin_status
 from app.services.product_service import ProductService
 from app.services.category_service import CategoryService
 from app.services.order_service import OrderService
+from app.services.stats_service import StatsService
+from app.services.auth_service import AuthService
+from app.utils.cache import CATEGORY_TREE_CACHE, conditional_json_response
+from app.utils.query_counter import query_budget
+from app.utils.serialization import PRODUCT_LIST, ORDER_SUMMARY
+from app.utils.pagination import SortKey, keyset_paginate, count_rows, cursor_page_response, validate_limit
 import os
 from werkzeug.utils import secure_filename
 import uuid
 
 bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
+# Cursor pagination keys (newest first), backed by the (created_at, id) indexes
+ORDER_SORT_KEY = SortKey(Order.created_at, Order.id, descending=True)
+USER_SORT_KEY = SortKey(User.created_at, User.id, descending=True)
+
 # Kiểm tra quyền admin
 @bp.route('/check', methods=['GET'])
 @jwt_required()
 def check_admin():
+    """
+    Kiểm tra quyền admin của token hiện tại
+
+    Quyền admin lấy từ claim token_version và trạng thái đã cache (get_admin_status)
+    như admin_required, nên các trang admin không truy vấn bảng users ở mỗi lần
+    kiểm tra. Thông tin người dùng chỉ được đọc khi gọi với ?include=user (lúc đăng nhập).
+    """
     try:
         user_id = get_jwt_identity()
-        current_app.logger.info(f"Admin check request from user ID: {user_id}")
-        
-        # Kiểm tra token và header
-        auth_header = request.headers.get('Authorization', '')
-        current_app.logger.info(f"Authorization header: {auth_header[:20]}...")
-        
-        user = User.query.get(user_id)
+        if isinstance(user_id, str) and user_id.isdigit():
+            user_id = int(user_id)
         
-        if not user:
+        status = get_admin_status(user_id)
+        if status is None:
             current_app.logger.error(f"User not found: {user_id}")
             return jsonify({
                 "error": "User not found", 
@@ -37,25 +51,31 @@ def check_admin():
                 "is_admin": False
             }), 404
         
-        current_app.logger.info(f"User found: {user.email}, is_admin: {user.is_admin}")
+        is_admin, token_version = status
+        claims = get_jwt()
+        if TOKEN_VERSION_CLAIM in claims and claims[TOKEN_VERSION_CLAIM] != token_version:
+            return jsonify({
+                "error": "Token has been revoked, please log in again",
+                "is_admin": False
+            }), 401
         
-        if not user.is_admin:
-            current_app.logger.info(f"User {user.email} is not an admin")
+        if not is_admin:
+            current_app.logger.info(f"User {user_id} is not an admin")
             return jsonify({
                 "is_admin": False,
                 "message": "Bạn không có quyền truy cập trang quản trị"
             }), 403
         
-        current_app.logger.info(f"Admin check successful for user {user.email}")
-        return jsonify({
+        response = {
             "is_admin": True,
-            "user": user.to_dict(),
             "message": "Xác thực quyền admin thành công"
-        }), 200
+        }
+        if request.args.get('include') == 'user':
+            user = db.session.get(User, user_id)
+            response["user"] = user.to_dict() if user else None
+        return jsonify(response), 200
     except Exception as e:
-        current_app.logger.error(f"Error in admin check: {str(e)}")
-        import traceback
-        current_app.logger.error(traceback.format_exc())
+        current_app.logger.error(f"Error in admin check: {str(e)}", exc_info=True)
         return jsonify({
             "error": str(e), 
             "message": "Lỗi xác thực quyền admin",
@@ -66,6 +86,7 @@ def check_admin():
 @bp.route('/products', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(5)
 def get_all_products():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('limit', 20, type=int)
@@ -73,47 +94,22 @@ def get_all_products():
     category_id = request.args.get('category', '')
     
     # Start with base query
-    query = Product.query
+    query = PRODUCT_LIST.apply(Product.query)
     
     # Apply filters if provided
     if search_term:
-        # Đơn giản hóa logic tìm kiếm - chỉ tìm trong tên sản phẩm
-        search_terms = search_term.strip().lower().split()
-        if search_terms:
-            # Tạo điều kiện tìm kiếm cho mỗi từ khóa
-            search_filter = Product.name.ilike(f'%{search_term}%')
-            # Nếu có nhiều từ khóa, thêm điều kiện OR cho mỗi từ
-            if len(search_terms) > 1:
-                from sqlalchemy import or_
-                for term in search_terms:
-                    if len(term) > 2:  # Bỏ qua các từ quá ngắn
-                        search_filter = or_(search_filter, Product.name.ilike(f'%{term}%'))
-            # Áp dụng bộ lọc
-            query = query.filter(search_filter)
-            current_app.logger.info(f"Admin searching for terms: {search_terms}")
+        query = ProductService.apply_search(query, search_term)
+        current_app.logger.info(f"Admin searching for: {search_term}")
     
     if category_id and category_id.isdigit():
-        category_id = int(category_id)
-        # Get the category and all its children
-        category = Category.query.get(category_id)
-        if category:
-            # If the category has children, include products from all child categories
-            if category.children:
-                # Get all child category IDs
-                child_ids = [child.id for child in category.get_all_children()]
-                # Include the parent category ID
-                all_category_ids = [category_id] + child_ids
-                # Filter products by any of these category IDs
-                query = query.filter(Product.category_id.in_(all_category_ids))
-            else:
-                # If no children, just filter by the selected category
-                query = query.filter(Product.category_id == category_id)
+        # Include products from the category and all of its descendants
+        query = query.filter(Product.category_id.in_(CategoryClosure.subtree_ids(int(category_id))))
     
     # Order and paginate
     products = query.order_by(Product.created_at.desc()).paginate(page=page, per_page=per_page)
     
     return jsonify({
-        'items': [p.to_dict() for p in products.items],
+        'items': PRODUCT_LIST.serialize(products.items),
         'total': products.total,
         'pages': products.pages,
         'page': page
@@ -162,7 +158,8 @@ def create_product():
             discount_price=discount_price,
             stock=stock,
             featured=featured,
-            image_file=image_file
+            image_file=image_file,
+            sizes=request.form.get('sizes')
         )
         return jsonify(product.to_dict()), 201
     except Exception as e:
@@ -205,6 +202,9 @@ def update_product(id):
             data['category_id'] = int(request.form.get('category_id'))
         if 'featured' in request.form:
             data['featured'] = request.form.get('featured', '').lower() == 'true'
+        if 'sizes' in request.form:
+            # Chuỗi JSON hoặc phân tách bằng dấu phẩy, như sizes của API JSON
+            data['sizes'] = request.form.get('sizes')
         
         # Xử lý file ảnh
         image_file = None
@@ -244,14 +244,14 @@ def delete_product(id):
 @admin_required
 def get_all_categories():
     categories = Category.query.all()
-    return jsonify([c.to_dict() for c in categories]), 200
+    return jsonify(CategoryService.categories_to_dict(categories)), 200
 
 @bp.route('/categories/tree', methods=['GET'])
 @jwt_required()
 @admin_required
 def get_category_tree():
-    tree = CategoryService.get_category_tree()
-    return jsonify(tree), 200
+    body, version = CategoryService.get_category_tree_json()
+    return conditional_json_response(body, version, CATEGORY_TREE_CACHE)
 
 @bp.route('/categories', methods=['POST'])
 @jwt_required()
@@ -291,6 +291,7 @@ def delete_category(id):
 @bp.route('/orders', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(3)
 def get_all_orders():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('limit', 20, type=int)
@@ -299,7 +300,7 @@ def get_all_orders():
     end_date = request.args.get('end_date')
     
     # Base query
-    query = Order.query
+    query = ORDER_SUMMARY.apply(Order.query)
     
     # Filter by status if provided
     if status:
@@ -322,11 +323,21 @@ def get_all_orders():
         except Exception as e:
             current_app.logger.error(f"Error parsing end_date: {e}")
     
+    # Optional cursor mode: ?cursor= for the first page, then next_cursor
+    if 'cursor' in request.args:
+        try:
+            validate_limit(per_page)
+            total = count_rows(query, request.args.get('count'))
+            orders, next_cursor = keyset_paginate(query, ORDER_SORT_KEY, 'newest', request.args.get('cursor'), per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(cursor_page_response(ORDER_SUMMARY.serialize(orders), next_cursor, per_page, total)), 200
+    
     # Paginate
     orders = query.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page)
     
     try:
-        order_items = [order.to_dict(include_items=False) for order in orders.items]
+        order_items = ORDER_SUMMARY.serialize(orders.items)
     except Exception as e:
         current_app.logger.error(f"Error converting orders to dict: {e}")
         order_items = []
@@ -378,131 +389,13 @@ def update_order_status(id):
 @bp.route('/dashboard', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(3)
 def get_dashboard_stats():
     try:
-        # Log thông tin người dùng để debug
         user_id = get_jwt_identity()
         current_app.logger.info(f"Dashboard request from user ID: {user_id}")
         
-        # Kiểm tra token và header
-        auth_header = request.headers.get('Authorization', '')
-        current_app.logger.info(f"Authorization header: {auth_header[:20]}...")
-        
-        # Kiểm tra người dùng
-        user = User.query.get(user_id)
-        if not user:
-            current_app.logger.error(f"User not found: {user_id}")
-            return jsonify({
-                'error': 'Người dùng không tồn tại',
-                'message': 'User not found'
-            }), 404
-            
-        if not user.is_admin:
-            current_app.logger.error(f"User {user_id} is not admin")
-            return jsonify({
-                'error': 'Không có quyền admin',
-                'message': 'Admin privileges required'
-            }), 403
-            
-        current_app.logger.info(f"User {user_id} ({user.email}) is admin, proceeding with dashboard data")
-        
-        # Tổng số sản phẩm
-        total_products = Product.query.count()
-        current_app.logger.debug(f"Total products: {total_products}")
-        
-        # Tổng số danh mục
-        total_categories = Category.query.count()
-        current_app.logger.debug(f"Total categories: {total_categories}")
-        
-        # Tổng số đơn hàng
-        total_orders = Order.query.count()
-        current_app.logger.debug(f"Total orders: {total_orders}")
-        
-        # Tổng số người dùng
-        total_users = User.query.count()
-        current_app.logger.debug(f"Total users: {total_users}")
-        
-        # Đơn hàng theo trạng thái
-        try:
-            pending_orders = Order.query.filter_by(status="pending").count()
-            processing_orders = Order.query.filter_by(status="processing").count()
-            shipped_orders = Order.query.filter_by(status="shipped").count()
-            delivered_orders = Order.query.filter_by(status="delivered").count()
-            cancelled_orders = Order.query.filter_by(status="cancelled").count()
-        except Exception as e:
-            current_app.logger.error(f"Error getting orders by status: {e}")
-            pending_orders = processing_orders = shipped_orders = delivered_orders = cancelled_orders = 0
-        
-        # Tổng doanh thu (từ các đơn hàng đã giao hoặc đã thanh toán)
-        try:
-            # Tính tổng từ các đơn hàng đã giao
-            delivered_revenue = db.session.query(db.func.sum(Order.total_amount))\
-                .filter(Order.status == "delivered")\
-                .scalar() or 0
-                
-            # Tính tổng từ các đơn hàng đã thanh toán nhưng chưa giao
-            paid_revenue = db.session.query(db.func.sum(Order.total_amount))\
-                .filter(Order.payment_status == "paid")\
-                .filter(Order.status != "delivered")\
-                .filter(Order.status != "cancelled")\
-                .scalar() or 0
-                
-            # Tổng doanh thu
-            revenue = delivered_revenue + paid_revenue
-            
-            current_app.logger.info(f"Total revenue: {revenue} (Delivered: {delivered_revenue}, Paid not delivered: {paid_revenue})")
-        except Exception as e:
-            current_app.logger.error(f"Error calculating revenue: {e}")
-            revenue = 0
-        
-        # Đơn hàng gần đây (10 đơn hàng mới nhất)
-        try:
-            recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
-            recent_orders_data = []
-            for order in recent_orders:
-                try:
-                    # Get customer information from User model
-                    customer = User.query.get(order.user_id)
-                    customer_name = ''
-                    customer_phone = ''
-                    
-                    if customer:
-                        customer_name = customer.name
-                        customer_phone = customer.phone
-                    
-                    order_dict = {
-                        'id': order.id,
-                        'user_id': order.user_id,
-                        'customer_name': customer_name,
-                        'customer_phone': customer_phone,
-                        'status': order.status,
-                        'total_amount': order.total_amount,
-                        'created_at': order.created_at.isoformat() if order.created_at else None
-                    }
-                    recent_orders_data.append(order_dict)
-                except Exception as e:
-                    current_app.logger.error(f"Error converting order to dict: {e}")
-        except Exception as e:
-            current_app.logger.error(f"Error getting recent orders: {e}")
-            recent_orders_data = []
-        
-        current_app.logger.info(f"Dashboard data successfully retrieved for user {user_id}")
-        
-        response_data = {
-            'total_products': total_products,
-            'total_categories': total_categories,
-            'total_orders': total_orders,
-            'total_users': total_users,
-            'orders_by_status': {
-                'pending': pending_orders,
-                'processing': processing_orders,
-                'shipped': shipped_orders,
-                'delivered': delivered_orders,
-                'cancelled': cancelled_orders
-            },
-            'revenue': revenue,
-            'recent_orders': recent_orders_data
-        }
+        response_data = StatsService.get_dashboard_stats()
         
         current_app.logger.debug(f"Returning dashboard data: {response_data}")
         return jsonify(response_data), 200
@@ -523,6 +416,35 @@ def get_dashboard_stats():
             'recent_orders': []
         }), 500
 
+# Số đơn hàng và doanh thu theo ngày cho biểu đồ
+@bp.route('/dashboard/timeseries', methods=['GET'])
+@jwt_required()
+@admin_required
+@query_budget(1)
+def get_dashboard_timeseries():
+    days = request.args.get('days', 30, type=int)
+    if days < 1 or days > 366:
+        return jsonify({'error': 'Số ngày phải từ 1 đến 366'}), 400
+    
+    return jsonify({
+        'days': days,
+        'series': StatsService.get_daily_series(days)
+    }), 200
+
+# Tính lại bảng thống kê đơn hàng từ bảng orders
+@bp.route('/dashboard/rebuild-stats', methods=['POST'])
+@jwt_required()
+@admin_required
+def rebuild_dashboard_stats():
+    try:
+        rows = OrderStatsDaily.rebuild()
+        current_app.logger.info(f"Rebuilt daily order stats: {rows} rows")
+        return jsonify({'message': 'Đã tính lại thống kê đơn hàng', 'rows': rows}), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error rebuilding daily order stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # Quản lý người dùng
 @bp.route('/users', methods=['GET'])
 @jwt_required()
@@ -539,10 +461,19 @@ def get_all_users():
     if search_term:
         query = query.filter(
             (User.email.ilike(f'%{search_term}%')) | 
-            (User.first_name.ilike(f'%{search_term}%')) | 
-            (User.last_name.ilike(f'%{search_term}%'))
+            (User.name.ilike(f'%{search_term}%'))
         )
     
+    # Optional cursor mode: ?cursor= for the first page, then next_cursor
+    if 'cursor' in request.args:
+        try:
+            validate_limit(per_page)
+            total = count_rows(query, request.args.get('count'))
+            users, next_cursor = keyset_paginate(query, USER_SORT_KEY, 'newest', request.args.get('cursor'), per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(cursor_page_response([u.to_dict() for u in users], next_cursor, per_page, total)), 200
+    
     # Order and paginate
     users = query.order_by(User.created_at.desc()).paginate(page=page, per_page=per_page)
     
@@ -569,8 +500,7 @@ def update_user_admin_status(id):
             'error': 'Cannot remove admin status from yourself'
         }), 400
     
-    user.is_admin = is_admin
-    db.session.commit()
+    AuthService.set_admin_status(user, is_admin)
     
     return jsonify({
         'message': f"User {user.email} admin status updated to {is_admin}",
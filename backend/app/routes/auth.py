@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User
+from app.services.auth_service import AuthService
+from app.utils.bcrypt_pool import PasswordHasherBusy
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -27,8 +29,7 @@ def register():
     db.session.commit()
     
     # Tạo token
-    access_token = create_access_token(identity=str(user.id))
-    refresh_token = create_refresh_token(identity=str(user.id))
+    access_token, refresh_token = AuthService.create_tokens(user)
     
     return jsonify({
         'user': user.to_dict(),
@@ -55,15 +56,20 @@ def login():
         if not user or not user.verify_password(password):
             return jsonify({'error': 'Email hoặc mật khẩu không đúng'}), 401
         
+        # Nâng cấp hash nếu cost factor thấp hơn cấu hình hiện tại
+        if user.upgrade_password_hash(password):
+            db.session.commit()
+        
         # Tạo token
-        access_token = create_access_token(identity=str(user.id))
-        refresh_token = create_refresh_token(identity=str(user.id))
+        access_token, refresh_token = AuthService.create_tokens(user)
         
         return jsonify({
             'user': user.to_dict(),
             'access_token': access_token,
             'refresh_token': refresh_token
         }), 200
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Hệ thống đang bận, vui lòng thử lại sau'}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(f"Login error: {str(e)}")
         return jsonify({'error': 'Lỗi đăng nhập, vui lòng thử lại sau'}), 500
@@ -75,7 +81,12 @@ def refresh():
     # Đảm bảo identity là string
     if not isinstance(identity, str):
         identity = str(identity)
-    access_token = create_access_token(identity=identity)
+    
+    # Access token mới mang quyền admin hiện tại của người dùng
+    user = User.query.get(int(identity)) if identity.isdigit() else None
+    if not user:
+        return jsonify({'error': 'Người dùng không tồn tại'}), 404
+    access_token = AuthService.create_access_token(user)
     
     return jsonify({'access_token': access_token}), 200
 
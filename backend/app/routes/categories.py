@@ -4,13 +4,14 @@ from app.models.category import Category
 from app.utils.validators import validate_category_data
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.category_service import CategoryService
+from app.utils.cache import CATEGORY_TREE_CACHE, conditional_json_response
 
 bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 
 @bp.route('', methods=['GET'])
 def get_categories():
     categories = CategoryService.get_all_categories()
-    return jsonify([c.to_dict() for c in categories]), 200
+    return jsonify(CategoryService.categories_to_dict(categories)), 200
 
 @bp.route('/<int:id>', methods=['GET'])
 def get_category(id):
@@ -19,8 +20,8 @@ def get_category(id):
 
 @bp.route('/tree', methods=['GET'])
 def get_category_tree():
-    tree = CategoryService.get_category_tree()
-    return jsonify(tree), 200
+    body, version = CategoryService.get_category_tree_json()
+    return conditional_json_response(body, version, CATEGORY_TREE_CACHE)
 
 @bp.route('', methods=['POST'])
 @jwt_required()
@@ -1,19 +1,20 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
 import logging
 import traceback
 import time
-from ..chatbot.rag_model import get_chatbot_instance
+from ..chatbot.loader import loader, ChatbotNotReady
+from ..chatbot.conversation import get_conversation_store
+from ..chatbot.fallback import get_fallback_answer
+from ..chatbot.metrics import metrics
 import uuid
+import os
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Dictionary to store session-specific chatbot instances
-# This allows each user to have their own conversation history
-session_chatbots = {}
-
 chatbot_blueprint = Blueprint('chatbot', __name__)
 
 @chatbot_blueprint.route('/ask', methods=['POST'])
@@ -40,6 +41,7 @@ def ask_question():
             session_id = str(uuid.uuid4())
             logger.info(f"Created new session ID: {session_id}")
         else:
+            session_id = str(session_id)[:64]
             logger.info(f"Using existing session ID: {session_id}")
         
         # Check if question is empty
@@ -49,23 +51,46 @@ def ask_question():
         
         # Try to get answer from chatbot
         try:
-            # Get or create session-specific chatbot instance
-            if session_id not in session_chatbots:
-                logger.info(f"Creating new chatbot instance for session {session_id}")
-                session_chatbots[session_id] = get_chatbot_instance()
+            chatbot = loader.get_chatbot()
+            
+            # Lịch sử hội thoại của phiên được lưu riêng, chatbot không giữ trạng thái
+            store = get_conversation_store()
+            history = store.get_history(session_id)
+            result = chatbot.get_answer(question, history)
             
-            # Get answer from the session's chatbot
-            chatbot = session_chatbots[session_id]
-            result = chatbot.get_answer(question)
+            if result.get('error'):
+                fallback_answer = get_fallback_answer(question)
+                if fallback_answer:
+                    logger.info(f"Using fallback answer for question: {question}")
+                    result = {"answer": fallback_answer, "sources": ["fallback_responses"]}
+            elif not result.get('fallback'):
+                store.append(session_id, question, result['answer'])
             
             # Include session_id in the response
             result['session_id'] = session_id
             
             # Log the processing time
             elapsed_time = time.time() - start_time
+            metrics.observe('ask_seconds', elapsed_time)
             logger.info(f"Question processed in {elapsed_time:.2f} seconds")
             
             return jsonify(result)
+        except ChatbotNotReady as e:
+            # Chatbot chưa sẵn sàng (đang khởi động hoặc bị tắt): không chặn request
+            logger.info(f"Chatbot not ready: {e}")
+            fallback_answer = get_fallback_answer(question)
+            if fallback_answer:
+                return jsonify({
+                    "answer": fallback_answer,
+                    "sources": ["fallback_responses"],
+                    "session_id": session_id
+                })
+            return jsonify({
+                "answer": "Trợ lý ảo đang khởi động, vui lòng thử lại sau ít phút.",
+                "sources": [],
+                "status": loader.status()['state'],
+                "session_id": session_id
+            }), 503, {'Retry-After': '5'}
         except Exception as e:
             # Log the original error
             logger.error(f"Error with chatbot: {e}")
@@ -94,25 +119,117 @@ def ask_question():
             "session_id": data.get('session_id', str(uuid.uuid4()))
         }), 500
 
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@chatbot_blueprint.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    """
+    API endpoint to ask a question, streaming the answer as Server-Sent Events
+
+    Events: "meta" (session_id), "token" ({"text"}) for each piece of the answer,
+    then "done" (answer, sources, timings) or "error".
+    """
+    data = request.get_json(silent=True) or {}
+    question = data.get('question')
+    if not question or not str(question).strip():
+        return jsonify({"error": "Question cannot be empty"}), 400
+
+    session_id = str(data.get('session_id') or uuid.uuid4())[:64]
+
+    def generate():
+        start_time = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        yield sse_event('meta', {"session_id": session_id})
+
+        try:
+            chatbot = loader.get_chatbot()
+        except ChatbotNotReady as e:
+            logger.info(f"Chatbot not ready: {e}")
+            metrics.increment('stream_not_ready')
+            answer = get_fallback_answer(question) or "Trợ lý ảo đang khởi động, vui lòng thử lại sau ít phút."
+            yield sse_event('token', {"text": answer})
+            yield sse_event('done', {
+                "answer": answer,
+                "sources": ["fallback_responses"],
+                "status": loader.status()['state'],
+                "session_id": session_id
+            })
+            return
+
+        store = get_conversation_store()
+        history = store.get_history(session_id)
+        for event in chatbot.stream_answer(question, history):
+            if event['type'] == 'token':
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.observe('stream_ttft_seconds', first_token_at - start_time)
+                tokens += 1
+                yield sse_event('token', {"text": event['text']})
+                continue
+
+            elapsed = time.perf_counter() - start_time
+            timings = {
+                "ttft_ms": round((first_token_at - start_time) * 1000, 1) if first_token_at else None,
+                "total_ms": round(elapsed * 1000, 1),
+                "tokens": tokens
+            }
+            if event['type'] == 'error':
+                metrics.increment('stream_errors')
+                fallback_answer = get_fallback_answer(question)
+                yield sse_event('error', {
+                    "answer": fallback_answer or event['answer'],
+                    "sources": ["fallback_responses"] if fallback_answer else [],
+                    "error": event['error'],
+                    "session_id": session_id,
+                    "timings": timings
+                })
+                return
+
+            metrics.observe('stream_total_seconds', elapsed)
+            if not event.get('fallback'):
+                store.append(session_id, question, event['answer'])
+            logger.info(f"Streamed question processed in {elapsed:.2f}s (first token after {timings['ttft_ms']} ms)")
+            yield sse_event('done', {
+                "answer": event['answer'],
+                "sources": event['sources'],
+                "cached": event.get('cached', False),
+                "session_id": session_id,
+                "timings": timings
+            })
+
+    # Không để nginx/proxy gom buffer: token phải tới trình duyệt ngay
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @chatbot_blueprint.route('/rebuild-index', methods=['POST'])
 def rebuild_index():
     """API endpoint to rebuild the chatbot's vector index"""
     try:
         logger.info("Received request to rebuild vector index")
         
-        # Get the chatbot instance with rebuild_index=True
-        start_time = time.time()
-        chatbot = get_chatbot_instance(rebuild_index=True)
+        if not loader.enabled:
+            return jsonify({"error": "Chatbot is disabled"}), 503
         
-        # Clear all session chatbots to force reload with new index
-        global session_chatbots
-        session_chatbots = {}
+        # Mặc định chỉ embed lại các file đã thay đổi; ?full=true để build lại toàn bộ
+        full = request.args.get('full', 'false').lower() == 'true'
+        start_time = time.time()
+        chatbot = loader.get_chatbot()
+        stats = chatbot.rebuild(full=full)
         
         # Log the rebuild time
         elapsed_time = time.time() - start_time
         logger.info(f"Index rebuilt in {elapsed_time:.2f} seconds")
         
-        return jsonify({"message": "Vector index rebuilt successfully"})
+        # Các worker khác tự chuyển sang version mới (RAGChatbot.refresh_index)
+        return jsonify({"message": "Vector index rebuilt successfully", "index": stats})
+    
+    except ChatbotNotReady as e:
+        return jsonify({"error": str(e), "status": loader.status()['state']}), 503
     
     except Exception as e:
         logger.error(f"Error rebuilding vector index: {e}")
@@ -122,24 +239,51 @@ def rebuild_index():
 @chatbot_blueprint.route('/health', methods=['GET'])
 def health_check():
     """API endpoint to check if the chatbot service is healthy"""
-    try:
-        logger.info("Received health check request")
-        
-        # Try to get the chatbot instance to check if it's working
-        chatbot = get_chatbot_instance()
-        
+    status = loader.status()
+    if status['ready']:
         return jsonify({
             "status": "healthy",
             "message": "Chatbot service is running"
         })
     
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        logger.error(traceback.format_exc())
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e)
-        }), 500
+    # Không tải model trong request: chỉ khởi động warm-up nền nếu chưa chạy
+    loader.start_background()
+    return jsonify({
+        "status": "unhealthy",
+        "state": status['state'],
+        "error": status['error']
+    }), 503
+
+@chatbot_blueprint.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: tiến trình warm-up của chatbot trong worker hiện tại"""
+    status = loader.status()
+    status['pid'] = os.getpid()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@chatbot_blueprint.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Thống kê semantic answer cache (hit rate) của worker hiện tại"""
+    from ..chatbot.rag_model import get_answer_cache
+    
+    cache = get_answer_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    stats = cache.stats()
+    stats['enabled'] = True
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
+
+@chatbot_blueprint.route('/metrics', methods=['GET'])
+def chatbot_metrics():
+    """Độ trễ (thời gian đến token đầu tiên, tổng thời gian) của worker hiện tại"""
+    from ..chatbot.llm import get_llm
+    
+    snapshot = metrics.snapshot()
+    snapshot['pid'] = os.getpid()
+    if loader.status()['ready']:
+        snapshot['llm'] = get_llm().stats()
+    return jsonify(snapshot)
 
 @chatbot_blueprint.route('/clear-session', methods=['POST'])
 def clear_session():
@@ -151,9 +295,7 @@ def clear_session():
         if not session_id:
             return jsonify({"error": "Missing session_id parameter"}), 400
         
-        if session_id in session_chatbots:
-            # Remove the session chatbot instance
-            del session_chatbots[session_id]
+        if get_conversation_store().clear(session_id):
             logger.info(f"Cleared session {session_id}")
             return jsonify({"message": f"Session {session_id} cleared successfully"})
         else:
@@ -164,40 +306,3 @@ def clear_session():
         logger.error(f"Error clearing session: {e}")
         logger.error(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
-
-def get_fallback_answer(question):
-    """Provide fallback answers for common questions when the chatbot fails"""
-    question_lower = question.lower()
-    
-    # Common question patterns and answers
-    fallbacks = {
-        "theo dõi đơn hàng": "Bạn có thể theo dõi đơn hàng bằng cách đăng nhập vào tài khoản của bạn, sau đó vào mục 'Đơn hàng của tôi'. Tại đây, bạn sẽ thấy tất cả các đơn hàng đã đặt, tình trạng và thông tin vận chuyển của từng đơn.",
-        
-        "phí vận chuyển": "Phí vận chuyển phụ thuộc vào địa điểm và phương thức vận chuyển bạn chọn. Đối với các đơn hàng trên 500.000 VND, chúng tôi miễn phí vận chuyển toàn quốc. Đối với các đơn hàng dưới 500.000 VND, phí vận chuyển sẽ từ 30.000 VND đến 50.000 VND tùy theo khu vực.",
-        
-        "chính sách đổi trả": "Cửa hàng chúng tôi chấp nhận đổi trả trong vòng 30 ngày kể từ ngày mua hàng, với điều kiện sản phẩm còn nguyên tem nhãn, chưa qua sử dụng và có hóa đơn mua hàng. Đối với sản phẩm giảm giá, thời gian đổi trả là 14 ngày.",
-        
-        "thời gian giao hàng": "Thời gian giao hàng thông thường là 2-3 ngày làm việc đối với các thành phố lớn và 3-5 ngày làm việc đối với các tỉnh thành khác. Đối với khu vực miền núi và hải đảo, thời gian giao hàng có thể kéo dài từ 5-7 ngày làm việc.",
-        
-        "tài khoản": "Để tạo tài khoản mới, bạn chỉ cần nhấp vào biểu tượng người dùng ở góc phải trên cùng của trang web, sau đó chọn 'Đăng ký'. Điền thông tin cá nhân của bạn như tên, email và mật khẩu, sau đó nhấp vào nút 'Đăng ký'.",
-        
-        "phương thức thanh toán": "Chúng tôi chấp nhận nhiều phương thức thanh toán khác nhau bao gồm: thẻ tín dụng/ghi nợ (Visa, MasterCard, JCB), ví điện tử (Momo, VNPay, ZaloPay), chuyển khoản ngân hàng và thanh toán khi nhận hàng (COD).",
-        
-        "liên hệ": "Bạn có thể liên hệ với bộ phận chăm sóc khách hàng của chúng tôi thông qua các kênh sau: Hotline: 1900-1234 (8h-22h hàng ngày), Email: support@example.com, Live chat trên website, hoặc qua trang Fanpage Facebook chính thức của chúng tôi.",
-        
-        "mã giảm giá": "Để áp dụng mã giảm giá, bạn cần thêm sản phẩm vào giỏ hàng, sau đó chuyển đến trang thanh toán. Tại đây, bạn sẽ thấy ô 'Mã giảm giá' - hãy nhập mã của bạn và nhấp vào 'Áp dụng'."
-    }
-    
-    # Check for matching patterns
-    for key, answer in fallbacks.items():
-        if key in question_lower:
-            return answer
-    
-    # Check for generic greetings
-    greetings = ["xin chào", "chào", "hello", "hi", "hey"]
-    for greeting in greetings:
-        if greeting in question_lower:
-            return "Xin chào! Tôi là trợ lý ảo của cửa hàng. Tôi có thể giúp bạn trả lời các câu hỏi về sản phẩm, đơn hàng, vận chuyển và các chính sách của cửa hàng."
-    
-    # No match found
-    return None
\ No newline at end of file
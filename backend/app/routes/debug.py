@@ -165,4 +165,15 @@ def upload_test():
             current_app.logger.error(traceback.format_exc())
             return jsonify({'error': str(e)}), 500
     
-    return jsonify({'error': 'Unknown error'}), 500 
\ No newline at end of file
+    return jsonify({'error': 'Unknown error'}), 500 
+
+@bp.route('/bcrypt-pool', methods=['GET'])
+def get_bcrypt_pool_stats():
+    """Thống kê hàng đợi bcrypt của worker hiện tại"""
+    from app.utils.bcrypt_pool import get_bcrypt_pool
+    
+    pool = get_bcrypt_pool()
+    stats = pool.stats() if pool else {'workers': 0}
+    stats['log_rounds'] = current_app.config.get('BCRYPT_LOG_ROUNDS')
+    stats['pid'] = os.getpid()
+    return jsonify(stats)
@@ -5,13 +5,17 @@ from app.models.order import Order, OrderItem, OrderStatus
 from app.models.cart import CartItem
 from app.models.user import User
 from app.services.order_service import OrderService
+from app.services.inventory_service import InventoryService
 from app.utils.security import admin_required
 from app.utils.validators import validate_order_data
+from app.utils.query_counter import query_budget
+from app.utils.serialization import ORDER_DETAIL
 
 bp = Blueprint('orders', __name__, url_prefix='/api/orders')
 
 @bp.route('', methods=['GET'])
 @jwt_required()
+@query_budget(4)
 def get_orders():
     user_id = get_jwt_identity()
     
@@ -19,12 +23,12 @@ def get_orders():
     per_page = request.args.get('limit', 10, type=int)
     
     # Lấy danh sách đơn hàng của user
-    orders = Order.query.filter_by(user_id=user_id)\
+    orders = ORDER_DETAIL.apply(Order.query).filter_by(user_id=user_id)\
                 .order_by(Order.created_at.desc())\
                 .paginate(page=page, per_page=per_page)
     
     return jsonify({
-        'items': [order.to_dict() for order in orders.items],
+        'items': ORDER_DETAIL.serialize(orders.items),
         'total': orders.total,
         'pages': orders.pages,
         'page': page
@@ -104,18 +108,38 @@ def create_order():
         if order_data['payment_method'] not in valid_payment_methods:
             return jsonify({"error": f"Phương thức thanh toán không hợp lệ. Chỉ hỗ trợ: {', '.join(valid_payment_methods)}"}), 400
         
+        # Trả lại tồn kho của các đơn VNPay quá hạn thanh toán trước khi giữ hàng cho đơn mới
+        InventoryService.maybe_expire_reservations()
+        
         # Lấy thông tin giỏ hàng
         if 'items' in data:
             # Tạo đơn hàng từ danh sách sản phẩm được gửi lên
+            selected = [
+                (item_data.get('productId') or item_data.get('product_id'), item_data.get('size'))
+                for item_data in data['items']
+            ]
+            # Một query cho mọi sản phẩm được chọn thay vì một query mỗi sản phẩm
+            rows = CartItem.query.filter(
+                CartItem.user_id == user_id,
+                CartItem.product_id.in_({product_id for product_id, _ in selected if product_id})
+            ).order_by(CartItem.id).all()
+            by_product = {}
+            by_product_size = {}
+            for row in rows:
+                by_product.setdefault(row.product_id, row)
+                by_product_size.setdefault((row.product_id, row.size), row)
+            
             cart_items = []
-            for item_data in data['items']:
-                product_id = item_data.get('productId') or item_data.get('product_id')
-                cart_item = CartItem.query.filter_by(
-                    user_id=user_id, 
-                    product_id=product_id
-                ).first()
-                
-                if cart_item:
+            seen = set()
+            for product_id, size in selected:
+                try:
+                    product_id = int(product_id)
+                except (TypeError, ValueError):
+                    continue
+                # Ưu tiên dòng cùng size, nếu không có thì lấy dòng đầu tiên của sản phẩm
+                cart_item = by_product_size.get((product_id, size)) or by_product.get(product_id)
+                if cart_item and cart_item.id not in seen:
+                    seen.add(cart_item.id)
                     cart_items.append(cart_item)
         else:
             # Tạo đơn hàng từ toàn bộ giỏ hàng
@@ -135,7 +159,8 @@ def create_order():
             notes=order_data['notes']
         )
         
-        # Trả về thông tin đơn hàng
+        # Trả về thông tin đơn hàng (items và product nạp sẵn, số query không phụ thuộc số sản phẩm)
+        order = ORDER_DETAIL.apply(Order.query).get(order.id)
         return jsonify(order.to_dict()), 201
     
     except Exception as e:
@@ -177,13 +202,14 @@ def cancel_order(id):
 @bp.route('/admin', methods=['GET'])
 @jwt_required()
 @admin_required
+@query_budget(4)
 def admin_get_orders():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('limit', 10, type=int)
     status = request.args.get('status')
     
     # Base query
-    query = Order.query
+    query = ORDER_DETAIL.apply(Order.query)
     
     # Filter by status if provided
     if status:
@@ -193,7 +219,7 @@ def admin_get_orders():
     orders = query.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page)
     
     return jsonify({
-        'items': [order.to_dict() for order in orders.items],
+        'items': ORDER_DETAIL.serialize(orders.items),
         'total': orders.total,
         'pages': orders.pages,
         'page': page
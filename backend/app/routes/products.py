@@ -1,12 +1,21 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.product import Product
-from app.models.category import Category
+from app.models.cart import Cart
+from app.models.category import CategoryClosure
+from app.models.catalog_change import CatalogChange
+from app.search import get_search_backend
+from app.services.image_service import ImageService
+from app.services.product_service import ProductService, PRODUCT_SORT_KEYS
+from app.utils.cache import CATEGORY_TREE_CACHE, bump_version
+from app.utils.query_counter import query_budget
+from app.utils.pagination import RankSortKey, keyset_paginate, count_rows, cursor_page_response, validate_limit
+from app.utils.security import admin_required
+from app.utils.serialization import PRODUCT_LIST
 import os
 from werkzeug.utils import secure_filename
 import uuid
-from sqlalchemy import or_
 
 bp = Blueprint('products', __name__, url_prefix='/api/products')
 
@@ -15,6 +24,7 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @bp.route('', methods=['GET'])
+@query_budget(5)
 def get_products():
     # Xử lý tham số filter
     page = request.args.get('page', 1, type=int)
@@ -22,53 +32,54 @@ def get_products():
     category_id = request.args.get('category', type=int)
     subcategory_id = request.args.get('subcategory_id', type=int)
     featured = request.args.get('featured', type=bool)
-    search = request.args.get('search', '')
-    sort = request.args.get('sort', 'newest')
+    search = request.args.get('search', '').strip()
+    # Khi tìm kiếm, mặc định sắp xếp theo độ liên quan
+    sort = request.args.get('sort', 'relevance' if search else 'newest')
     
     # Log các tham số tìm kiếm để debug
     current_app.logger.info(f"Search params: page={page}, per_page={per_page}, category_id={category_id}, subcategory_id={subcategory_id}, featured={featured}, search='{search}', sort={sort}")
     
-    # Base query
-    query = Product.query
+    # Base query, nạp sẵn danh mục để to_dict không phát sinh query cho từng sản phẩm
+    query = PRODUCT_LIST.apply(Product.query)
     
     # Apply filters
-    if subcategory_id:
-        # Nếu có subcategory_id, ưu tiên lọc theo subcategory_id
-        query = query.filter_by(category_id=subcategory_id)
-        current_app.logger.info(f"Filtering by subcategory_id: {subcategory_id}")
-    elif category_id:
-        # Lấy danh mục theo ID
-        category = Category.query.get(category_id)
-        if category:
-            # Nếu danh mục có danh mục con
-            if category.children:
-                # Lấy tất cả ID của danh mục con (bao gồm cả danh mục hiện tại)
-                category_ids = [category.id]
-                for child in category.children:
-                    category_ids.append(child.id)
-                # Lọc sản phẩm theo danh sách ID danh mục
-                query = query.filter(Product.category_id.in_(category_ids))
-            else:
-                # Nếu không có danh mục con, chỉ lọc theo danh mục hiện tại
-                query = query.filter_by(category_id=category_id)
+    if subcategory_id or category_id:
+        # Lọc theo cả cây con của danh mục (mọi cấp) qua closure table,
+        # ưu tiên subcategory_id nếu có
+        filter_category_id = subcategory_id or category_id
+        query = query.filter(Product.category_id.in_(CategoryClosure.subtree_ids(filter_category_id)))
+        current_app.logger.info(f"Filtering by category subtree: {filter_category_id}")
         
     if featured is not None:
         query = query.filter_by(featured=featured)
         
+    cursor_mode = 'cursor' in request.args
+    ranks = None
     if search:
-        # Đơn giản hóa logic tìm kiếm
-        search_terms = search.strip().lower().split()
-        if search_terms:
-            # Tạo điều kiện tìm kiếm cho mỗi từ khóa (tìm kiếm AND)
-            search_filter = Product.name.ilike(f'%{search}%')
-            # Nếu có nhiều từ khóa, thêm điều kiện OR cho mỗi từ
-            if len(search_terms) > 1:
-                for term in search_terms:
-                    if len(term) > 2:  # Bỏ qua các từ quá ngắn
-                        search_filter = or_(search_filter, Product.name.ilike(f'%{term}%'))
-            # Áp dụng bộ lọc
-            query = query.filter(search_filter)
-            current_app.logger.info(f"Searching for terms: {search_terms}")
+        # Tìm kiếm qua chỉ mục full-text thay vì quét bảng bằng ILIKE
+        ranks = ProductService.search_ranks(search)
+        query = ProductService.apply_search(
+            query, search, order_by_relevance=(sort == 'relevance' and not cursor_mode), ranks=ranks
+        )
+        current_app.logger.info(f"Searching for: {search}")
+    
+    # Phân trang theo cursor (tùy chọn): gửi ?cursor= cho trang đầu rồi dùng next_cursor,
+    # tổng số chỉ tính khi có ?count=exact hoặc ?count=estimate.
+    # Sắp xếp theo độ liên quan dùng keyset (thứ hạng trong kết quả tìm kiếm, id), xem RankSortKey
+    if cursor_mode:
+        if sort == 'relevance' and ranks is not None:
+            sort_key = RankSortKey(ranks, Product.id)
+        else:
+            sort_key = PRODUCT_SORT_KEYS.get(sort)
+        if sort_key is None:
+            return jsonify({'error': f'Phân trang theo cursor không hỗ trợ cách sắp xếp: {sort}'}), 400
+        try:
+            validate_limit(per_page)
+            total = count_rows(query, request.args.get('count'))
+            items, next_cursor = keyset_paginate(query, sort_key, sort, request.args.get('cursor'), per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(cursor_page_response(PRODUCT_LIST.serialize(items), next_cursor, per_page, total)), 200
     
     # Apply sorting
     if sort == 'price_asc':
@@ -79,7 +90,7 @@ def get_products():
         query = query.order_by(Product.name.asc())
     elif sort == 'name_desc':
         query = query.order_by(Product.name.desc())
-    else:  # newest by default
+    else:  # newest by default, cũng là tiêu chí phụ khi sắp xếp theo độ liên quan
         query = query.order_by(Product.created_at.desc())
     
     # Pagination
@@ -89,7 +100,7 @@ def get_products():
     current_app.logger.info(f"Found {products.total} products matching the criteria")
     
     return jsonify({
-        'items': [p.to_dict() for p in products.items],
+        'items': PRODUCT_LIST.serialize(products.items),
         'total': products.total,
         'pages': products.pages,
         'page': page
@@ -97,17 +108,13 @@ def get_products():
 
 @bp.route('/<int:id>', methods=['GET'])
 def get_product(id):
-    product = Product.query.get_or_404(id)
+    product = PRODUCT_LIST.apply(Product.query).get_or_404(id)
     return jsonify(product.to_dict()), 200
 
 @bp.route('', methods=['POST'])
 @jwt_required()
+@admin_required
 def create_product():
-    # Kiểm tra quyền admin
-    claims = get_jwt()
-    if not claims.get('is_admin', False):
-        return jsonify({'error': 'Unauthorized access'}), 403
-    
     data = request.json
     
     # Kiểm tra dữ liệu đầu vào
@@ -125,23 +132,29 @@ def create_product():
         stock=data.get('stock', 0),
         category_id=data['category_id'],
         image_url=data.get('image_url', ''),
-        featured=data.get('featured', False),
-        sizes=data.get('sizes', '')  # Xử lý sizes
+        featured=data.get('featured', False)
     )
+    # Size (danh sách, {size: stock} hoặc chuỗi) được chuẩn hóa thành các dòng product_sizes
+    try:
+        product.set_sizes(data.get('sizes'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     db.session.add(product)
+    bump_version(CATEGORY_TREE_CACHE)
+    db.session.flush()
+    CatalogChange.record(product.id)
     db.session.commit()
+    if product.image_url:
+        ImageService.attach_variants(product)
+    get_search_backend().index_product(product)
     
     return jsonify(product.to_dict()), 201
 
 @bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
+@admin_required
 def update_product(id):
-    # Kiểm tra quyền admin
-    claims = get_jwt()
-    if not claims.get('is_admin', False):
-        return jsonify({'error': 'Unauthorized access'}), 403
-    
     product = Product.query.get_or_404(id)
     data = request.json
     
@@ -154,17 +167,27 @@ def update_product(id):
         product.price = data['price']
     if 'discount_price' in data:
         product.discount_price = data['discount_price']
-    if 'stock' in data:
-        product.stock = data['stock']
-    if 'category_id' in data:
+    if 'category_id' in data and data['category_id'] != product.category_id:
         product.category_id = data['category_id']
+        bump_version(CATEGORY_TREE_CACHE)
     if 'image_url' in data:
         product.image_url = data['image_url']
     if 'featured' in data:
         product.featured = data['featured']
-    if 'sizes' in data:  # Xử lý sizes
-        product.sizes = data['sizes']
+    try:
+        ProductService.update_stock(product, data)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     
+    # Giá đổi: tính lại tổng của các giỏ hàng có sản phẩm này
+    if 'price' in data:
+        Cart.recalculate_for_product(product.id)
+    
+    CatalogChange.record(product.id)
     db.session.commit()
+    if 'image_url' in data:
+        ImageService.attach_variants(product)
+    get_search_backend().index_product(product)
     
     return jsonify(product.to_dict())
\ No newline at end of file
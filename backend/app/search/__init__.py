@@ -0,0 +1,53 @@
+"""
+Tìm kiếm sản phẩm
+
+Backend được chọn qua cấu hình SEARCH_BACKEND:
+- 'memory': chỉ mục đảo ngược BM25 trong bộ nhớ của mỗi worker
+- 'database': full-text search của database (SQLite FTS5 / PostgreSQL), cần
+  bảng product_search tạo bởi migration; MySQL không có backend này
+Backend được chọn và ghi log khi khởi động app (create_app).
+"""
+import threading
+
+from flask import current_app
+
+from app import db
+from app.search.backends import InMemorySearchBackend, DatabaseSearchBackend
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """Lấy backend tìm kiếm dùng chung trong process"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def _create_backend():
+    backend_name = current_app.config.get('SEARCH_BACKEND', 'memory')
+    dialect = db.engine.dialect.name
+    if backend_name == DatabaseSearchBackend.name:
+        try:
+            backend = DatabaseSearchBackend()
+            current_app.logger.info(f"Product search: {dialect} full-text search")
+            return backend
+        except ValueError as e:
+            current_app.logger.warning(
+                f"Product search: SEARCH_BACKEND=database unavailable ({str(e)}), "
+                f"falling back to the per-worker in-memory index"
+            )
+    elif backend_name != InMemorySearchBackend.name:
+        current_app.logger.warning(f"Unknown SEARCH_BACKEND '{backend_name}', using in-memory search index")
+    if dialect not in DatabaseSearchBackend.SUPPORTED_DIALECTS:
+        current_app.logger.warning(
+            f"Product search: per-worker in-memory index; {dialect} has no native full-text "
+            f"backend (supported: {', '.join(DatabaseSearchBackend.SUPPORTED_DIALECTS)})"
+        )
+    else:
+        current_app.logger.info("Product search: per-worker in-memory index")
+    return InMemorySearchBackend(refresh_interval=current_app.config.get('SEARCH_REFRESH_INTERVAL', 30))
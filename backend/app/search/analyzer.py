@@ -0,0 +1,47 @@
+"""
+Chuẩn hóa văn bản tiếng Việt cho tìm kiếm sản phẩm
+"""
+import re
+import unicodedata
+
+# Trọng số của từng trường khi xếp hạng (tên sản phẩm quan trọng nhất)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'description': 1.0
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold_text(text):
+    """
+    Bỏ dấu tiếng Việt và chuyển về chữ thường
+
+    Dùng cùng cách chuẩn hóa NFKD như Category.generate_slug, riêng chữ "đ"
+    không có dạng phân rã nên phải thay thế thủ công.
+    """
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+    return text.lower()
+
+
+def tokenize(text):
+    """Tách văn bản đã bỏ dấu thành danh sách từ"""
+    return _TOKEN_RE.findall(fold_text(text))
+
+
+def product_fields(product):
+    """
+    Lấy các trường cần đánh chỉ mục của một sản phẩm
+
+    Returns:
+        dict: {'name': str, 'category': str, 'description': str}
+    """
+    return {
+        'name': product.name or '',
+        'category': product.category.name if product.category else '',
+        'description': product.description or ''
+    }
@@ -0,0 +1,275 @@
+"""
+Các backend tìm kiếm sản phẩm: chỉ mục trong bộ nhớ và full-text search của database
+"""
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.category import Category
+from app.models.product import Product
+from app.search.analyzer import FIELD_WEIGHTS, fold_text, product_fields, tokenize
+from app.search.memory_index import InvertedIndex
+from app.utils.query_counter import uncounted
+
+
+class SearchBackend:
+    """
+    Giao diện chung của các backend tìm kiếm
+
+    Các thao tác cập nhật chỉ mục không được làm hỏng thao tác ghi sản phẩm,
+    nên lỗi chỉ được ghi log và chỉ mục sẽ được dựng lại ở lần tìm kiếm sau.
+    """
+    name = None
+
+    def search(self, query, limit=None):
+        """Trả về [(product_id, score)] sắp xếp theo độ liên quan giảm dần"""
+        raise NotImplementedError
+
+    def index_product(self, product):
+        raise NotImplementedError
+
+    def remove_product(self, product_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def index_products(self, products):
+        for product in products:
+            self.index_product(product)
+
+    @staticmethod
+    def _load_products():
+        return Product.query.options(joinedload(Product.category)).all()
+
+
+class InMemorySearchBackend(SearchBackend):
+    """
+    Chỉ mục đảo ngược BM25 nằm trong bộ nhớ của từng worker
+
+    Chỉ mục được dựng lần đầu khi có truy vấn tìm kiếm, sau đó cập nhật từng
+    sản phẩm khi ProductService ghi dữ liệu. Vì mỗi worker gunicorn có chỉ mục
+    riêng, định kỳ (SEARCH_REFRESH_INTERVAL giây) backend so sánh số lượng và
+    thời điểm cập nhật cuối của bảng products/categories để phát hiện thay đổi
+    từ worker khác và dựng lại khi cần.
+
+    Ghi dữ liệu trong chính worker này không cập nhật chữ ký đã lưu: chữ ký
+    mới không phân biệt được thay đổi của worker này với thay đổi worker khác
+    commit cùng lúc, nên lần kiểm tra kế tiếp sẽ dựng lại chỉ mục.
+    """
+    name = 'memory'
+
+    def __init__(self, refresh_interval=30):
+        self.index = InvertedIndex()
+        self.refresh_interval = refresh_interval
+        self._signature = None
+        self._checked_at = 0.0
+        self._built = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_signature():
+        product_count, product_updated = db.session.query(
+            db.func.count(Product.id), db.func.max(Product.updated_at)
+        ).one()
+        category_updated = db.session.query(db.func.max(Category.updated_at)).scalar()
+        return product_count, product_updated, category_updated
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._built and now - self._checked_at < self.refresh_interval:
+            return
+        # Kiểm tra chữ ký và dựng lại chỉ mục không tính vào ngân sách query của request
+        with self._lock, uncounted():
+            if self._built and now - self._checked_at < self.refresh_interval:
+                return
+            signature = self._current_signature()
+            if not self._built or signature != self._signature:
+                self._build(signature)
+            self._checked_at = now
+
+    def _build(self, signature=None):
+        """
+        Dựng chỉ mục mới rồi mới thay chỉ mục đang dùng
+
+        Các luồng khác vẫn tìm trên chỉ mục cũ (đầy đủ) trong lúc dựng. Chữ ký
+        được đọc trước khi đọc sản phẩm: thay đổi commit chen giữa làm chữ ký
+        khác đi và chỉ mục sẽ được dựng lại ở lần kiểm tra sau.
+        """
+        started = time.perf_counter()
+        signature = signature or self._current_signature()
+        products = self._load_products()
+        index = InvertedIndex()
+        for product in products:
+            index.add(product.id, product_fields(product))
+        self.index = index
+        self._signature = signature
+        self._built = True
+        current_app.logger.info(
+            f"Built in-memory search index: {len(products)} products in "
+            f"{(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+
+    def search(self, query, limit=None):
+        self._ensure_fresh()
+        return self.index.search(query, limit=limit)
+
+    def index_product(self, product):
+        if not self._built:
+            return
+        try:
+            self.index.add(product.id, product_fields(product))
+        except Exception as e:
+            current_app.logger.error(f"Error indexing product {product.id}: {str(e)}")
+            self._built = False
+
+    def index_products(self, products):
+        if not self._built:
+            return
+        try:
+            for product in products:
+                self.index.add(product.id, product_fields(product))
+        except Exception as e:
+            current_app.logger.error(f"Error indexing products: {str(e)}")
+            self._built = False
+
+    def remove_product(self, product_id):
+        if not self._built:
+            return
+        try:
+            self.index.remove(product_id)
+        except Exception as e:
+            current_app.logger.error(f"Error removing product {product_id} from search index: {str(e)}")
+            self._built = False
+
+    def rebuild(self):
+        with self._lock:
+            self._build()
+            self._checked_at = time.monotonic()
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Full-text search của database
+
+    - SQLite: bảng ảo FTS5 `product_search`, xếp hạng bằng bm25()
+    - PostgreSQL: bảng `product_search` với cột tsvector và chỉ mục GIN,
+      xếp hạng bằng ts_rank_cd()
+
+    Văn bản được bỏ dấu bằng fold_text trước khi lưu để tìm kiếm không dấu
+    hoạt động giống với backend trong bộ nhớ.
+
+    Bảng product_search được tạo bởi migration 8d2f4a6c1e39 (flask db upgrade);
+    backend chỉ ghi dữ liệu vào bảng, không tạo schema lúc chạy.
+    """
+    name = 'database'
+    SUPPORTED_DIALECTS = ('sqlite', 'postgresql')
+    TABLE = 'product_search'
+
+    def __init__(self):
+        self.dialect = db.engine.dialect.name
+        if self.dialect not in self.SUPPORTED_DIALECTS:
+            raise ValueError(f"Full-text search is not supported for database dialect '{self.dialect}'")
+        if not inspect(db.engine).has_table(self.TABLE):
+            raise ValueError(f"Table '{self.TABLE}' does not exist, run 'flask db upgrade'")
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock, uncounted():
+            if self._ready:
+                return
+            indexed = db.session.execute(text("SELECT COUNT(*) FROM product_search")).scalar()
+            if indexed != Product.query.count():
+                self._populate(self._load_products())
+            self._ready = True
+
+    def _populate(self, products):
+        db.session.execute(text("DELETE FROM product_search"))
+        for product in products:
+            self._upsert(product)
+        db.session.commit()
+        current_app.logger.info(f"Populated database search index with {len(products)} products")
+
+    def _upsert(self, product):
+        fields = {key: fold_text(value) for key, value in product_fields(product).items()}
+        if self.dialect == 'sqlite':
+            db.session.execute(text("DELETE FROM product_search WHERE rowid = :id"), {'id': product.id})
+            db.session.execute(
+                text("INSERT INTO product_search (rowid, name, category, description) "
+                     "VALUES (:id, :name, :category, :description)"),
+                {'id': product.id, **fields}
+            )
+        else:
+            db.session.execute(
+                text("INSERT INTO product_search (product_id, document) VALUES (:id, "
+                     "setweight(to_tsvector('simple', :name), 'A') || "
+                     "setweight(to_tsvector('simple', :category), 'B') || "
+                     "setweight(to_tsvector('simple', :description), 'C')) "
+                     "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document"),
+                {'id': product.id, **fields}
+            )
+
+    def search(self, query, limit=None):
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self._ensure_ready()
+
+        params = {'limit': limit or -1}
+        if self.dialect == 'sqlite':
+            params['query'] = ' OR '.join(f'"{term}"*' for term in terms)
+            weights = ', '.join(str(FIELD_WEIGHTS[field]) for field in ('name', 'category', 'description'))
+            sql = (f"SELECT rowid, -bm25(product_search, {weights}) AS score FROM product_search "
+                   "WHERE product_search MATCH :query ORDER BY score DESC, rowid LIMIT :limit")
+        else:
+            params['query'] = ' | '.join(f'{term}:*' for term in terms)
+            params['limit'] = limit
+            sql = ("SELECT product_id, ts_rank_cd(document, q) AS score "
+                   "FROM product_search, to_tsquery('simple', :query) AS q "
+                   "WHERE document @@ q ORDER BY score DESC, product_id LIMIT :limit")
+        rows = db.session.execute(text(sql), params).all()
+        return [(row[0], float(row[1])) for row in rows]
+
+    def index_product(self, product):
+        try:
+            self._ensure_ready()
+            self._upsert(product)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error indexing product {product.id}: {str(e)}")
+            self._ready = False
+
+    def index_products(self, products):
+        try:
+            self._ensure_ready()
+            for product in products:
+                self._upsert(product)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error indexing products: {str(e)}")
+            self._ready = False
+
+    def remove_product(self, product_id):
+        try:
+            self._ensure_ready()
+            column = 'rowid' if self.dialect == 'sqlite' else 'product_id'
+            db.session.execute(text(f"DELETE FROM product_search WHERE {column} = :id"), {'id': product_id})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error removing product {product_id} from search index: {str(e)}")
+            self._ready = False
+
+    def rebuild(self):
+        with self._lock:
+            self._populate(self._load_products())
+            self._ready = True
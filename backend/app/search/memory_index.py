@@ -0,0 +1,140 @@
+"""
+Chỉ mục đảo ngược trong bộ nhớ với xếp hạng BM25
+"""
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from app.search.analyzer import FIELD_WEIGHTS, tokenize
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MIN_PREFIX_LENGTH = 2  # Độ dài tối thiểu để mở rộng tiền tố (vd: "jea" -> "jeans")
+PREFIX_MATCH_PENALTY = 0.5  # Từ khớp theo tiền tố được tính điểm thấp hơn khớp chính xác
+
+
+class InvertedIndex:
+    """
+    Chỉ mục đảo ngược term -> {doc_id: trọng số tần suất}
+
+    Mỗi tài liệu gồm nhiều trường, tần suất của một từ được nhân với trọng số
+    của trường chứa nó (BM25F rút gọn). Các thao tác ghi được khóa để an toàn
+    khi nhiều luồng của cùng một worker cùng cập nhật.
+    """
+
+    def __init__(self, field_weights=None):
+        self.field_weights = field_weights or FIELD_WEIGHTS
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._vocabulary = None  # Danh sách từ đã sắp xếp, tạo lại khi cần
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    def clear(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+            self._vocabulary = None
+
+    def add(self, doc_id, fields):
+        """
+        Thêm hoặc cập nhật một tài liệu
+
+        Args:
+            doc_id: ID tài liệu (ID sản phẩm)
+            fields (dict): {tên trường: nội dung}
+        """
+        term_freqs = defaultdict(float)
+        for field, text in fields.items():
+            weight = self.field_weights.get(field, 1.0)
+            for term in tokenize(text):
+                term_freqs[term] += weight
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            for term, freq in term_freqs.items():
+                self._postings[term][doc_id] = freq
+            length = sum(term_freqs.values())
+            self._doc_terms[doc_id] = list(term_freqs)
+            self._doc_lengths[doc_id] = length
+            self._total_length += length
+            self._vocabulary = None
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+        self._vocabulary = None
+
+    def _expand(self, term):
+        """Trả về các từ trong chỉ mục khớp với term (chính xác hoặc theo tiền tố)"""
+        matches = []
+        if term in self._postings:
+            matches.append((term, 1.0))
+        if len(term) >= MIN_PREFIX_LENGTH:
+            if self._vocabulary is None:
+                self._vocabulary = sorted(self._postings)
+            vocabulary = self._vocabulary
+            pos = bisect_left(vocabulary, term)
+            while pos < len(vocabulary) and vocabulary[pos].startswith(term):
+                if vocabulary[pos] != term:
+                    matches.append((vocabulary[pos], PREFIX_MATCH_PENALTY))
+                pos += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """
+        Tìm kiếm và xếp hạng theo BM25
+
+        Args:
+            query (str): Chuỗi tìm kiếm
+            limit (int, optional): Số kết quả tối đa
+
+        Returns:
+            list: [(doc_id, score)] sắp xếp theo điểm giảm dần
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if doc_count == 0:
+                return []
+            avg_length = self._total_length / doc_count or 1.0
+
+            scores = defaultdict(float)
+            for term in terms:
+                for matched_term, boost in self._expand(term):
+                    postings = self._postings[matched_term]
+                    df = len(postings)
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    for doc_id, freq in postings.items():
+                        norm = 1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / avg_length
+                        scores[doc_id] += boost * idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit:
+            ranked = ranked[:limit]
+        return ranked
@@ -1,9 +1,51 @@
 from app.models.user import User
 from app import db
 from flask_jwt_extended import create_access_token, create_refresh_token
-from app.utils.security import generate_password_hash, check_password_hash
+from app.utils.security import invalidate_admin_status, ADMIN_CLAIM, TOKEN_VERSION_CLAIM
 
 class AuthService:
+    @staticmethod
+    def create_access_token(user):
+        """
+        Tạo access token kèm quyền admin và token_version của người dùng
+        
+        admin_required đọc quyền từ các claim này thay vì truy vấn bảng users.
+        """
+        return create_access_token(
+            identity=str(user.id),
+            additional_claims={
+                ADMIN_CLAIM: bool(user.is_admin),
+                TOKEN_VERSION_CLAIM: user.token_version or 0
+            }
+        )
+    
+    @staticmethod
+    def create_tokens(user):
+        """
+        Tạo cặp token cho người dùng
+        
+        Returns:
+            tuple: (access_token, refresh_token)
+        """
+        return AuthService.create_access_token(user), create_refresh_token(identity=str(user.id))
+    
+    @staticmethod
+    def set_admin_status(user, is_admin):
+        """
+        Cập nhật quyền admin và thu hồi các access token đã cấp trước đó
+        
+        Args:
+            user (User): Người dùng
+            is_admin (bool): Quyền admin mới
+        """
+        is_admin = bool(is_admin)
+        if bool(user.is_admin) != is_admin:
+            user.is_admin = is_admin
+            user.token_version = (user.token_version or 0) + 1
+        db.session.commit()
+        invalidate_admin_status(user.id)
+        return user
+    
     @staticmethod
     def register_user(name, email, password, phone=None, address=None, city=None):
         """
@@ -31,7 +73,7 @@ class AuthService:
         user = User(
             name=name,
             email=email,
-            password=generate_password_hash(password),
+            password=password,  # Được mã hóa qua setter
             phone=phone,
             address=address,
             city=city
@@ -42,8 +84,7 @@ class AuthService:
         db.session.commit()
         
         # Tạo token
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token, refresh_token = AuthService.create_tokens(user)
         
         return user, access_token, refresh_token
     
@@ -61,11 +102,14 @@ class AuthService:
         """
         user = User.query.filter_by(email=email).first()
         
-        if not user or not check_password_hash(user.password, password):
+        if not user or not user.verify_password(password):
             return None
         
+        # Nâng cấp hash nếu cost factor thấp hơn cấu hình hiện tại
+        if user.upgrade_password_hash(password):
+            db.session.commit()
+        
         # Tạo token
-        access_token = create_access_token(identity=user.id)
-        refresh_token = create_refresh_token(identity=user.id)
+        access_token, refresh_token = AuthService.create_tokens(user)
         
         return user, access_token, refresh_token
\ No newline at end of file
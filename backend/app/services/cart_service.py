@@ -0,0 +1,395 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models.cart import Cart, CartItem
+from app.models.product import Product
+from app.utils.serialization import CART_DETAIL, CART_ITEMS
+
+
+MAX_BATCH_OPERATIONS = 100
+
+
+class NotFound(ValueError):
+    """Không tìm thấy sản phẩm hoặc dòng giỏ hàng"""
+
+
+class CartService:
+    """
+    Các thao tác trên giỏ hàng
+
+    Mỗi thao tác cập nhật tổng của giỏ (Cart.add_to_totals) trong cùng giao
+    dịch và trả về delta: dòng đã thay đổi, ID các dòng đã xóa, tổng mới và
+    version mới, thay vì cả giỏ hàng.
+    """
+
+    @staticmethod
+    def get_or_create_cart(user_id):
+        cart = Cart.query.filter_by(user_id=user_id).first()
+        if not cart:
+            current_app.logger.info(f"Creating new cart for user {user_id}")
+            cart = Cart(user_id=user_id, total_items=0, subtotal=0, version=0)
+            db.session.add(cart)
+            db.session.flush()
+        return cart
+
+    @staticmethod
+    def get_cart(user_id):
+        """
+        Toàn bộ giỏ hàng: giỏ, các dòng, sản phẩm và danh mục trong một query JOIN
+
+        Returns:
+            dict: items, total, total_items, version
+        """
+        cart = CART_DETAIL.apply(Cart.query).filter_by(user_id=user_id).first()
+        if not cart:
+            CartService.get_or_create_cart(user_id)
+            db.session.commit()
+            return {'items': [], 'total': 0, 'total_items': 0, 'version': 0}
+
+        items = sorted(cart.items, key=lambda item: item.id)
+        total_items = sum(item.quantity for item in items)
+        subtotal = sum(item.product.price * item.quantity for item in items if item.product)
+        payload = {
+            'items': CART_ITEMS.serialize(items),
+            'total': subtotal,
+            'total_items': total_items,
+            'version': cart.version
+        }
+
+        # Tổng lưu sẵn bị lệch (dữ liệu ghi trực tiếp vào cart_items): sửa lại từ các dòng vừa đọc
+        if cart.total_items != total_items or abs(cart.subtotal - subtotal) > 0.005:
+            current_app.logger.warning(f"Cart {cart.id} totals out of date, recalculated")
+            cart.total_items = total_items
+            cart.subtotal = subtotal
+            cart.version += 1
+            payload['version'] = cart.version
+            db.session.commit()
+        return payload
+
+    @staticmethod
+    def _delta(cart_id, item=None, removed_ids=()):
+        """Phản hồi của một thao tác; gọi trước commit (sau commit các đối tượng bị expire)"""
+        total_items, subtotal, version = Cart.totals(cart_id)
+        return {
+            'item': item.to_dict() if item else None,
+            'removed_ids': list(removed_ids),
+            'total': subtotal,
+            'total_items': total_items,
+            'version': version
+        }
+
+    @staticmethod
+    def _get_item(user_id, item_id):
+        cart_item = CART_ITEMS.apply(CartItem.query).filter_by(id=item_id, user_id=user_id).first()
+        if not cart_item:
+            raise NotFound('Cart item not found')
+        return cart_item
+
+    @staticmethod
+    def add_item(user_id, product_id, quantity=1, size=''):
+        """
+        Thêm sản phẩm vào giỏ (cộng dồn nếu đã có cùng sản phẩm và size)
+
+        Raises:
+            NotFound: Sản phẩm không tồn tại
+            ValueError: Size, số lượng hoặc tồn kho không hợp lệ
+        """
+        if not product_id:
+            raise ValueError('Product ID is required')
+
+        product = Product.query.get(product_id)
+        if not product:
+            raise NotFound(f'Product with ID {product_id} not found')
+
+        sizes = product.size_map
+        if sizes and not size:
+            raise ValueError('Vui lòng chọn kích thước')
+        if sizes and size not in sizes:
+            raise ValueError(f'Kích thước không hợp lệ. Các kích thước có sẵn: {", ".join(product.size_names)}')
+
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError('Quantity must be greater than 0')
+
+        stock = product.stock_for(size, sizes)
+        if stock is not None and stock < quantity:
+            raise ValueError('Not enough stock')
+
+        cart = CartService.get_or_create_cart(user_id)
+
+        # Kiểm tra sản phẩm đã có trong giỏ hàng chưa, theo cả sản phẩm và size
+        cart_item = CartItem.query.filter_by(
+            user_id=user_id,
+            product_id=product.id,
+            cart_id=cart.id,
+            size=size
+        ).first()
+        if cart_item:
+            cart_item.quantity += quantity
+        else:
+            cart_item = CartItem(
+                user_id=user_id,
+                product_id=product.id,
+                cart_id=cart.id,
+                quantity=quantity,
+                size=size
+            )
+            db.session.add(cart_item)
+        db.session.flush()
+
+        Cart.add_to_totals(cart.id, quantity, quantity * product.price)
+        delta = CartService._delta(cart.id, item=cart_item)
+        db.session.commit()
+        return delta
+
+    @staticmethod
+    def update_quantity(user_id, item_id, quantity):
+        if not isinstance(quantity, int) or quantity <= 0:
+            raise ValueError('Quantity must be greater than 0')
+
+        cart_item = CartService._get_item(user_id, item_id)
+        stock = cart_item.product.stock_for(cart_item.size) if cart_item.product else None
+        if stock is not None and stock < quantity:
+            raise ValueError('Not enough stock')
+
+        change = quantity - cart_item.quantity
+        cart_item.quantity = quantity
+        price = cart_item.product.price if cart_item.product else 0
+        Cart.add_to_totals(cart_item.cart_id, change, change * price)
+        delta = CartService._delta(cart_item.cart_id, item=cart_item)
+        db.session.commit()
+        return delta
+
+    @staticmethod
+    def update_size(user_id, item_id, size):
+        """Đổi size của một dòng; gộp vào dòng cùng sản phẩm và size mới nếu đã có"""
+        if not size:
+            raise ValueError('Size is required')
+
+        cart_item = CartService._get_item(user_id, item_id)
+        if not cart_item.product:
+            raise NotFound('Product not found')
+
+        sizes = cart_item.product.size_map
+        if sizes and size not in sizes:
+            raise ValueError(f'Invalid size. Available sizes: {", ".join(cart_item.product.size_names)}')
+
+        existing_item = CART_ITEMS.apply(CartItem.query).filter_by(
+            user_id=user_id,
+            product_id=cart_item.product_id,
+            cart_id=cart_item.cart_id,
+            size=size
+        ).first()
+
+        removed_ids = []
+        if existing_item and existing_item.id != cart_item.id:
+            # Gộp số lượng vào dòng đã có size mới
+            existing_item.quantity += cart_item.quantity
+            db.session.delete(cart_item)
+            removed_ids.append(cart_item.id)
+            cart_item = existing_item
+        else:
+            cart_item.size = size
+
+        # Tổng không đổi, chỉ tăng version
+        Cart.add_to_totals(cart_item.cart_id, 0, 0)
+        delta = CartService._delta(cart_item.cart_id, item=cart_item, removed_ids=removed_ids)
+        db.session.commit()
+        return delta
+
+    @staticmethod
+    def remove_item(user_id, item_id):
+        cart_item = CartService._get_item(user_id, item_id)
+        price = cart_item.product.price if cart_item.product else 0
+        cart_id = cart_item.cart_id
+        db.session.delete(cart_item)
+        Cart.add_to_totals(cart_id, -cart_item.quantity, -cart_item.quantity * price)
+        delta = CartService._delta(cart_id, removed_ids=[item_id])
+        db.session.commit()
+        return delta
+
+    @staticmethod
+    def clear(user_id):
+        cart = Cart.query.filter_by(user_id=user_id).first()
+        if not cart:
+            return None
+        removed_ids = [item_id for item_id, in db.session.query(CartItem.id).filter_by(cart_id=cart.id)]
+        db.session.execute(
+            db.delete(CartItem).where(CartItem.cart_id == cart.id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            db.update(Cart).where(Cart.id == cart.id)
+            .values(total_items=0, subtotal=0, version=Cart.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        delta = CartService._delta(cart.id, removed_ids=removed_ids)
+        db.session.commit()
+        return delta
+
+    @staticmethod
+    def _quantities_by_key(items):
+        """Tổng số lượng theo (product_id, size) của các dòng giỏ hàng"""
+        quantities = {}
+        for item in items:
+            key = (item.product_id, item.size)
+            quantities[key] = quantities.get(key, 0) + item.quantity
+        return quantities
+
+    @staticmethod
+    def apply_operations(user_id, operations):
+        """
+        Áp dụng nhiều thao tác trong một giao dịch và trả về giỏ hàng kết quả
+
+        Các dòng của giỏ (kèm sản phẩm) và các sản phẩm được thêm mới được đọc
+        bằng hai query; mọi thao tác được kiểm tra và áp dụng lần lượt trên dữ
+        liệu đó, lỗi ở bất kỳ thao tác nào thì không thao tác nào được lưu.
+
+        Args:
+            operations (list): Các thao tác, thực hiện theo thứ tự:
+                {'op': 'add', 'product_id', 'quantity', 'size'}
+                {'op': 'update', 'item_id', 'quantity'}
+                {'op': 'size', 'item_id', 'size'}
+                {'op': 'remove', 'item_id'}
+
+        Returns:
+            dict: items, total, total_items, version
+
+        Raises:
+            NotFound: Sản phẩm hoặc dòng giỏ hàng không tồn tại
+            ValueError: Thao tác không hợp lệ (thông báo có số thứ tự thao tác)
+        """
+        if not isinstance(operations, list) or not operations:
+            raise ValueError('Danh sách thao tác không hợp lệ')
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise ValueError(f'Tối đa {MAX_BATCH_OPERATIONS} thao tác mỗi lần')
+
+        cart = CartService.get_or_create_cart(user_id)
+        items = {
+            item.id: item
+            for item in CART_ITEMS.apply(CartItem.query).filter_by(user_id=user_id, cart_id=cart.id)
+        }
+        products = {item.product_id: item.product for item in items.values() if item.product}
+        new_product_ids = {
+            operation.get('product_id') for operation in operations
+            if isinstance(operation, dict) and operation.get('op') == 'add'
+        } - set(products) - {None}
+        if new_product_ids:
+            for product in Product.query.options(joinedload(Product.category)).filter(Product.id.in_(new_product_ids)):
+                products[product.id] = product
+        sizes = {product_id: product.size_map for product_id, product in products.items()}
+        lines = {(item.product_id, item.size): item for item in items.values()}
+        initial = CartService._quantities_by_key(items.values())
+        added_items = []
+        removed = set()
+
+        quantity_change = 0
+        amount_change = 0
+
+        def price_of(item):
+            product = products.get(item.product_id)
+            return product.price if product else 0
+
+        def unlink(item):
+            # Giỏ cũ có thể có hai dòng cùng (product_id, size); lines chỉ trỏ tới một trong số đó
+            if lines.get((item.product_id, item.size)) is item:
+                del lines[(item.product_id, item.size)]
+
+        for position, operation in enumerate(operations, start=1):
+            try:
+                if not isinstance(operation, dict):
+                    raise ValueError('Thao tác không hợp lệ')
+                op = operation.get('op')
+
+                if op == 'add':
+                    product_id = operation.get('product_id')
+                    quantity = operation.get('quantity', 1)
+                    size = operation.get('size') or ''
+                    product = products.get(product_id)
+                    if not product:
+                        raise NotFound(f'Product with ID {product_id} not found')
+                    if sizes[product_id] and size not in sizes[product_id]:
+                        raise ValueError('Vui lòng chọn kích thước' if not size else
+                                         f'Kích thước không hợp lệ. Các kích thước có sẵn: {", ".join(product.size_names)}')
+                    if not isinstance(quantity, int) or quantity <= 0:
+                        raise ValueError('Quantity must be greater than 0')
+                    item = lines.get((product_id, size))
+                    if item:
+                        item.quantity += quantity
+                    else:
+                        item = CartItem(user_id=user_id, product_id=product_id, cart_id=cart.id,
+                                        quantity=quantity, size=size)
+                        db.session.add(item)
+                        lines[(product_id, size)] = item
+                        added_items.append(item)
+                    quantity_change += quantity
+                    amount_change += quantity * product.price
+                    continue
+
+                item = items.get(operation.get('item_id'))
+                if not item or item.id in removed:
+                    raise NotFound('Cart item not found')
+
+                if op == 'update':
+                    quantity = operation.get('quantity')
+                    if not isinstance(quantity, int) or quantity <= 0:
+                        raise ValueError('Quantity must be greater than 0')
+                    change = quantity - item.quantity
+                    item.quantity = quantity
+                    quantity_change += change
+                    amount_change += change * price_of(item)
+                elif op == 'size':
+                    size = operation.get('size')
+                    if not size:
+                        raise ValueError('Size is required')
+                    if item.product_id not in products:
+                        raise NotFound('Product not found')
+                    if sizes[item.product_id] and size not in sizes[item.product_id]:
+                        raise ValueError(f'Invalid size. Available sizes: {", ".join(products[item.product_id].size_names)}')
+                    existing_item = lines.get((item.product_id, size))
+                    unlink(item)
+                    if existing_item and existing_item is not item:
+                        # Gộp số lượng vào dòng đã có size mới
+                        existing_item.quantity += item.quantity
+                        db.session.delete(item)
+                        removed.add(item.id)
+                    else:
+                        item.size = size
+                        lines[(item.product_id, size)] = item
+                elif op == 'remove':
+                    unlink(item)
+                    db.session.delete(item)
+                    removed.add(item.id)
+                    quantity_change -= item.quantity
+                    amount_change -= item.quantity * price_of(item)
+                else:
+                    raise ValueError(f"Thao tác '{op}' không được hỗ trợ")
+            except ValueError as e:
+                raise type(e)(f'Thao tác #{position}: {e}') from e
+
+        # Tồn kho kiểm tra trên tổng số lượng cuối cùng của mỗi (sản phẩm, size), gồm cả các dòng trùng,
+        # chỉ với các key có số lượng tăng trong lần này: dòng không đổi đã vượt tồn kho (tồn kho
+        # giảm sau khi thêm vào giỏ) không chặn các thao tác khác, kể cả xóa chính dòng đó
+        remaining = [item for item in items.values() if item.id not in removed] + added_items
+        requested = CartService._quantities_by_key(remaining)
+        for (product_id, size), quantity in requested.items():
+            if quantity <= initial.get((product_id, size), 0):
+                continue
+            product = products.get(product_id)
+            stock = product.stock_for(size, sizes[product_id]) if product else None
+            if stock is not None and stock < quantity:
+                raise ValueError(f"Not enough stock: {product.name}")
+
+        db.session.flush()
+        Cart.add_to_totals(cart.id, quantity_change, amount_change)
+        total_items, subtotal, version = Cart.totals(cart.id)
+        # Sản phẩm của các dòng mới lấy từ identity map, không query lại
+        result = sorted(remaining, key=lambda item: item.id)
+        payload = {
+            'items': CART_ITEMS.serialize(result),
+            'total': subtotal,
+            'total_items': total_items,
+            'version': version
+        }
+        db.session.commit()
+        return payload
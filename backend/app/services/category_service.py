@@ -1,8 +1,15 @@
 from app import db
-from app.models.category import Category
+from app.models.category import Category, CategoryClosure
+from app.models.catalog_change import CatalogChange
+from app.search import get_search_backend
+from app.utils.cache import VersionedCache, CATEGORY_TREE_CACHE, bump_version
 from app.utils.validators import validate_category_data
+from flask import current_app
 from sqlalchemy.exc import IntegrityError
 
+# Cây danh mục đã serialize, dùng chung trong process và làm mới theo version stamp
+_category_tree_cache = VersionedCache(CATEGORY_TREE_CACHE)
+
 class CategoryService:
     @staticmethod
     def get_all_categories():
@@ -14,11 +21,36 @@ class CategoryService:
         """Get a category by ID"""
         return Category.query.get_or_404(category_id)
     
+    @staticmethod
+    def categories_to_dict(categories):
+        """Serialize a list of categories with counts computed in bulk"""
+        product_counts, child_counts = Category.get_tree_stats()
+        return [
+            c.to_dict(
+                product_count=product_counts.get(c.id, 0),
+                has_children=child_counts.get(c.id, 0) > 0
+            )
+            for c in categories
+        ]
+    
     @staticmethod
     def get_category_tree():
         """Get hierarchical category tree"""
         return Category.get_category_tree()
     
+    @staticmethod
+    def get_category_tree_json():
+        """
+        Get the serialized category tree from the process-local cache
+        
+        Returns:
+            tuple: (json_body, version) - version changes whenever categories
+            or product-category assignments are written
+        """
+        return _category_tree_cache.get_or_build(
+            lambda: current_app.json.dumps(Category.get_category_tree())
+        )
+    
     @staticmethod
     def create_category(data):
         """Create a new category"""
@@ -36,6 +68,12 @@ class CategoryService:
             )
             
             db.session.add(category)
+            db.session.flush()  # Để lấy ID của category
+            
+            # Cập nhật closure table cho danh mục mới
+            CategoryClosure.insert_node(category.id, category.parent_id)
+            bump_version(CATEGORY_TREE_CACHE)
+            
             db.session.commit()
             return category, None
         except IntegrityError as e:
@@ -58,6 +96,9 @@ class CategoryService:
             return None, validation_result
         
         try:
+            # Tên danh mục nằm trong chỉ mục tìm kiếm sản phẩm
+            name_changed = 'name' in data and data['name'] != category.name
+            
             if 'name' in data:
                 category.name = data['name']
             if 'description' in data:
@@ -65,9 +106,19 @@ class CategoryService:
             if 'image_url' in data:
                 category.image_url = data['image_url']
             if 'parent_id' in data:
-                category.parent_id = data['parent_id']
+                new_parent_id = int(data['parent_id']) if data['parent_id'] else None
+                if new_parent_id != category.parent_id:
+                    # Di chuyển cả cây con trong closure table
+                    CategoryClosure.move_subtree(category.id, new_parent_id)
+                    category.parent_id = new_parent_id
             
+            if name_changed:
+                CatalogChange.record_many(product.id for product in category.products)
+            bump_version(CATEGORY_TREE_CACHE)
             db.session.commit()
+            
+            if name_changed:
+                get_search_backend().index_products(category.products)
             return category, None
         except IntegrityError as e:
             db.session.rollback()
@@ -92,7 +143,9 @@ class CategoryService:
             return False, "Cannot delete category with subcategories"
         
         try:
+            CategoryClosure.delete_node(category.id)
             db.session.delete(category)
+            bump_version(CATEGORY_TREE_CACHE)
             db.session.commit()
             return True, None
         except Exception as e:
@@ -6,6 +6,7 @@ import logging
 import traceback
 from flask import current_app
 from app.chatbot.rag_model import get_chatbot_instance
+from app.chatbot.loader import loader
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -34,8 +35,8 @@ class ChatbotService:
                     "sources": []
                 }
             
-            # Initialize chatbot and get answer
-            chatbot = get_chatbot_instance()
+            # Lấy chatbot đã warm-up (raise ChatbotNotReady nếu chưa sẵn sàng)
+            chatbot = loader.get_chatbot()
             logger.info("Chatbot instance initialized")
             
             # Get answer
@@ -58,18 +59,21 @@ class ChatbotService:
             }
     
     @staticmethod
-    def rebuild_index() -> Dict[str, Any]:
+    def rebuild_index(full: bool = False) -> Dict[str, Any]:
         """
         Rebuild the knowledge base vector index
         
+        Args:
+            full: Re-embed every file instead of only the changed ones
+        
         Returns:
             Status message
         """
         try:
             logger.info("Starting knowledge base index rebuild")
-            get_chatbot_instance(rebuild_index=True)
+            stats = get_chatbot_instance().rebuild(full=full)
             logger.info("Knowledge base index rebuilt successfully")
-            return {"status": "success", "message": "Knowledge base index rebuilt successfully"}
+            return {"status": "success", "message": "Knowledge base index rebuilt successfully", "index": stats}
         except Exception as e:
             logger.error(f"Error rebuilding index: {str(e)}")
             logger.error(traceback.format_exc())
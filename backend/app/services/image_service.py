@@ -0,0 +1,315 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app import db
+
+VARIANTS_DIR = 'variants'
+
+# Định dạng Pillow -> phần mở rộng của file gốc
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+# Định dạng biến thể -> (phần mở rộng, tham số lưu của Pillow)
+VARIANT_FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True})
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class ImageService:
+    """
+    Lưu ảnh sản phẩm và sinh các biến thể responsive
+
+    File gốc được đặt tên theo hash nội dung (ảnh trùng nhau chỉ lưu một lần).
+    Các biến thể WebP/JPEG theo IMAGE_VARIANT_WIDTHS được sinh trên worker nền
+    vào uploads/variants/<key>_<width>.<ext>, kèm manifest <key>.json ghi sau
+    cùng để đánh dấu đã sinh xong. Bản đồ biến thể được lưu vào
+    Product.image_variants nên serialize sản phẩm không cần đọc file.
+    """
+
+    @staticmethod
+    def _upload_folder():
+        return current_app.config['UPLOAD_FOLDER']
+
+    @staticmethod
+    def _key(filename):
+        """Khóa của biến thể: tên file gốc bỏ phần mở rộng (hash nội dung với ảnh mới)"""
+        return os.path.splitext(os.path.basename(filename))[0]
+
+    @staticmethod
+    def filename_from_url(image_url):
+        if not image_url:
+            return None
+        if image_url.startswith('uploads/'):
+            return image_url.replace('uploads/', '', 1)
+        return os.path.basename(image_url)
+
+    @staticmethod
+    def save_upload(image_file):
+        """
+        Lưu ảnh upload với tên theo hash nội dung và lên lịch sinh biến thể
+
+        Args:
+            image_file (FileStorage): File ảnh
+
+        Returns:
+            str: Tên file đã lưu
+
+        Raises:
+            ValueError: Nếu file không phải ảnh hợp lệ
+        """
+        data = image_file.read()
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image_format = image.format
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError) as e:
+            raise ValueError(f"File ảnh không hợp lệ: {str(e)}")
+
+        extension = ORIGINAL_EXTENSIONS.get(image_format)
+        if not extension:
+            raise ValueError(f"Định dạng ảnh không được hỗ trợ: {image_format}")
+
+        filename = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+        file_path = os.path.join(ImageService._upload_folder(), filename)
+        if os.path.exists(file_path):
+            current_app.logger.info(f"Image already stored, reusing: {filename}")
+        else:
+            ImageService._write_atomic(file_path, data)
+
+        ImageService.schedule_variants(filename)
+        return filename
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _get_executor():
+        global _executor
+        if _executor is None:
+            with _executor_lock:
+                if _executor is None:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=current_app.config.get('IMAGE_WORKERS', 1),
+                        thread_name_prefix='image-variants'
+                    )
+        return _executor
+
+    @staticmethod
+    def schedule_variants(filename):
+        """Đưa việc sinh biến thể của một ảnh vào worker nền (bỏ qua nếu đang chờ)"""
+        key = ImageService._key(filename)
+        with _pending_lock:
+            if key in _pending:
+                return
+            _pending.add(key)
+
+        app = current_app._get_current_object()
+        upload_folder = ImageService._upload_folder()
+        widths = tuple(current_app.config.get('IMAGE_VARIANT_WIDTHS', (200, 400, 800)))
+
+        def task():
+            try:
+                manifest = ImageService._read_manifest(upload_folder, key)
+                if manifest is None:
+                    manifest = ImageService.generate_variants(upload_folder, filename, widths)
+                    app.logger.info(f"Generated {len(manifest['widths'])} variant sizes for {filename}")
+                with app.app_context():
+                    ImageService.store_variants(f"uploads/{filename}", manifest)
+            except Exception as e:
+                app.logger.error(f"Error generating variants for {filename}: {str(e)}")
+            finally:
+                with _pending_lock:
+                    _pending.discard(key)
+
+        ImageService._get_executor().submit(task)
+
+    @staticmethod
+    def generate_variants(upload_folder, filename, widths):
+        """
+        Sinh các biến thể WebP/JPEG của một ảnh (chạy được ngoài app context)
+
+        Không phóng to ảnh: chỉ sinh các chiều rộng nhỏ hơn ảnh gốc, cộng thêm
+        chiều rộng gốc nếu nó nhỏ hơn chiều rộng lớn nhất.
+
+        Returns:
+            dict: Manifest {'width', 'height', 'widths', 'variants': {format: {width: path}}}
+        """
+        key = ImageService._key(filename)
+        variants_folder = os.path.join(upload_folder, VARIANTS_DIR)
+        os.makedirs(variants_folder, exist_ok=True)
+
+        with Image.open(os.path.join(upload_folder, filename)) as source:
+            source.seek(0)  # GIF động: dùng khung hình đầu
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+            target_widths = sorted({w for w in widths if w < image.width} |
+                                   ({image.width} if image.width < max(widths) else set()))
+            if not target_widths:
+                target_widths = [min(widths)]
+
+            variants = {name: {} for name in VARIANT_FORMATS}
+            for width in target_widths:
+                height = max(1, round(image.height * width / image.width))
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                for name, (extension, save_options) in VARIANT_FORMATS.items():
+                    output = resized
+                    if name == 'jpeg' and has_alpha:
+                        # JPEG không có kênh alpha: ghép lên nền trắng
+                        output = Image.new('RGB', resized.size, (255, 255, 255))
+                        output.paste(resized, mask=resized.getchannel('A'))
+                    buffer = io.BytesIO()
+                    output.save(buffer, **save_options)
+                    variant_name = f"{key}_{width}.{extension}"
+                    ImageService._write_atomic(os.path.join(variants_folder, variant_name), buffer.getvalue())
+                    variants[name][str(width)] = f"{VARIANTS_DIR}/{variant_name}"
+
+            manifest = {
+                'width': image.width,
+                'height': image.height,
+                'widths': target_widths,
+                'variants': variants
+            }
+
+        # Manifest ghi sau cùng: có manifest nghĩa là mọi biến thể đã sẵn sàng
+        ImageService._write_atomic(
+            os.path.join(variants_folder, f"{key}.json"),
+            json.dumps(manifest).encode('utf-8')
+        )
+        return manifest
+
+    @staticmethod
+    def store_variants(image_url, manifest):
+        """Ghi bản đồ biến thể vào mọi sản phẩm dùng ảnh này (ảnh theo hash có thể dùng chung)"""
+        from app.models.product import Product
+
+        db.session.execute(
+            db.update(Product)
+            .where(Product.image_url == image_url)
+            .values(image_variants=manifest['variants'], updated_at=Product.updated_at)
+        )
+        db.session.commit()
+
+    @staticmethod
+    def attach_variants(product):
+        """
+        Gắn bản đồ biến thể vào sản phẩm vừa lưu ảnh mới (gọi sau commit)
+
+        Worker nền ghi vào các sản phẩm đã commit khi sinh xong; đọc lại manifest
+        ở đây bắt trường hợp worker xong trước khi sản phẩm được commit. Ảnh chưa
+        có biến thể được lên lịch sinh.
+        """
+        filename = ImageService.filename_from_url(product.image_url)
+        if product.image_variants or not filename or product.image_url.startswith(('http://', 'https://')):
+            return
+        upload_folder = ImageService._upload_folder()
+        manifest = ImageService._read_manifest(upload_folder, ImageService._key(filename))
+        if manifest:
+            product.image_variants = manifest['variants']
+            db.session.commit()
+        elif os.path.exists(os.path.join(upload_folder, filename)):
+            ImageService.schedule_variants(filename)
+
+    @staticmethod
+    def backfill_variants():
+        """
+        Sinh biến thể cho các ảnh upload chưa có image_variants (ảnh cũ, worker bị dừng giữa chừng)
+
+        Chạy đồng bộ, dùng cho script bảo trì generate_image_variants.py.
+
+        Returns:
+            int: Số ảnh đã ghi bản đồ biến thể
+        """
+        from app.models.product import Product
+
+        upload_folder = ImageService._upload_folder()
+        widths = tuple(current_app.config.get('IMAGE_VARIANT_WIDTHS', (200, 400, 800)))
+        image_urls = db.session.scalars(
+            db.select(Product.image_url).distinct()
+            .where(Product.image_url.like('uploads/%'), Product.image_variants.is_(None))
+        ).all()
+
+        stored = 0
+        for image_url in image_urls:
+            filename = ImageService.filename_from_url(image_url)
+            if not os.path.exists(os.path.join(upload_folder, filename)):
+                current_app.logger.warning(f"Image file missing, skipping variants: {filename}")
+                continue
+            manifest = ImageService._read_manifest(upload_folder, ImageService._key(filename))
+            if manifest is None:
+                manifest = ImageService.generate_variants(upload_folder, filename, widths)
+            ImageService.store_variants(image_url, manifest)
+            stored += 1
+        return stored
+
+    @staticmethod
+    def _read_manifest(upload_folder, key):
+        path = os.path.join(upload_folder, VARIANTS_DIR, f"{key}.json")
+        try:
+            with open(path, 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def delete_image(image_url, exclude_product_id=None):
+        """
+        Xóa ảnh gốc và các biến thể nếu không còn sản phẩm nào khác dùng ảnh này
+
+        Args:
+            image_url (str): URL ảnh
+            exclude_product_id (int, optional): Sản phẩm đang bỏ ảnh này (không tính là tham chiếu)
+
+        Returns:
+            bool: True nếu file đã bị xóa
+        """
+        from app.models.product import Product
+
+        filename = ImageService.filename_from_url(image_url)
+        if not filename:
+            return False
+
+        # Ảnh đặt tên theo hash có thể được nhiều sản phẩm dùng chung
+        references = Product.query.filter(Product.image_url == image_url)
+        if exclude_product_id is not None:
+            references = references.filter(Product.id != exclude_product_id)
+        if references.first() is not None:
+            current_app.logger.info(f"Image {filename} still referenced, keeping it")
+            return False
+
+        upload_folder = ImageService._upload_folder()
+        key = ImageService._key(filename)
+        paths = [os.path.join(upload_folder, filename)]
+        variants_folder = os.path.join(upload_folder, VARIANTS_DIR)
+        manifest = ImageService._read_manifest(upload_folder, key)
+        if manifest:
+            for variant_paths in manifest['variants'].values():
+                paths.extend(os.path.join(upload_folder, path) for path in variant_paths.values())
+        paths.append(os.path.join(variants_folder, f"{key}.json"))
+
+        for path in paths:
+            try:
+                os.remove(path)
+                current_app.logger.info(f"Deleted image: {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                current_app.logger.error(f"Error deleting image {path}: {str(e)}")
+        return True
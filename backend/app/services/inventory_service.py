@@ -0,0 +1,228 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models.order import Order, OrderItem, OrderStatus, PaymentStatus
+from app.models.product import Product
+from app.models.product_size import ProductSize
+from app.services.stats_service import StatsService
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+class InsufficientStock(ValueError):
+    """Không đủ tồn kho cho một sản phẩm của đơn hàng"""
+
+    def __init__(self, product_id, quantity, size=None):
+        label = f"Sản phẩm #{product_id}" + (f" (size {size})" if size else "")
+        super().__init__(f"{label} không đủ số lượng trong kho")
+        self.product_id = product_id
+        self.quantity = quantity
+        self.size = size
+
+
+class InventoryService:
+    """
+    Giữ hàng (trừ tồn kho) khi đặt hàng và hoàn kho khi đơn bị hủy
+
+    Tồn kho được trừ bằng UPDATE có điều kiện
+    (stock = stock - :q WHERE id = :id AND stock >= :q): câu lệnh khóa dòng sản
+    phẩm và kiểm tra lại điều kiện trên giá trị mới nhất, nên các checkout đồng
+    thời không thể bán quá số lượng. Các sản phẩm luôn được cập nhật theo thứ
+    tự id tăng dần để hai giao dịch không khóa chéo nhau (deadlock).
+
+    Size có tồn kho riêng (product_sizes.stock không NULL) được trừ theo cùng
+    cách, sau các dòng sản phẩm và theo thứ tự (product_id, size).
+    """
+
+    @staticmethod
+    def _quantities(lines):
+        """
+        [(product_id, size, quantity)] -> tổng theo sản phẩm và theo (sản phẩm, size)
+
+        Returns:
+            tuple: ([(product_id, quantity)], [((product_id, size), quantity)]), sắp xếp tăng dần
+        """
+        products = {}
+        sizes = {}
+        for product_id, size, quantity in lines:
+            if not quantity or quantity <= 0:
+                raise ValueError("Số lượng sản phẩm phải lớn hơn 0")
+            products[product_id] = products.get(product_id, 0) + quantity
+            key = (product_id, size or '')
+            sizes[key] = sizes.get(key, 0) + quantity
+        return sorted(products.items()), sorted(sizes.items())
+
+    @staticmethod
+    def reserve(lines):
+        """
+        Trừ tồn kho cho mọi dòng của đơn hàng; người gọi commit cùng đơn hàng
+
+        Args:
+            lines (list): [(product_id, size, quantity)]
+
+        Raises:
+            InsufficientStock: Một sản phẩm hoặc size không đủ hàng; người gọi
+                rollback để hoàn lại các dòng đã trừ trong cùng giao dịch
+        """
+        products, sizes = InventoryService._quantities(lines)
+        for product_id, quantity in products:
+            result = db.session.execute(
+                db.update(Product)
+                .where(Product.id == product_id, Product.stock >= quantity)
+                .values(stock=Product.stock - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise InsufficientStock(product_id, quantity)
+
+        tracked = InventoryService._tracked_sizes([key for key, _ in sizes if key[1]])
+        for (product_id, size), quantity in sizes:
+            if (product_id, size) not in tracked:
+                continue
+            result = db.session.execute(
+                db.update(ProductSize)
+                .where(
+                    ProductSize.product_id == product_id,
+                    ProductSize.size == size,
+                    ProductSize.stock >= quantity
+                )
+                .values(stock=ProductSize.stock - quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise InsufficientStock(product_id, quantity, size)
+
+    @staticmethod
+    def _tracked_sizes(keys):
+        """Các (product_id, size) trong keys có tồn kho riêng theo size, một query IN"""
+        if not keys:
+            return set()
+        rows = db.session.execute(
+            db.select(ProductSize.product_id, ProductSize.size).where(
+                ProductSize.product_id.in_({product_id for product_id, _ in keys}),
+                ProductSize.stock.isnot(None)
+            )
+        ).all()
+        return {(product_id, size) for product_id, size in rows}
+
+    @staticmethod
+    def release(order, expired_before=None):
+        """
+        Hoàn lại tồn kho đã giữ cho đơn hàng; người gọi commit
+
+        Cờ stock_reserved được xóa bằng UPDATE có điều kiện trước khi hoàn kho,
+        nên khi nhiều request (hủy đơn, thanh toán thất bại, hết hạn) cùng xử lý
+        một đơn thì tồn kho chỉ được hoàn một lần.
+
+        Args:
+            expired_before (datetime, optional): Chỉ hoàn nếu đơn vẫn chưa thanh
+                toán và hạn giữ hàng trước thời điểm này
+
+        Returns:
+            bool: True nếu tồn kho đã được hoàn
+        """
+        conditions = [Order.id == order.id, Order.stock_reserved.is_(True)]
+        if expired_before is not None:
+            conditions += [
+                Order.reserved_until < expired_before,
+                Order.payment_status == PaymentStatus.PENDING.value
+            ]
+        claimed = db.session.execute(
+            db.update(Order).where(*conditions)
+            .values(stock_reserved=False, reserved_until=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            return False
+        set_committed_value(order, 'stock_reserved', False)
+        set_committed_value(order, 'reserved_until', None)
+
+        lines = db.session.query(OrderItem.product_id, OrderItem.size, OrderItem.quantity).filter(
+            OrderItem.order_id == order.id
+        ).all()
+        products, sizes = InventoryService._quantities(lines)
+        for product_id, quantity in products:
+            db.session.execute(
+                db.update(Product).where(Product.id == product_id)
+                .values(stock=Product.stock + quantity)
+                .execution_options(synchronize_session=False)
+            )
+        for (product_id, size), quantity in sizes:
+            if not size:
+                continue
+            db.session.execute(
+                db.update(ProductSize)
+                .where(
+                    ProductSize.product_id == product_id,
+                    ProductSize.size == size,
+                    ProductSize.stock.isnot(None)
+                )
+                .values(stock=ProductSize.stock + quantity)
+                .execution_options(synchronize_session=False)
+            )
+        current_app.logger.info(f"Released stock reserved by order {order.id}")
+        return True
+
+    @staticmethod
+    def reservation_deadline(payment_method):
+        """Hạn thanh toán của đơn VNPay, None với COD (giữ hàng đến khi giao hoặc hủy)"""
+        if payment_method != 'vnpay':
+            return None
+        return datetime.utcnow() + timedelta(seconds=current_app.config.get('STOCK_RESERVATION_TIMEOUT', 900))
+
+    @staticmethod
+    def expire_reservations(limit=100):
+        """
+        Hủy các đơn VNPay quá hạn thanh toán và hoàn kho
+
+        Các đơn được khóa (SELECT ... FOR UPDATE) đến khi commit; đơn đang được
+        xử lý kết quả thanh toán (cũng khóa dòng đơn hàng) bị bỏ qua và xét lại
+        ở lần quét sau, nên một đơn vừa thanh toán không bị hủy và hoàn kho.
+
+        Returns:
+            list: ID các đơn hàng đã hủy
+        """
+        now = datetime.utcnow()
+        orders = Order.query.filter(
+            Order.stock_reserved.is_(True),
+            Order.reserved_until < now,
+            Order.payment_status == PaymentStatus.PENDING.value
+        ).order_by(Order.id).limit(limit).with_for_update(skip_locked=True).all()
+        expired = []
+        try:
+            for order in orders:
+                if not InventoryService.release(order, expired_before=now):
+                    continue
+                old_status = order.status
+                order.status = OrderStatus.CANCELLED.value
+                order.reservation_expired = True
+                order.updated_at = now
+                StatsService.order_changed(order, old_status, order.payment_status)
+                expired.append(order.id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if expired:
+            current_app.logger.info(f"Cancelled unpaid orders after reservation timeout: {expired}")
+        return expired
+
+    @staticmethod
+    def maybe_expire_reservations():
+        """expire_reservations() tối đa mỗi STOCK_RESERVATION_SWEEP_INTERVAL giây trong mỗi worker"""
+        global _last_sweep
+        interval = current_app.config.get('STOCK_RESERVATION_SWEEP_INTERVAL', 60)
+        with _sweep_lock:
+            if time.monotonic() - _last_sweep < interval:
+                return
+            _last_sweep = time.monotonic()
+        try:
+            InventoryService.expire_reservations()
+        except Exception as e:
+            current_app.logger.error(f"Error releasing expired stock reservations: {str(e)}")
@@ -1,9 +1,13 @@
 from app.models.order import Order, OrderItem, OrderStatus
-from app.models.cart import CartItem
+from app.models.cart import Cart, CartItem
+from app.models.product import Product
 from app import db
 from datetime import datetime
 from flask import current_app
 import traceback  # Import module traceback
+from app.utils.serialization import ORDER_DETAIL
+from app.services.stats_service import StatsService
+from app.services.inventory_service import InventoryService, InsufficientStock
 
 class OrderService:
     @staticmethod
@@ -14,7 +18,7 @@ class OrderService:
         
         Args:
             user_id (int): ID người dùng
-            cart_items (list): Danh sách sản phẩm trong giỏ hàng
+            cart_items (list): Danh sách CartItem được đặt (các dòng này bị xóa khỏi giỏ hàng)
             shipping_address (str): Địa chỉ giao hàng
             shipping_city (str): Thành phố giao hàng
             shipping_phone (str): Số điện thoại giao hàng
@@ -29,9 +33,20 @@ class OrderService:
             valid_payment_methods = ['cod', 'vnpay']
             if payment_method not in valid_payment_methods:
                 raise ValueError(f"Phương thức thanh toán không hợp lệ. Chỉ hỗ trợ: {', '.join(valid_payment_methods)}")
+            
+            # Giá hiện tại của mọi sản phẩm trong giỏ: một query IN thay vì lazy load từng cart_item.product
+            product_ids = {cart_item.product_id for cart_item in cart_items}
+            rows = db.session.execute(
+                db.select(Product.id, Product.price, Product.name).where(Product.id.in_(product_ids))
+            ).all() if product_ids else []
+            prices = {product_id: price for product_id, price, _ in rows}
+            names = {product_id: name for product_id, _, name in rows}
+            
+            # Bỏ qua các sản phẩm đã bị xóa
+            cart_items = [cart_item for cart_item in cart_items if cart_item.product_id in prices]
                 
             # Tính tổng tiền
-            total_amount = sum(item.product.price * item.quantity for item in cart_items if item.product)
+            total_amount = sum(prices[item.product_id] * item.quantity for item in cart_items)
             
             if total_amount <= 0:
                 raise ValueError("Tổng giá trị đơn hàng phải lớn hơn 0")
@@ -43,6 +58,13 @@ class OrderService:
             if payment_method == 'cod':
                 payment_status = "pending"  # Vẫn giữ trạng thái chờ thanh toán cho COD
             
+            # Giữ hàng: trừ tồn kho có điều kiện trước khi tạo đơn (rollback nếu thiếu hàng)
+            try:
+                InventoryService.reserve([(item.product_id, item.size, item.quantity) for item in cart_items])
+            except InsufficientStock as e:
+                label = f"'{names[e.product_id]}'" + (f" (size {e.size})" if e.size else "")
+                raise ValueError(f"Sản phẩm {label} không đủ số lượng trong kho")
+            
             # Tạo đơn hàng
             order = Order(
                 user_id=user_id,
@@ -53,39 +75,35 @@ class OrderService:
                 shipping_phone=shipping_phone,
                 payment_method=payment_method,
                 payment_status=payment_status,
-                notes=notes
+                notes=notes,
+                stock_reserved=True,
+                reserved_until=InventoryService.reservation_deadline(payment_method)
             )
             
             db.session.add(order)
             db.session.flush()  # Để lấy ID của order
-            
-            # Lưu danh sách ID sản phẩm đã thêm vào đơn hàng để chỉ xóa các sản phẩm này khỏi giỏ hàng
-            order_item_ids = []
-            
-            # Thêm các sản phẩm vào đơn hàng
-            for cart_item in cart_items:
-                if not cart_item.product:
-                    continue
-                    
-                order_item = OrderItem(
-                    order_id=order.id,
-                    product_id=cart_item.product_id,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
-                db.session.add(order_item)
-                
-                # Lưu ID của cart_item để xóa sau
-                order_item_ids.append(cart_item.id)
-            
-            # Xóa chỉ những sản phẩm đã thêm vào đơn hàng khỏi giỏ hàng
-            # Ghi log trước khi xóa để debug
-            current_app.logger.info(f"Removing selected cart items: {order_item_ids}")
-            
-            # Xóa từng sản phẩm đã chọn khỏi giỏ hàng
-            for cart_item in cart_items:
-                if cart_item.id in order_item_ids:
-                    db.session.delete(cart_item)
+            StatsService.order_created(order)
+            
+            # Thêm các sản phẩm vào đơn hàng bằng một câu INSERT (executemany)
+            db.session.execute(db.insert(OrderItem), [
+                {
+                    'order_id': order.id,
+                    'product_id': cart_item.product_id,
+                    'quantity': cart_item.quantity,
+                    'size': cart_item.size,
+                    'price': prices[cart_item.product_id]
+                }
+                for cart_item in cart_items
+            ])
+            
+            # Xóa chỉ những sản phẩm đã thêm vào đơn hàng khỏi giỏ hàng, một câu DELETE ... WHERE id IN
+            cart_item_ids = [cart_item.id for cart_item in cart_items]
+            current_app.logger.info(f"Removing selected cart items: {cart_item_ids}")
+            db.session.execute(
+                db.delete(CartItem).where(CartItem.id.in_(cart_item_ids))
+                .execution_options(synchronize_session=False)
+            )
+            Cart.recalculate({cart_item.cart_id for cart_item in cart_items})
             
             db.session.commit()
             return order
@@ -139,8 +157,14 @@ class OrderService:
             current_app.logger.info(f"Updating order {order_id} status: {order.status} -> {status}")
             
             # Cập nhật trạng thái
+            old_status = order.status
             order.status = status
             order.updated_at = datetime.utcnow()
+            StatsService.order_changed(order, old_status, order.payment_status)
+            
+            # Hủy đơn: hoàn lại tồn kho đã giữ
+            if status == OrderStatus.CANCELLED.value:
+                InventoryService.release(order)
             
             db.session.commit()
             current_app.logger.info(f"Successfully updated order {order_id} status to {status}")
@@ -180,7 +204,7 @@ class OrderService:
                 order_id = int(order_id)
             
             current_app.logger.info(f"Looking up order with ID: {order_id}")
-            order = Order.query.get(order_id)
+            order = ORDER_DETAIL.apply(Order.query).get(order_id)
             
             if not order:
                 current_app.logger.warning(f"Order not found with ID: {order_id}")
@@ -202,4 +226,4 @@ class OrderService:
     @staticmethod
     def get_user_orders(user_id):
         """Lấy danh sách đơn hàng của người dùng"""
-        return Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
\ No newline at end of file
+        return ORDER_DETAIL.apply(Order.query).filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
\ No newline at end of file
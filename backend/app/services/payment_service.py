@@ -1,7 +1,9 @@
 from flask import current_app
-from app.models.order import Order, PaymentStatus
+from app.models.order import Order, OrderStatus, PaymentStatus
 from app.utils.security import create_vnpay_payment, validate_vnpay_response
 from app import db
+from app.services.stats_service import StatsService
+from app.services.inventory_service import InventoryService, InsufficientStock
 
 class PaymentService:
     @staticmethod
@@ -24,6 +26,9 @@ class PaymentService:
             if order.payment_status == 'paid':
                 raise ValueError("Đơn hàng này đã được thanh toán")
             
+            if order.status == 'cancelled':
+                raise ValueError("Đơn hàng đã bị hủy hoặc đã hết hạn thanh toán")
+            
             # Kiểm tra cấu hình VNPay
             if not current_app.config.get('VNPAY_TMN_CODE'):
                 current_app.logger.error("VNPay TMN Code is not configured")
@@ -77,30 +82,58 @@ class PaymentService:
             # Ghi log bắt đầu xử lý
             current_app.logger.info(f"Processing payment result for order {order_id}, success={is_success}, transaction_id={transaction_id}")
             
-            # Tìm đơn hàng
-            order = Order.query.get(order_id)
+            # Tìm và khóa đơn hàng đến khi commit: lượt quét đơn quá hạn
+            # (InventoryService.expire_reservations) không hủy được đơn đang xử lý thanh toán
+            order = Order.query.filter_by(id=order_id).with_for_update().populate_existing().first()
             
             if not order:
                 current_app.logger.error(f"Order {order_id} not found when processing payment result")
                 raise ValueError(f"Không tìm thấy đơn hàng với ID {order_id}")
             
+            old_status, old_payment_status = order.status, order.payment_status
+            
             # Cập nhật trạng thái thanh toán
             if is_success:
                 order.payment_status = PaymentStatus.PAID.value
                 order.transaction_id = transaction_id
                 current_app.logger.info(f"Order {order_id} payment status updated to PAID")
+                
+                if order.stock_reserved:
+                    # Đã thanh toán: giữ hàng không còn hạn
+                    order.reserved_until = None
+                elif order.status == OrderStatus.CANCELLED.value and not order.reservation_expired:
+                    # Khách hoặc admin đã hủy đơn: không mở lại
+                    current_app.logger.error(
+                        f"Order {order_id} was paid after it was cancelled: refund required"
+                    )
+                else:
+                    # Thanh toán về sau khi đơn đã hết hạn giữ hàng: giữ hàng lại nếu còn đủ
+                    try:
+                        with db.session.begin_nested():
+                            InventoryService.reserve([(item.product_id, item.size, item.quantity) for item in order.items])
+                        order.stock_reserved = True
+                        order.reserved_until = None
+                        if order.status == OrderStatus.CANCELLED.value:
+                            order.status = OrderStatus.PENDING.value
+                            order.reservation_expired = False
+                    except InsufficientStock as e:
+                        current_app.logger.error(
+                            f"Order {order_id} was paid after its reservation expired and product "
+                            f"{e.product_id} is out of stock: refund required"
+                        )
             else:
                 # Thanh toán thất bại, cập nhật trạng thái thanh toán thành FAILED
                 order.payment_status = PaymentStatus.FAILED.value
                 
                 # Chỉ cập nhật trạng thái đơn hàng thành CANCELLED nếu phương thức là VNPay
                 if order.payment_method == 'vnpay':
-                    from app.models.order import OrderStatus
                     order.status = OrderStatus.CANCELLED.value
+                    InventoryService.release(order)
                     current_app.logger.info(f"Order {order_id} has been cancelled due to failed payment")
                 
                 current_app.logger.info(f"Order {order_id} payment status updated to FAILED")
             
+            StatsService.order_changed(order, old_status, old_payment_status)
             db.session.commit()
             current_app.logger.info(f"Successfully processed payment result for order {order_id}")
             
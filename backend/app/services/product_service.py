@@ -1,10 +1,26 @@
 from app.models.product import Product
-from app.models.category import Category
+from app.models.cart import Cart
+from app.models.category import Category, CategoryClosure
+from app.models.catalog_change import CatalogChange
 from app import db
+from app.search import get_search_backend
+from app.services.image_service import ImageService
+from app.utils.cache import CATEGORY_TREE_CACHE, bump_version
+from app.utils.pagination import SortKey
 import os
 from werkzeug.utils import secure_filename
 import uuid
 from flask import current_app
+from sqlalchemy import case, false
+
+# Khóa sắp xếp cho phân trang theo cursor, khớp với các chỉ mục (cột, id) của bảng products
+PRODUCT_SORT_KEYS = {
+    'newest': SortKey(Product.created_at, Product.id, descending=True),
+    'price_asc': SortKey(Product.price, Product.id),
+    'price_desc': SortKey(Product.price, Product.id, descending=True),
+    'name_asc': SortKey(Product.name, Product.id),
+    'name_desc': SortKey(Product.name, Product.id, descending=True)
+}
 
 class ProductService:
     @staticmethod
@@ -19,7 +35,7 @@ class ProductService:
             category_id (int, optional): ID danh mục
             featured (bool, optional): Sản phẩm nổi bật
             search (str, optional): Từ khóa tìm kiếm
-            sort (str, optional): Cách sắp xếp (newest, price_asc, price_desc, name_asc, name_desc)
+            sort (str, optional): Cách sắp xếp (relevance, newest, price_asc, price_desc, name_asc, name_desc)
         
         Returns:
             tuple: (items, total, pages, page)
@@ -29,15 +45,14 @@ class ProductService:
         
         # Apply filters
         if category_id:
-            query = query.filter_by(category_id=category_id)
+            # Bao gồm sản phẩm của mọi danh mục con
+            query = query.filter(Product.category_id.in_(CategoryClosure.subtree_ids(category_id)))
             
         if featured is not None:
             query = query.filter_by(featured=featured)
             
         if search:
-            search_term = f"%{search}%"
-            query = query.filter(Product.name.ilike(search_term) | 
-                                Product.description.ilike(search_term))
+            query = ProductService.apply_search(query, search, order_by_relevance=(sort == 'relevance'))
         
         # Apply sorting
         if sort == 'newest':
@@ -56,9 +71,46 @@ class ProductService:
         
         return paginated.items, paginated.total, paginated.pages, paginated.page
     
+    @staticmethod
+    def search_ranks(search):
+        """
+        Thứ hạng của các sản phẩm khớp từ khóa trong chỉ mục tìm kiếm full-text
+        
+        Returns:
+            dict: {product_id: rank}, 0 là khớp nhất (tối đa SEARCH_MAX_RESULTS sản phẩm)
+        """
+        limit = current_app.config.get('SEARCH_MAX_RESULTS', 1000)
+        hits = get_search_backend().search(search, limit=limit)
+        return {product_id: rank for rank, (product_id, _) in enumerate(hits)}
+    
+    @staticmethod
+    def apply_search(query, search, order_by_relevance=False, ranks=None):
+        """
+        Lọc sản phẩm theo chỉ mục tìm kiếm full-text
+        
+        Args:
+            query (Query): Query sản phẩm cần lọc
+            search (str): Từ khóa tìm kiếm (có dấu hoặc không dấu)
+            order_by_relevance (bool): Sắp xếp theo điểm BM25 giảm dần
+            ranks (dict, optional): Kết quả search_ranks(search) nếu đã có
+            
+        Returns:
+            Query: Query đã lọc theo các sản phẩm khớp
+        """
+        if ranks is None:
+            ranks = ProductService.search_ranks(search)
+        
+        if not ranks:
+            return query.filter(false())
+        
+        query = query.filter(Product.id.in_(list(ranks)))
+        if order_by_relevance:
+            query = query.order_by(case(ranks, value=Product.id))
+        return query
+    
     @staticmethod
     def create_product(name, price, category_id, description=None, discount_price=None,
-                    stock=0, featured=False, image_file=None):
+                    stock=0, featured=False, image_file=None, sizes=None):
         """
         Tạo sản phẩm mới
         
@@ -71,12 +123,24 @@ class ProductService:
             stock (int, optional): Số lượng tồn kho
             featured (bool, optional): Sản phẩm nổi bật
             image_file (FileStorage, optional): File ảnh
+            sizes (list|dict|str, optional): Size và tồn kho theo size (xem Product.parse_sizes)
             
         Returns:
             Product: Sản phẩm đã tạo
         """
+        product = Product(
+            name=name,
+            description=description,
+            price=price,
+            discount_price=discount_price,
+            stock=stock,
+            category_id=category_id,
+            featured=featured
+        )
+        # Size không hợp lệ bị từ chối trước khi lưu ảnh
+        product.set_sizes(sizes)
+        
         # Xử lý ảnh nếu có
-        image_url = None
         if image_file and image_file.filename:
             from flask import current_app
             
@@ -87,22 +151,20 @@ class ProductService:
             # Lưu file ảnh
             filename = ProductService.save_image(image_file)
             if filename:
-                image_url = f"uploads/{filename}"
-        
-        # Tạo sản phẩm mới
-        product = Product(
-            name=name,
-            description=description,
-            price=price,
-            discount_price=discount_price,
-            stock=stock,
-            category_id=category_id,
-            image_url=image_url,
-            featured=featured
-        )
+                product.image_url = f"uploads/{filename}"
         
         db.session.add(product)
+        # Số sản phẩm của danh mục thay đổi
+        bump_version(CATEGORY_TREE_CACHE)
+        db.session.flush()
+        # Chỉ mục sản phẩm của chatbot đọc hàng đợi thay đổi
+        CatalogChange.record(product.id)
         db.session.commit()
+        if product.image_url:
+            ImageService.attach_variants(product)
+        
+        # Cập nhật chỉ mục tìm kiếm
+        get_search_backend().index_product(product)
         
         return product
     
@@ -118,35 +180,22 @@ class ProductService:
         """
         Lưu file ảnh vào thư mục uploads
         
+        Tên file là hash nội dung (ảnh trùng chỉ lưu một lần); các biến thể
+        responsive được sinh trên worker nền, xem ImageService.
+        
         Args:
             image_file (FileStorage): File ảnh cần lưu
             
         Returns:
             str: Tên file đã lưu
+            
+        Raises:
+            ValueError: Nếu file không phải ảnh hợp lệ
         """
-        from flask import current_app
-        import os
-        from werkzeug.utils import secure_filename
-        import uuid
-        
         try:
-            # Tạo tên file an toàn
-            filename = secure_filename(image_file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            
-            # Đường dẫn đầy đủ đến file
-            upload_folder = current_app.config['UPLOAD_FOLDER']
-            file_path = os.path.join(upload_folder, unique_filename)
-            
-            # Lưu file
-            image_file.save(file_path)
-            
-            # Kiểm tra file đã được lưu thành công
-            if os.path.exists(file_path):
-                return unique_filename
-            else:
-                current_app.logger.error(f"Failed to save image: {file_path}")
-                return None
+            return ImageService.save_upload(image_file)
+        except ValueError:
+            raise
         except Exception as e:
             current_app.logger.error(f"Error saving image: {str(e)}")
             return None
@@ -170,14 +219,15 @@ class ProductService:
             product.price = data['price']
         if 'discount_price' in data:
             product.discount_price = data['discount_price']
-        if 'stock' in data:
-            product.stock = data['stock']
-        if 'category_id' in data:
+        if 'category_id' in data and data['category_id'] != product.category_id:
             product.category_id = data['category_id']
+            bump_version(CATEGORY_TREE_CACHE)
         if 'featured' in data:
             product.featured = data['featured']
+        ProductService.update_stock(product, data)
         
         # Xử lý ảnh nếu có
+        replaced_image_url = None
         if image_file and image_file.filename:
             from flask import current_app
             
@@ -185,46 +235,58 @@ class ProductService:
             if not ProductService.allowed_file(image_file.filename):
                 raise Exception(f"Loại file không hợp lệ: {image_file.filename}")
             
-            # Xóa ảnh cũ nếu có
-            if product.image_url:
-                ProductService.delete_image(product.image_url)
-            
-            # Lưu ảnh mới
+            # Lưu ảnh mới; ảnh cũ chỉ bị xóa sau khi commit thành công (bên dưới)
             filename = ProductService.save_image(image_file)
             if filename:
+                old_image_url = product.image_url
                 product.image_url = f"uploads/{filename}"
+                if old_image_url and old_image_url != product.image_url:
+                    replaced_image_url = old_image_url
+        
+        # Giá đổi: tính lại tổng của các giỏ hàng có sản phẩm này
+        if 'price' in data:
+            Cart.recalculate_for_product(product.id)
         
+        CatalogChange.record(product.id)
         db.session.commit()
+        if image_file and image_file.filename:
+            ImageService.attach_variants(product)
+        
+        # Xóa ảnh cũ nếu không sản phẩm nào khác dùng
+        if replaced_image_url:
+            ProductService.delete_image(replaced_image_url, exclude_product_id=product.id)
+        
+        # Cập nhật chỉ mục tìm kiếm
+        get_search_backend().index_product(product)
         return product
     
     @staticmethod
-    def delete_image(image_url):
+    def update_stock(product, data):
+        """
+        Ghi sizes rồi stock từ dữ liệu cập nhật sản phẩm
+        
+        sizes được ghi trước để stock được so với tổng tồn kho của các size mới
+        (xem Product.set_stock); dữ liệu không hợp lệ gây ValueError.
+        """
+        if 'sizes' in data:
+            product.set_sizes(data['sizes'])
+        if 'stock' in data:
+            product.set_stock(data['stock'])
+    
+    @staticmethod
+    def delete_image(image_url, exclude_product_id=None):
         """
-        Xóa file ảnh
+        Xóa file ảnh và các biến thể nếu không còn sản phẩm nào khác dùng
         
         Args:
             image_url (str): URL ảnh cần xóa
+            exclude_product_id (int, optional): ID sản phẩm đang bỏ ảnh này
         """
-        from flask import current_app
-        import os
-        
         if not image_url:
             return
         
         try:
-            # Lấy tên file từ URL
-            if image_url.startswith('uploads/'):
-                filename = image_url.replace('uploads/', '')
-            else:
-                filename = os.path.basename(image_url)
-            
-            # Đường dẫn đầy đủ đến file
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            
-            # Xóa file nếu tồn tại
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                current_app.logger.info(f"Deleted image: {file_path}")
+            ImageService.delete_image(image_url, exclude_product_id)
         except Exception as e:
             current_app.logger.error(f"Error deleting image: {str(e)}")
     
@@ -232,11 +294,17 @@ class ProductService:
     def delete_product(product_id):
         """Xóa sản phẩm"""
         product = Product.query.get_or_404(product_id)
-        
-        # Xóa ảnh nếu có
-        if product.image_url:
-            ProductService.delete_image(product.image_url)
+        image_url = product.image_url
         
         db.session.delete(product)
+        bump_version(CATEGORY_TREE_CACHE)
+        CatalogChange.record(product_id, CatalogChange.DELETE)
         db.session.commit()
+        
+        # Xóa ảnh sau khi commit thành công, để sản phẩm không trỏ tới file đã mất nếu commit lỗi
+        if image_url:
+            ProductService.delete_image(image_url, exclude_product_id=product_id)
+        
+        # Xóa sản phẩm khỏi chỉ mục tìm kiếm
+        get_search_backend().remove_product(product_id)
         return True
\ No newline at end of file
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models.category import Category
+from app.models.order import Order, OrderStatus, PaymentStatus
+from app.models.order_stats import OrderStatsDaily
+from app.models.product import Product
+from app.models.user import User
+from app.utils.serialization import ORDER_SUMMARY
+
+
+def _is_revenue(status, payment_status):
+    """Doanh thu: đơn đã giao, hoặc đã thanh toán nhưng chưa giao và chưa hủy"""
+    if status == OrderStatus.DELIVERED.value:
+        return True
+    return payment_status == PaymentStatus.PAID.value and status != OrderStatus.CANCELLED.value
+
+
+class StatsService:
+    @staticmethod
+    def rollup_enabled():
+        return current_app.config.get('ORDER_STATS_ROLLUP', True)
+
+    @staticmethod
+    def order_created(order):
+        """Ghi nhận đơn hàng mới vào bảng thống kê (gọi sau flush, trước commit)"""
+        if StatsService.rollup_enabled():
+            OrderStatsDaily.record_order(order)
+
+    @staticmethod
+    def order_changed(order, old_status, old_payment_status):
+        """Chuyển đơn hàng sang bucket mới khi trạng thái thay đổi (trước commit)"""
+        if StatsService.rollup_enabled():
+            OrderStatsDaily.move_order(order, old_status, old_payment_status)
+
+    @staticmethod
+    def _order_breakdown():
+        """
+        Số đơn và tổng tiền theo (status, payment_status) trong một truy vấn GROUP BY
+
+        Returns:
+            list: [(status, payment_status, order_count, total_amount)]
+        """
+        if StatsService.rollup_enabled():
+            query = db.session.query(
+                OrderStatsDaily.status, OrderStatsDaily.payment_status,
+                db.func.sum(OrderStatsDaily.order_count), db.func.sum(OrderStatsDaily.total_amount)
+            ).group_by(OrderStatsDaily.status, OrderStatsDaily.payment_status)
+        else:
+            query = db.session.query(
+                Order.status, Order.payment_status,
+                db.func.count(Order.id), db.func.sum(Order.total_amount)
+            ).group_by(Order.status, Order.payment_status)
+        return [(status, payment_status, int(count or 0), float(amount or 0))
+                for status, payment_status, count, amount in query.all()]
+
+    @staticmethod
+    def get_dashboard_stats(recent_limit=10):
+        """
+        Dữ liệu bảng điều khiển admin
+
+        Gồm 3 truy vấn: số sản phẩm/danh mục/người dùng (scalar subquery),
+        phân bố đơn hàng theo trạng thái (GROUP BY) và các đơn gần đây (JOIN users).
+        """
+        count_of = lambda column: db.select(db.func.count(column)).scalar_subquery()
+        total_products, total_categories, total_users = db.session.query(
+            count_of(Product.id), count_of(Category.id), count_of(User.id)
+        ).one()
+
+        orders_by_status = {status.value: 0 for status in OrderStatus}
+        orders_by_payment_status = {status.value: 0 for status in PaymentStatus}
+        total_orders = 0
+        revenue = 0
+        for status, payment_status, count, amount in StatsService._order_breakdown():
+            if not count:
+                continue
+            total_orders += count
+            orders_by_status[status] = orders_by_status.get(status, 0) + count
+            orders_by_payment_status[payment_status] = orders_by_payment_status.get(payment_status, 0) + count
+            if _is_revenue(status, payment_status):
+                revenue += amount
+
+        recent_orders = ORDER_SUMMARY.apply(Order.query).order_by(
+            Order.created_at.desc(), Order.id.desc()
+        ).limit(recent_limit).all()
+        recent_orders_data = [{
+            'id': order.id,
+            'user_id': order.user_id,
+            'customer_name': order.user.name if order.user else '',
+            'customer_phone': order.user.phone if order.user else '',
+            'status': order.status,
+            'total_amount': order.total_amount,
+            'created_at': order.created_at.isoformat() if order.created_at else None
+        } for order in recent_orders]
+
+        return {
+            'total_products': total_products,
+            'total_categories': total_categories,
+            'total_orders': total_orders,
+            'total_users': total_users,
+            'orders_by_status': orders_by_status,
+            'orders_by_payment_status': orders_by_payment_status,
+            'revenue': revenue,
+            'recent_orders': recent_orders_data
+        }
+
+    @staticmethod
+    def get_daily_series(days=30):
+        """
+        Số đơn và doanh thu theo ngày (UTC) trong `days` ngày gần nhất
+
+        Returns:
+            list: [{'date', 'orders', 'revenue', 'orders_by_status'}], kể cả những ngày không có đơn
+        """
+        end = datetime.utcnow().date()
+        start = end - timedelta(days=days - 1)
+
+        if StatsService.rollup_enabled():
+            rows = db.session.query(
+                OrderStatsDaily.day, OrderStatsDaily.status, OrderStatsDaily.payment_status,
+                OrderStatsDaily.order_count, OrderStatsDaily.total_amount
+            ).filter(OrderStatsDaily.day >= start).all()
+        else:
+            order_day = db.func.date(Order.created_at)
+            rows = db.session.query(
+                order_day, Order.status, Order.payment_status,
+                db.func.count(Order.id), db.func.sum(Order.total_amount)
+            ).filter(
+                Order.created_at >= datetime.combine(start, datetime.min.time())
+            ).group_by(order_day, Order.status, Order.payment_status).all()
+
+        series = {}
+        for offset in range(days):
+            day = (start + timedelta(days=offset)).isoformat()
+            series[day] = {'date': day, 'orders': 0, 'revenue': 0, 'orders_by_status': {}}
+
+        for day, status, payment_status, count, amount in rows:
+            point = series.get(str(day)[:10])
+            if point is None or not count:
+                continue
+            point['orders'] += int(count)
+            point['orders_by_status'][status] = point['orders_by_status'].get(status, 0) + int(count)
+            if _is_revenue(status, payment_status):
+                point['revenue'] += float(amount or 0)
+
+        return list(series.values())
@@ -0,0 +1,123 @@
+"""
+Bounded thread pool for bcrypt
+
+bcrypt releases the GIL while hashing, so running it on a few dedicated
+threads lets the other request threads of a worker keep serving while a
+burst of logins is hashed. The pool caps how many hashes run at once
+(normally one per core) and how many may wait; beyond that new requests are
+rejected instead of piling up behind each other.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the bcrypt queue is full"""
+
+
+class BcryptPool:
+    """ThreadPoolExecutor with a bounded queue and queue-depth metrics"""
+
+    def __init__(self, workers, max_queued, queue_timeout=0):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queued)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def run(self, fn, *args):
+        """
+        Run fn(*args) on the pool and wait for the result
+
+        Raises:
+            PasswordHasherBusy: If the queue stays full for queue_timeout seconds
+        """
+        if self.queue_timeout:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._rejected += 1
+            raise PasswordHasherBusy('Password hashing queue is full')
+
+        submitted = time.monotonic()
+        with self._lock:
+            self._pending += 1
+            self._peak_queued = max(self._peak_queued, self._pending - self._running)
+
+        def task():
+            started = time.monotonic()
+            with self._lock:
+                self._running += 1
+                self._wait_seconds += started - submitted
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._run_seconds += time.monotonic() - started
+
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            completed = self._completed
+            return {
+                'workers': self.workers,
+                'max_queued': self.max_queued,
+                'running': self._running,
+                'queued': self._pending - self._running,
+                'peak_queued': self._peak_queued,
+                'completed': completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': round(self._wait_seconds * 1000 / completed, 2) if completed else 0,
+                'avg_run_ms': round(self._run_seconds * 1000 / completed, 2) if completed else 0
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_bcrypt_pool():
+    """
+    Pool dùng chung trong process, được tạo ở lần dùng đầu tiên (sau khi gunicorn fork)
+
+    Returns:
+        BcryptPool | None: None nếu BCRYPT_POOL_SIZE = 0 (hash trực tiếp trên luồng request)
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = current_app.config
+                workers = config.get('BCRYPT_POOL_SIZE')
+                if workers is None:
+                    workers = os.cpu_count() or 1
+                if workers <= 0:
+                    return None
+                _pool = BcryptPool(
+                    workers,
+                    config.get('BCRYPT_MAX_QUEUED', 32),
+                    config.get('BCRYPT_QUEUE_TIMEOUT', 2)
+                )
+    return _pool
@@ -0,0 +1,64 @@
+"""
+Process-local caches invalidated through version stamps stored in the database
+"""
+import threading
+
+from flask import current_app, request
+
+from app.models.cache_version import CacheVersion
+
+CATEGORY_TREE_CACHE = 'category_tree'
+
+
+class VersionedCache:
+    """
+    Cache of one computed value per version stamp
+
+    get_or_build() reads the current stamp (one primary-key lookup) and only
+    calls the builder when the stamp has moved since the value was cached.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._version = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get_or_build(self, builder):
+        """
+        Args:
+            builder (callable): Function computing the value when the cache is stale
+
+        Returns:
+            tuple: (value, version)
+        """
+        version = CacheVersion.get(self.name)
+        if self._version == version:
+            return self._value, version
+        with self._lock:
+            if self._version != version:
+                self._value = builder()
+                self._version = version
+            return self._value, version
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._value = None
+
+
+def bump_version(name):
+    """Mark every process-local copy of a cache as stale (commit with the data change)"""
+    CacheVersion.bump(name)
+
+
+def conditional_json_response(body, version, name):
+    """
+    Build a JSON response from an already serialized body with an ETag derived
+    from the cache version; answers 304 Not Modified when If-None-Match matches
+    """
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(f'{name}-{version}')
+    # Trình duyệt luôn kiểm tra lại với server, nhưng chỉ tải lại khi version đổi
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
@@ -0,0 +1,174 @@
+"""
+Phân trang theo keyset (cursor) cho các danh sách lớn
+
+Thay vì OFFSET (phải quét qua mọi dòng của các trang trước) và COUNT(*) cho
+mỗi trang, cursor lưu giá trị khóa sắp xếp của dòng cuối cùng đã trả về; trang
+tiếp theo chỉ cần một truy vấn dùng chỉ mục (sort_column, id).
+"""
+import base64
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import and_, case, literal, or_, text
+
+from app import db
+
+MAX_CURSOR_LIMIT = 100
+
+
+class SortKey:
+    """Khóa sắp xếp (cột, id) dùng cho keyset pagination; id đảm bảo thứ tự duy nhất"""
+
+    def __init__(self, column, id_column, descending=False):
+        self.column = column
+        self.id_column = id_column
+        self.descending = descending
+
+    def order_by(self):
+        if self.descending:
+            return self.column.desc(), self.id_column.desc()
+        return self.column.asc(), self.id_column.asc()
+
+    def after(self, value, row_id):
+        """Điều kiện lấy các dòng đứng sau (value, row_id) theo thứ tự sắp xếp"""
+        if self.descending:
+            return or_(self.column < value, and_(self.column == value, self.id_column < row_id))
+        return or_(self.column > value, and_(self.column == value, self.id_column > row_id))
+
+    def values(self, row):
+        return getattr(row, self.column.key), getattr(row, self.id_column.key)
+
+    def parse_value(self, value):
+        if value is not None and self.column.type.python_type is datetime:
+            return datetime.fromisoformat(value)
+        return value
+
+
+class RankSortKey(SortKey):
+    """
+    Khóa sắp xếp theo thứ hạng tính ngoài database (độ liên quan của chỉ mục tìm kiếm)
+
+    ranks là {id: thứ hạng}, 0 là tốt nhất. Thứ hạng được đưa vào SQL bằng một
+    biểu thức CASE nên mỗi trang vẫn là một truy vấn lọc + sắp xếp, cursor mang
+    (thứ hạng, id). Thứ hạng lấy từ kết quả tìm kiếm của từng request: nếu chỉ
+    mục thay đổi giữa hai trang, một sản phẩm có thể lặp lại hoặc bị bỏ qua.
+    """
+
+    def __init__(self, ranks, id_column):
+        rank = case(ranks, value=id_column, else_=len(ranks)) if ranks else literal(0)
+        super().__init__(rank, id_column)
+        self.ranks = ranks
+
+    def values(self, row):
+        row_id = getattr(row, self.id_column.key)
+        return self.ranks.get(row_id, len(self.ranks)), row_id
+
+    def parse_value(self, value):
+        return int(value)
+
+
+def encode_cursor(sort_name, value, row_id):
+    """Mã hóa vị trí (value, id) thành token mờ an toàn cho URL"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({'s': sort_name, 'v': value, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_name, sort_key):
+    """
+    Giải mã cursor
+
+    Raises:
+        ValueError: Nếu cursor không hợp lệ hoặc được tạo cho cách sắp xếp khác
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload['s'] != sort_name:
+            raise ValueError
+        return sort_key.parse_value(payload['v']), int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Cursor không hợp lệ')
+
+
+def validate_limit(limit):
+    """
+    Kiểm tra số dòng mỗi trang của chế độ cursor
+
+    Raises:
+        ValueError: Nếu limit không nằm trong khoảng 1..MAX_CURSOR_LIMIT
+    """
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_CURSOR_LIMIT:
+        raise ValueError(f'limit phải là số nguyên từ 1 đến {MAX_CURSOR_LIMIT}')
+    return limit
+
+
+def keyset_paginate(query, sort_key, sort_name, cursor=None, limit=20):
+    """
+    Lấy một trang theo keyset
+
+    Args:
+        query (Query): Query đã lọc, chưa sắp xếp
+        sort_key (SortKey): Khóa sắp xếp
+        sort_name (str): Tên cách sắp xếp, được ghi vào cursor để kiểm tra
+        cursor (str, optional): Cursor của trang trước, None cho trang đầu
+        limit (int): Số dòng mỗi trang (1..MAX_CURSOR_LIMIT)
+
+    Returns:
+        tuple: (items, next_cursor) - next_cursor là None ở trang cuối
+
+    Raises:
+        ValueError: Nếu cursor hoặc limit không hợp lệ
+    """
+    validate_limit(limit)
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_name, sort_key)
+        query = query.filter(sort_key.after(value, row_id))
+
+    rows = query.order_by(*sort_key.order_by()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort_name, *sort_key.values(rows[-1]))
+    return rows, next_cursor
+
+
+def count_rows(query, mode):
+    """
+    Đếm tổng số dòng cho chế độ cursor
+
+    Args:
+        mode (str): 'exact' (COUNT(*)), 'estimate' (ước lượng của query planner
+            trên PostgreSQL, các database khác dùng COUNT(*)) hoặc giá trị khác
+            để bỏ qua
+
+    Returns:
+        int | None
+    """
+    if mode == 'estimate' and db.engine.dialect.name == 'postgresql':
+        try:
+            statement = query.order_by(None).statement.compile(
+                dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+            )
+            plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {statement}")).scalar()
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            current_app.logger.warning(f"Cannot estimate row count, falling back to COUNT(*): {str(e)}")
+            mode = 'exact'
+    if mode in ('exact', 'estimate'):
+        return query.order_by(None).count()
+    return None
+
+
+def cursor_page_response(items, next_cursor, limit, total=None):
+    """Dữ liệu trả về chung cho chế độ cursor"""
+    response = {
+        'items': items,
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
+    if total is not None:
+        response['total'] = total
+    return response
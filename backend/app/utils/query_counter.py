@@ -0,0 +1,115 @@
+"""
+Đếm số câu lệnh SQL để phát hiện N+1 query
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, request
+from sqlalchemy import event
+
+from app import db
+
+_local = threading.local()
+_instrumented_engines = set()
+
+
+class QueryCounter:
+    """Danh sách các câu lệnh SQL đã thực thi trong một khối code"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'counters', ()):
+        counter.statements.append(statement)
+
+
+def _instrument(engine):
+    if id(engine) not in _instrumented_engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        _instrumented_engines.add(id(engine))
+
+
+@contextmanager
+def count_queries():
+    """
+    Đếm các câu lệnh SQL thực thi trong luồng hiện tại
+
+    Ví dụ:
+        with count_queries() as counter:
+            client.get('/api/products?limit=50')
+        assert counter.count <= 5
+    """
+    _instrument(db.engine)
+    counter = QueryCounter()
+    counters = _local.__dict__.setdefault('counters', [])
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+
+
+@contextmanager
+def uncounted():
+    """
+    Tạm ngừng đếm câu lệnh SQL trong luồng hiện tại
+
+    Dùng cho việc bảo trì dùng chung giữa các request (dựng lại chỉ mục tìm
+    kiếm, làm mới cache...): chi phí này không thuộc về request tình cờ kích
+    hoạt nó nên không tính vào ngân sách của route.
+    """
+    counters = _local.__dict__.get('counters')
+    _local.counters = []
+    try:
+        yield
+    finally:
+        _local.counters = counters if counters is not None else []
+
+
+@contextmanager
+def assert_query_budget(max_queries):
+    """
+    Như count_queries() nhưng raise AssertionError nếu vượt quá max_queries
+
+    Dùng trong test để khẳng định số query của một endpoint không phụ thuộc
+    vào số bản ghi trả về.
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {counter.count}:\n" +
+            "\n".join(counter.statements)
+        )
+
+
+def query_budget(max_queries):
+    """
+    Decorator khai báo số query tối đa của một route
+
+    Khi vượt ngân sách, ghi log cảnh báo kèm các câu lệnh; nếu cấu hình
+    QUERY_BUDGET_STRICT bật (dùng khi test) thì raise AssertionError.
+    Đặt decorator ngay trên hàm xử lý để không tính các query xác thực.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with count_queries() as counter:
+                result = fn(*args, **kwargs)
+            if counter.count > max_queries:
+                message = (f"{request.method} {request.path} ran {counter.count} queries "
+                           f"(budget {max_queries})")
+                if current_app.config.get('QUERY_BUDGET_STRICT'):
+                    raise AssertionError(message + ":\n" + "\n".join(counter.statements))
+                current_app.logger.warning(message)
+            return result
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
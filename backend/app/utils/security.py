@@ -7,24 +7,104 @@ import hashlib
 import urllib.parse
 import bcrypt
 from functools import wraps
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from app.utils.ttl_cache import TTLCache
+from app.utils.bcrypt_pool import get_bcrypt_pool
+
+# Claims thêm vào access token (xem AuthService.create_tokens)
+ADMIN_CLAIM = 'is_admin'
+TOKEN_VERSION_CLAIM = 'token_version'
+
+# user_id -> (is_admin, token_version), dùng để thu hồi quyền admin của token cũ
+_admin_status_cache = TTLCache(ttl=60, maxsize=1024)
+
+DEFAULT_BCRYPT_LOG_ROUNDS = 12
+
+def _bcrypt_log_rounds():
+    """Cost factor hiện tại (BCRYPT_LOG_ROUNDS), mặc định khi không có app context (seed script)"""
+    try:
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_BCRYPT_LOG_ROUNDS)
+    except RuntimeError:
+        return DEFAULT_BCRYPT_LOG_ROUNDS
+
+def _run_bcrypt(fn, *args):
+    """Chạy bcrypt trên pool giới hạn nếu có app context, ngược lại chạy trực tiếp"""
+    try:
+        pool = get_bcrypt_pool()
+    except RuntimeError:
+        pool = None
+    if pool is None:
+        return fn(*args)
+    return pool.run(fn, *args)
 
 def generate_password_hash(password):
-    """Generate a password hash using bcrypt"""
+    """
+    Generate a password hash using bcrypt
+    
+    Raises:
+        PasswordHasherBusy: If the bcrypt queue is full
+    """
     if isinstance(password, str):
         password = password.encode('utf-8')
-    return bcrypt.hashpw(password, bcrypt.gensalt()).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=_bcrypt_log_rounds())
+    return _run_bcrypt(bcrypt.hashpw, password, salt).decode('utf-8')
 
 def check_password_hash(password_hash, password):
-    """Check if password matches the hash"""
+    """
+    Check if password matches the hash
+    
+    Raises:
+        PasswordHasherBusy: If the bcrypt queue is full
+    """
     if isinstance(password_hash, str):
         password_hash = password_hash.encode('utf-8')
     if isinstance(password, str):
         password = password.encode('utf-8')
-    return bcrypt.checkpw(password, password_hash)
+    return _run_bcrypt(bcrypt.checkpw, password, password_hash)
+
+def password_hash_needs_upgrade(password_hash):
+    """Kiểm tra hash có cost factor thấp hơn BCRYPT_LOG_ROUNDS hiện tại không"""
+    try:
+        # Định dạng: $2b$<cost>$<salt+hash>
+        cost = int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return False
+    return cost < _bcrypt_log_rounds()
+
+def get_admin_status(user_id):
+    """
+    Lấy (is_admin, token_version) của người dùng, cache trong ADMIN_STATUS_CACHE_TTL giây
+    
+    Returns:
+        tuple: (is_admin, token_version), None nếu người dùng không tồn tại
+    """
+    status = _admin_status_cache.get(user_id)
+    if status is not None:
+        return status
+    
+    # Import here to avoid circular imports
+    from app import db
+    from app.models.user import User
+    
+    row = db.session.query(User.is_admin, User.token_version).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    status = (bool(row.is_admin), row.token_version or 0)
+    _admin_status_cache.set(user_id, status, ttl=current_app.config.get('ADMIN_STATUS_CACHE_TTL', 60))
+    return status
+
+def invalidate_admin_status(user_id):
+    """Xóa trạng thái admin đã cache của người dùng trong worker hiện tại"""
+    _admin_status_cache.invalidate(user_id)
 
 def admin_required(fn):
-    """Decorator to require admin role for a route"""
+    """
+    Decorator to require admin role for a route
+    
+    Quyền admin được đọc từ claim của access token. Token bị từ chối nếu claim
+    token_version không còn khớp với người dùng (quyền admin đã bị thay đổi);
+    trạng thái này được cache theo TTL nên không phải truy vấn bảng users ở mỗi request.
+    """
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
@@ -35,19 +115,26 @@ def admin_required(fn):
             if isinstance(user_id, str) and user_id.isdigit():
                 user_id = int(user_id)
             
-            # Import here to avoid circular imports
-            from app.models.user import User
+            claims = get_jwt()
+            if ADMIN_CLAIM in claims and not claims[ADMIN_CLAIM]:
+                return jsonify({"error": "Admin privileges required"}), 403
             
-            user = User.query.get(user_id)
-            if not user:
+            status = get_admin_status(user_id)
+            if status is None:
                 return jsonify({"error": "User not found"}), 404
-                
-            if not user.is_admin:
+            
+            is_admin, token_version = status
+            if not is_admin:
                 return jsonify({"error": "Admin privileges required"}), 403
-                
-            return fn(*args, **kwargs)
+            
+            # Token cấp trước lần thay đổi quyền gần nhất (token cũ không có claim thì bỏ qua)
+            if TOKEN_VERSION_CLAIM in claims and claims[TOKEN_VERSION_CLAIM] != token_version:
+                return jsonify({"error": "Token has been revoked, please log in again"}), 401
         except Exception as e:
             return jsonify({"error": f"Authentication error: {str(e)}"}), 401
+        
+        # Lỗi của chính route (404, ValueError...) do các error handler của app xử lý, không phải lỗi xác thực
+        return fn(*args, **kwargs)
     return wrapper
 
 def generate_token(user_id, expires_delta=None):
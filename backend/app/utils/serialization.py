@@ -0,0 +1,75 @@
+"""
+Load plans for list endpoints
+
+Each plan declares which relationships its to_dict() chain touches and loads
+them eagerly (joinedload for many-to-one, selectinload for collections), so
+serializing a page costs a fixed number of queries whatever the page size.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.models.cart import Cart, CartItem
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+
+
+class LoadPlan:
+    """
+    Eager-loading options plus the serializer they were designed for
+
+    Options are built lazily because backref attributes (Product.category,
+    Order.user, ...) only exist once the mappers are configured.
+    """
+
+    def __init__(self, options, serializer):
+        self._options = options
+        self._serializer = serializer
+
+    def options(self):
+        return self._options()
+
+    def apply(self, query):
+        """Add the eager-loading options to a query"""
+        return query.options(*self._options())
+
+    def serialize(self, rows):
+        return [self._serializer(row) for row in rows]
+
+
+# Product.to_dict -> category, size_rows
+PRODUCT_LIST = LoadPlan(
+    lambda: (joinedload(Product.category), selectinload(Product.size_rows)),
+    lambda product: product.to_dict()
+)
+
+# CartItem.to_dict -> product.to_dict -> category, size_rows
+CART_ITEMS = LoadPlan(
+    lambda: (
+        joinedload(CartItem.product).joinedload(Product.category),
+        joinedload(CartItem.product).selectinload(Product.size_rows)
+    ),
+    lambda item: item.to_dict()
+)
+
+# Cart -> items -> product.to_dict -> category, size_rows, trong cùng một query JOIN
+CART_DETAIL = LoadPlan(
+    lambda: (
+        joinedload(Cart.items).joinedload(CartItem.product).joinedload(Product.category),
+        joinedload(Cart.items).joinedload(CartItem.product).joinedload(Product.size_rows)
+    ),
+    lambda cart: cart.to_dict()
+)
+
+# Order.to_dict -> user, items -> product (không cần size_rows của sản phẩm)
+ORDER_DETAIL = LoadPlan(
+    lambda: (
+        joinedload(Order.user),
+        selectinload(Order.items).joinedload(OrderItem.product).lazyload(Product.size_rows)
+    ),
+    lambda order: order.to_dict(include_items=True)
+)
+
+# Order.to_dict(include_items=False) -> user
+ORDER_SUMMARY = LoadPlan(
+    lambda: (joinedload(Order.user),),
+    lambda order: order.to_dict(include_items=False)
+)
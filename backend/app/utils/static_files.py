@@ -0,0 +1,95 @@
+"""
+Phục vụ file upload/static với cache dài hạn và conditional GET
+
+Tên file upload là hash nội dung hoặc có tiền tố uuid nên không bao giờ bị ghi
+đè: các file này được trả với Cache-Control immutable, trình duyệt và CDN không
+cần hỏi lại server. Range, If-None-Match và If-Modified-Since được xử lý bởi
+werkzeug (206/304). Khi có proxy phía trước, X-Accel-Redirect (nginx) hoặc
+X-Sendfile (Apache/lighttpd) giao việc đẩy byte cho proxy, worker trả về ngay.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from flask import abort, current_app, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+# <hash/uuid 32 ký tự hex>... và các biến thể sinh ra từ chúng
+IMMUTABLE_NAME = re.compile(r'^(?:variants/)?[0-9a-f]{32}')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+def is_immutable(filename):
+    """File có tên duy nhất theo nội dung/uuid, không bao giờ bị ghi đè"""
+    return bool(IMMUTABLE_NAME.match(filename))
+
+
+def send_static(directory, filename, accel_prefix=None, use_x_sendfile=False):
+    """
+    Trả về một file trong directory
+
+    Args:
+        directory (str): Thư mục gốc
+        filename (str): Đường dẫn tương đối (đã được router decode)
+        accel_prefix (str, optional): Location nội bộ của nginx trỏ tới directory;
+            nếu có, trả về X-Accel-Redirect thay vì nội dung file
+        use_x_sendfile (bool): Trả về X-Sendfile thay vì nội dung file
+
+    Returns:
+        Response
+    """
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+
+    immutable = is_immutable(filename)
+    cache_control = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+
+    if accel_prefix:
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(filename)}"
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    # ETag mạnh: tên file là duy nhất với file immutable, ngược lại dựa trên mtime + size
+    if immutable:
+        etag = f"{os.path.basename(filename)}-{stat.st_size:x}"
+    else:
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    response = send_file(
+        path,
+        request.environ,
+        conditional=True,
+        etag=etag,
+        last_modified=stat.st_mtime,
+        use_x_sendfile=use_x_sendfile,
+        response_class=current_app.response_class,
+        _root_path=directory
+    )
+    response.headers['Cache-Control'] = cache_control
+    response.headers.pop('Expires', None)
+    return response
+
+
+def send_upload(filename):
+    """Phục vụ file trong UPLOAD_FOLDER theo cấu hình UPLOADS_ACCEL_REDIRECT / UPLOADS_X_SENDFILE"""
+    config = current_app.config
+    return send_static(
+        config['UPLOAD_FOLDER'],
+        filename,
+        accel_prefix=config.get('UPLOADS_ACCEL_REDIRECT'),
+        use_x_sendfile=config.get('UPLOADS_X_SENDFILE', False)
+    )
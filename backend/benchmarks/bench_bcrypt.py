@@ -0,0 +1,84 @@
+"""
+Microbenchmark: bcrypt logins/sec per core
+
+Đo số lần kiểm tra mật khẩu mỗi giây (mỗi lần đăng nhập = một checkpw) với
+các cost factor khác nhau, chạy trực tiếp trên một luồng và qua BcryptPool với
+nhiều luồng gửi request đồng thời, để chọn BCRYPT_LOG_ROUNDS và BCRYPT_POOL_SIZE.
+
+Chạy từ thư mục backend:
+    python benchmarks/bench_bcrypt.py --rounds 10 12 --duration 3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.bcrypt_pool import BcryptPool, PasswordHasherBusy  # noqa: E402
+
+PASSWORD = b'correct horse battery staple'
+
+
+def bench_direct(password_hash, duration):
+    done = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        bcrypt.checkpw(PASSWORD, password_hash)
+        done += 1
+    return done / duration
+
+
+def bench_pool(password_hash, duration, workers, clients, max_queued):
+    pool = BcryptPool(workers, max_queued)
+    counts = [0] * clients
+    rejected = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        while time.perf_counter() < deadline:
+            try:
+                pool.run(bcrypt.checkpw, PASSWORD, password_hash)
+                counts[index] += 1
+            except PasswordHasherBusy:
+                rejected[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration, sum(rejected), pool.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 12], help='bcrypt cost factors')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per measurement')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='pool threads')
+    parser.add_argument('--clients', type=int, default=None, help='concurrent callers (default 4x workers)')
+    parser.add_argument('--max-queued', type=int, default=32)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    clients = args.clients or args.workers * 4
+    print(f"cores={cores} pool_workers={args.workers} clients={clients}")
+    print(f"{'rounds':>6} {'ms/hash':>8} {'direct/s':>9} {'pool/s':>8} {'pool/s/core':>11} "
+          f"{'peak_q':>6} {'wait_ms':>8} {'rejected':>8}")
+
+    for rounds in args.rounds:
+        password_hash = bcrypt.hashpw(PASSWORD, bcrypt.gensalt(rounds=rounds))
+        direct = bench_direct(password_hash, args.duration)
+        pooled, rejected, stats = bench_pool(
+            password_hash, args.duration, args.workers, clients, args.max_queued
+        )
+        print(f"{rounds:>6} {1000 / direct:>8.1f} {direct:>9.1f} {pooled:>8.1f} "
+              f"{pooled / min(args.workers, cores):>11.1f} {stats['peak_queued']:>6} "
+              f"{stats['avg_wait_ms']:>8.1f} {rejected:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: thời gian đến token đầu tiên (TTFT) và tổng thời gian của chatbot
+
+So sánh /api/chatbot/ask (chờ toàn bộ câu trả lời) với /api/chatbot/ask/stream
+(SSE) dưới nhiều request đồng thời. Chạy offline với LLM stub:
+
+    CHATBOT_LLM_BACKEND=stub CHATBOT_ANSWER_CACHE=false gunicorn -c gunicorn.conf.py run:app
+    GUNICORN_WORKER_CLASS=gevent CHATBOT_LLM_BACKEND=stub ... (so sánh worker class)
+
+rồi từ thư mục backend:
+    python benchmarks/bench_chat_stream.py --url http://localhost:5000 --concurrency 32 --requests 256
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+
+QUESTIONS = [
+    'Phí vận chuyển là bao nhiêu?',
+    'Làm thế nào để theo dõi đơn hàng?',
+    'Chính sách đổi trả hàng như thế nào?',
+    'Làm sao để chọn size quần áo phù hợp?',
+]
+
+
+def ask(url, question):
+    """Returns (ttft, total) in seconds; ttft == total for the blocking endpoint"""
+    request = urllib.request.Request(
+        f'{url}/api/chatbot/ask', data=json.dumps({'question': question}).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    total = time.perf_counter() - start
+    return total, total
+
+
+def ask_stream(url, question):
+    request = urllib.request.Request(
+        f'{url}/api/chatbot/ask/stream', data=json.dumps({'question': question}).encode(),
+        headers={'Content-Type': 'application/json', 'Accept': 'text/event-stream'}
+    )
+    start = time.perf_counter()
+    ttft = None
+    with urllib.request.urlopen(request) as response:
+        for line in response:
+            if ttft is None and line.startswith(b'event: token'):
+                ttft = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return ttft if ttft is not None else total, total
+
+
+def run(fn, url, requests_count, concurrency):
+    results = []
+    errors = []
+    lock = threading.Lock()
+    per_thread = max(1, requests_count // concurrency)
+
+    def worker(index):
+        for i in range(per_thread):
+            try:
+                result = fn(url, QUESTIONS[(index + i) % len(QUESTIONS)])
+                with lock:
+                    results.append(result)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return results, errors, elapsed
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--requests', type=int, default=128)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<12} {'ok':>5} {'err':>5} {'req/s':>7} {'ttft_p50':>9} {'ttft_p95':>9} {'total_p50':>10} {'total_p95':>10}")
+    for name, fn in (('ask', ask), ('ask/stream', ask_stream)):
+        results, errors, elapsed = run(fn, args.url, args.requests, args.concurrency)
+        ttfts = [ttft for ttft, _ in results]
+        totals = [total for _, total in results]
+        print(
+            f"{name:<12} {len(results):>5} {len(errors):>5} {len(results) / elapsed:>7.1f} "
+            f"{percentile(ttfts, 0.5):>9.3f} {percentile(ttfts, 0.95):>9.3f} "
+            f"{statistics.median(totals) if totals else float('nan'):>10.3f} {percentile(totals, 0.95):>10.3f}"
+        )
+        if errors:
+            print(f"  first error: {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: thời gian tạo đơn hàng từ giỏ hàng theo số sản phẩm trong giỏ
+
+- legacy: cách cũ, lazy load cart_item.product từng dòng, thêm OrderItem từng
+  cái qua ORM và xóa cart item từng cái
+- bulk: OrderService.create_order_from_cart (giá lấy bằng một query IN, một
+  INSERT executemany cho order_items, một DELETE ... WHERE id IN)
+
+Mỗi lần đo tạo lại giỏ hàng rồi đặt hàng toàn bộ giỏ; in thời gian p50 và số
+câu lệnh SQL của một lần đặt hàng.
+
+Chạy từ thư mục backend (mặc định dùng SQLite tạm, --database-uri để đo trên MySQL/PostgreSQL):
+    python benchmarks/bench_checkout.py --sizes 1 10 50 200 --repeat 20
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('CHATBOT_ENABLED', 'false')
+
+from app import create_app, db  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models.cart import Cart, CartItem  # noqa: E402
+from app.models.order import Order, OrderItem, OrderStatus  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.order_service import OrderService  # noqa: E402
+from app.services.stats_service import StatsService  # noqa: E402
+from app.utils.query_counter import count_queries  # noqa: E402
+
+SHIPPING = {
+    'shipping_address': '1 Đường Lê Lợi, Hà Nội',
+    'shipping_city': 'Hà Nội',
+    'shipping_phone': '0900000000',
+    'payment_method': 'cod',
+}
+
+
+def legacy_checkout(user_id, cart_items, shipping_address, shipping_city, shipping_phone, payment_method):
+    """Cách tạo đơn hàng trước khi có bulk path (để so sánh)"""
+    total_amount = sum(item.product.price * item.quantity for item in cart_items if item.product)
+    order = Order(
+        user_id=user_id, status=OrderStatus.PENDING.value, total_amount=total_amount,
+        shipping_address=shipping_address, shipping_city=shipping_city, shipping_phone=shipping_phone,
+        payment_method=payment_method, payment_status='pending', notes=''
+    )
+    db.session.add(order)
+    db.session.flush()
+    StatsService.order_created(order)
+    order_item_ids = []
+    for cart_item in cart_items:
+        if not cart_item.product:
+            continue
+        db.session.add(OrderItem(
+            order_id=order.id, product_id=cart_item.product_id,
+            quantity=cart_item.quantity, price=cart_item.product.price
+        ))
+        order_item_ids.append(cart_item.id)
+    for cart_item in cart_items:
+        if cart_item.id in order_item_ids:
+            db.session.delete(cart_item)
+    db.session.commit()
+    return order
+
+
+def fill_cart(user_id, cart_id, product_ids):
+    db.session.execute(db.insert(CartItem), [
+        {'user_id': user_id, 'cart_id': cart_id, 'product_id': product_id, 'quantity': 2}
+        for product_id in product_ids
+    ])
+    db.session.commit()
+    db.session.expire_all()
+    return CartItem.query.filter_by(user_id=user_id).all()
+
+
+def measure(checkout, user_id, cart_id, product_ids, repeat):
+    timings = []
+    queries = None
+    for _ in range(repeat):
+        cart_items = fill_cart(user_id, cart_id, product_ids)
+        with count_queries() as counter:
+            started = time.perf_counter()
+            checkout(user_id=user_id, cart_items=cart_items, **SHIPPING)
+            timings.append(time.perf_counter() - started)
+        queries = counter.count
+    return statistics.median(timings), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = args.database_uri or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+        app = create_app(BenchConfig)
+        app.logger.setLevel(logging.WARNING)
+        with app.app_context():
+            user = User(name='Bench', email=f'bench-{time.time_ns()}@example.com', password_hash='-')
+            db.session.add(user)
+            db.session.flush()
+            cart = Cart(user_id=user.id)
+            products = [Product(name=f'Bench product {i}', price=100000 + i, stock=10 ** 6) for i in range(max(args.sizes))]
+            db.session.add(cart)
+            db.session.add_all(products)
+            db.session.commit()
+            user_id, cart_id = user.id, cart.id
+            product_ids = [product.id for product in products]
+
+            print(f"{'items':>6} {'legacy_ms':>10} {'queries':>8} {'bulk_ms':>9} {'queries':>8}")
+            for size in args.sizes:
+                legacy_s, legacy_queries = measure(legacy_checkout, user_id, cart_id, product_ids[:size], args.repeat)
+                bulk_s, bulk_queries = measure(
+                    OrderService.create_order_from_cart, user_id, cart_id, product_ids[:size], args.repeat
+                )
+                print(f"{size:>6} {legacy_s * 1000:>10.2f} {legacy_queries:>8} {bulk_s * 1000:>9.2f} {bulk_queries:>8}")
+
+
+if __name__ == '__main__':
+    main()
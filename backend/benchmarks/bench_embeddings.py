@@ -0,0 +1,156 @@
+"""
+Benchmark + kiểm tra tương đương của các embedding backend (torch, torch-int8, onnx, onnx-int8)
+
+Mỗi backend chạy trong một process riêng (bộ nhớ đo được không lẫn giữa các
+backend) và embed toàn bộ chunk của knowledge base cùng một bộ câu hỏi. Báo cáo:
+- load_s: thời gian tải model (lần đầu với onnx gồm cả export)
+- docs/s: embed_documents theo batch; queries/s: embed_query từng câu
+- rss_mb: bộ nhớ tối đa của process
+- overlap@k: tỉ lệ trùng top-k chunk tìm được so với torch (1.0 = giống hệt)
+
+--check thoát với mã lỗi nếu overlap@k của backend nào thấp hơn --min-overlap.
+
+Chạy từ thư mục backend:
+    python benchmarks/bench_embeddings.py --k 5 --check
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+QUESTIONS = [
+    'Phí vận chuyển là bao nhiêu?',
+    'Làm thế nào để theo dõi đơn hàng?',
+    'Chính sách đổi trả hàng như thế nào?',
+    'Làm sao để chọn size quần áo phù hợp?',
+    'Cửa hàng có bán áo khoác không?',
+    'Thanh toán bằng VNPay được không?',
+    'Bao lâu thì nhận được hàng?',
+    'Quần jeans có những size nào?',
+    'Tôi muốn đổi size áo đã mua',
+    'Có giao hàng ra đảo không?',
+    'Làm sao để hủy đơn hàng?',
+    'Cửa hàng có chương trình khuyến mãi nào?',
+]
+
+CHILD = r"""
+import json, resource, sys, time
+import numpy as np
+from app.chatbot import rag_model
+from app.chatbot.embeddings import create_embeddings
+
+backend, chunks_path, questions_path, output_path = sys.argv[1:5]
+chunks = json.load(open(chunks_path, encoding='utf-8'))
+questions = json.load(open(questions_path, encoding='utf-8'))
+
+started = time.perf_counter()
+embeddings = create_embeddings(backend, rag_model.EMBEDDINGS_MODEL, str(rag_model.EMBEDDINGS_CACHE_DIR))
+embeddings.embed_query('warm-up')
+load_s = time.perf_counter() - started
+
+started = time.perf_counter()
+documents = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+docs_s = time.perf_counter() - started
+
+started = time.perf_counter()
+queries = np.asarray([embeddings.embed_query(q) for q in questions], dtype=np.float32)
+queries_s = time.perf_counter() - started
+
+np.savez(output_path, documents=documents, queries=queries)
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'load_s': load_s,
+    'docs_per_s': len(chunks) / docs_s,
+    'queries_per_s': len(questions) / queries_s,
+    'rss_mb': rss / 1024 if sys.platform != 'darwin' else rss / 1024 / 1024
+}))
+"""
+
+
+def knowledge_base_chunks():
+    from app.chatbot import rag_model
+    from app.chatbot.indexer import KnowledgeBaseIndexer
+
+    indexer = KnowledgeBaseIndexer(
+        rag_model.KNOWLEDGE_BASE_DIR, rag_model.FAISS_INDEX_PATH, None, rag_model.EMBEDDINGS_MODEL,
+        chunk_size=rag_model.CHUNK_SIZE, chunk_overlap=rag_model.CHUNK_OVERLAP
+    )
+    names = sorted(name for name in os.listdir(indexer.knowledge_base_dir) if name.endswith('.txt'))
+    return [chunk for name in names for chunk in indexer._split(name)]
+
+
+def top_k(documents, queries, k):
+    """Chỉ số top-k chunk của từng câu hỏi theo khoảng cách L2 (như IndexFlatL2)"""
+    distances = (
+        (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ documents.T + (documents ** 2).sum(axis=1)[None, :]
+    )
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def run_backend(backend, chunks_path, questions_path, directory):
+    output_path = os.path.join(directory, f'{backend}.npz')
+    env = dict(os.environ, TOKENIZERS_PARALLELISM='false')
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, backend, chunks_path, questions_path, output_path],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    vectors = np.load(output_path)
+    return result, vectors['documents'], vectors['queries']
+
+
+def main():
+    from app.chatbot.embeddings import BACKENDS, TORCH
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='fail if a backend is below --min-overlap')
+    parser.add_argument('--min-overlap', type=float, default=0.9)
+    args = parser.parse_args()
+
+    backends = [TORCH] + [backend for backend in args.backends if backend != TORCH]
+    chunks = knowledge_base_chunks()
+    k = min(args.k, len(chunks))
+    print(f"{len(chunks)} knowledge base chunks, {len(QUESTIONS)} questions, k={k}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        chunks_path = os.path.join(directory, 'chunks.json')
+        questions_path = os.path.join(directory, 'questions.json')
+        with open(chunks_path, 'w', encoding='utf-8') as f:
+            json.dump(chunks, f, ensure_ascii=False)
+        with open(questions_path, 'w', encoding='utf-8') as f:
+            json.dump(QUESTIONS, f, ensure_ascii=False)
+
+        print(f"{'backend':<11} {'load_s':>7} {'docs/s':>8} {'queries/s':>10} {'rss_mb':>7} {'overlap@k':>10}")
+        baseline = None
+        failed = []
+        for backend in backends:
+            result, documents, queries = run_backend(backend, chunks_path, questions_path, directory)
+            ranked = top_k(documents, queries, k)
+            if baseline is None:
+                baseline = ranked
+            overlap = np.mean([
+                len(set(row) & set(base_row)) / k for row, base_row in zip(ranked, baseline)
+            ])
+            if overlap < args.min_overlap:
+                failed.append(backend)
+            print(
+                f"{backend:<11} {result['load_s']:>7.2f} {result['docs_per_s']:>8.1f} "
+                f"{result['queries_per_s']:>10.1f} {result['rss_mb']:>7.0f} {overlap:>10.3f}"
+            )
+
+    if args.check and failed:
+        print(f"top-{k} overlap below {args.min_overlap}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
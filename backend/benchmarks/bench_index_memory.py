@@ -0,0 +1,125 @@
+"""
+Benchmark: bộ nhớ của mỗi worker khi cùng mở một version của index knowledge base
+
+Ghi một index ngẫu nhiên (--chunks vector, --dimension chiều) rồi chạy
+--workers process cùng lúc, mỗi process mở index và tìm kiếm như một gunicorn
+worker. Với mỗi cách mở, in mức tăng bộ nhớ trung bình của một worker sau khi
+mở index (đọc từ /proc/self/smaps_rollup, chỉ có trên Linux):
+- rss_mb: trang đang nằm trong RAM của process (gồm cả trang dùng chung)
+- pss_mb: RSS với trang dùng chung chia đều cho các process đang dùng
+- private_mb: trang chỉ riêng process này có, phần thực sự nhân theo số worker
+
+Các cách mở:
+- mmap: VectorIndex.load(mmap=True), vectors.npy được memory-map read-only
+- copy: VectorIndex.load(mmap=False), mỗi worker một bản sao
+- faiss-mmap: faiss.read_index(IO_FLAG_MMAP) như index.faiss trước đây (chỉ khi có faiss)
+
+Chạy từ thư mục backend:
+    python benchmarks/bench_index_memory.py --workers 4 --chunks 200000 --dimension 384
+"""
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chatbot.indexer import VectorIndex  # noqa: E402
+
+FAISS_FILE = 'index.faiss'
+
+
+def memory_mb():
+    """Rss, Pss và Private_* của process hiện tại (MB)"""
+    values = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss_mb': values['Rss'],
+        'pss_mb': values['Pss'],
+        'private_mb': values['Private_Clean'] + values['Private_Dirty']
+    }
+
+
+def open_index(directory, mode):
+    if mode == 'faiss-mmap':
+        import faiss
+        index = faiss.read_index(os.path.join(directory, FAISS_FILE), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        return lambda queries, k: index.search(queries, k)
+    index = VectorIndex.load(directory, mmap=mode == 'mmap')
+    return index.search_batch
+
+
+def worker(directory, mode, dimension, queries, barrier, results):
+    before = memory_mb()
+    search = open_index(directory, mode)
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(queries):
+        search(rng.random((8, dimension), dtype=np.float32), 4)
+    # Đo khi mọi worker đều đang giữ index (PSS chia trang dùng chung cho các process còn sống)
+    barrier.wait()
+    after = memory_mb()
+    results.put({key: after[key] - before[key] for key in after})
+    barrier.wait()
+
+
+def write_index(directory, chunks, dimension, with_faiss):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((chunks, dimension), dtype=np.float32)
+    ids = list(range(1, chunks + 1))
+    index = VectorIndex.empty(dimension)
+    index.add(ids, vectors, [{'text': f'chunk {i}', 'source': 'random'} for i in ids])
+    index.save(directory)
+    if with_faiss:
+        import faiss
+        faiss_index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+        faiss_index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        faiss.write_index(faiss_index, os.path.join(directory, FAISS_FILE))
+    return vectors.nbytes / 1024 / 1024
+
+
+def run(directory, mode, args):
+    # spawn: worker không thừa hưởng trang nào của process cha
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(directory, mode, args.dimension, args.queries, barrier, results))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(sample[key] for sample in samples) / len(samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunks', type=int, default=200000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    modes = ['mmap', 'copy'] + (['faiss-mmap'] if importlib.util.find_spec('faiss') else [])
+
+    with tempfile.TemporaryDirectory() as directory:
+        size_mb = write_index(directory, args.chunks, args.dimension, 'faiss-mmap' in modes)
+        print(f"{args.chunks} chunks x {args.dimension} dims = {size_mb:.0f} MB of vectors, {args.workers} workers")
+        print(f"{'mode':<12} {'rss_mb':>8} {'pss_mb':>8} {'private_mb':>11}  (per worker, after opening the index)")
+        for mode in modes:
+            memory = run(directory, mode, args)
+            print(f"{mode:<12} {memory['rss_mb']:>8.1f} {memory['pss_mb']:>8.1f} {memory['private_mb']:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
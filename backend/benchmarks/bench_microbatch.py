@@ -0,0 +1,116 @@
+"""
+Benchmark: embedding + tìm kiếm vector cho câu hỏi đồng thời, có và không có micro-batching
+
+Mỗi luồng mô phỏng một request: embed câu hỏi rồi tìm top-k trong index của
+knowledge base (version hiện tại, hoặc index ngẫu nhiên nếu chưa build).
+In số câu hỏi/giây, độ trễ p50/p95 và histogram kích thước batch, thời gian chờ.
+
+Chạy từ thư mục backend:
+    python benchmarks/bench_microbatch.py --threads 16 --questions 512 --max-wait-ms 5
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.chatbot import rag_model  # noqa: E402
+from app.chatbot.batching import MicroBatcher, embed_batch, search_batch  # noqa: E402
+from app.chatbot.indexer import KnowledgeBaseIndexer, VectorIndex  # noqa: E402
+from app.chatbot.metrics import metrics  # noqa: E402
+
+QUESTIONS = [
+    'Phí vận chuyển là bao nhiêu?',
+    'Làm thế nào để theo dõi đơn hàng?',
+    'Chính sách đổi trả hàng như thế nào?',
+    'Làm sao để chọn size quần áo phù hợp?',
+    'Cửa hàng có bán áo khoác không?',
+    'Thanh toán bằng VNPay được không?',
+    'Bao lâu thì nhận được hàng?',
+    'Quần jeans có những size nào?',
+]
+
+
+def load_index(embeddings):
+    indexer = KnowledgeBaseIndexer(
+        rag_model.KNOWLEDGE_BASE_DIR, rag_model.FAISS_INDEX_PATH, embeddings, rag_model.EMBEDDINGS_INDEX_KEY
+    )
+    version, index = indexer.load()
+    if index is not None:
+        print(f"index: version {version}, {index.size} chunks")
+        return index
+    dimension = len(embeddings.embed_query('dimension'))
+    index = VectorIndex.empty(dimension)
+    count = 2000
+    index.add(list(range(1, count + 1)), np.random.rand(count, dimension).astype(np.float32),
+              [{'text': f'chunk {i}', 'source': 'random'} for i in range(1, count + 1)])
+    print(f"index: random, {count} chunks")
+    return index
+
+
+def run(threads, total, ask):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = max(1, total // threads)
+
+    def worker(index):
+        for i in range(per_thread):
+            start = time.perf_counter()
+            ask(QUESTIONS[(index + i) % len(QUESTIONS)])
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--questions', type=int, default=512)
+    parser.add_argument('--k', type=int, default=rag_model.TOP_K_RESULTS)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    embeddings = rag_model.get_embeddings()
+    index = load_index(embeddings)
+
+    def direct(question):
+        return index.search(embeddings.embed_query(question), args.k)
+
+    embed_batcher = MicroBatcher('embed', lambda questions: embed_batch(embeddings, questions),
+                                 max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000)
+    search_batcher = MicroBatcher('search', search_batch,
+                                  max_batch_size=args.max_batch, max_wait=args.max_wait_ms / 1000)
+
+    def batched(question):
+        return search_batcher.submit((index, embed_batcher.submit(question), args.k))
+
+    # Warm-up (tải tokenizer, cấp phát bộ nhớ)
+    direct(QUESTIONS[0])
+    batched(QUESTIONS[0])
+
+    print(f"threads={args.threads} questions={args.questions} max_batch={args.max_batch} max_wait={args.max_wait_ms}ms")
+    print(f"{'mode':<10} {'q/s':>8} {'p50_ms':>8} {'p95_ms':>8}")
+    for name, ask in (('direct', direct), ('batched', batched)):
+        rate, p50, p95 = run(args.threads, args.questions, ask)
+        print(f"{name:<10} {rate:>8.1f} {p50 * 1000:>8.1f} {p95 * 1000:>8.1f}")
+
+    for name, histogram in metrics.snapshot()['histograms'].items():
+        print(f"{name:<24} {histogram}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: thời gian khởi động và bộ nhớ của create_app() có và không có chatbot
+
+Mỗi cấu hình chạy trong một process mới (import lạnh), đo:
+- import_s: thời gian import package app
+- create_s: thời gian create_app()
+- warmup_s: thời gian warm-up chatbot đến trạng thái ready (nếu bật)
+- rss_mb: bộ nhớ tối đa của process
+
+Chạy từ thư mục backend (cần database cấu hình trong DATABASE_URI):
+    python benchmarks/bench_startup.py --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app()
+created = time.perf_counter()
+warmup = None
+if sys.argv[1] == 'warmup':
+    from app.chatbot.loader import loader
+    with application.app_context():
+        loader.warm_up()
+    warmup = time.perf_counter() - created
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'import_s': imported - started,
+    'create_s': created - imported,
+    'warmup_s': warmup,
+    'rss_mb': rss / 1024 if sys.platform != 'darwin' else rss / 1024 / 1024
+}))
+"""
+
+CASES = [
+    ('chatbot disabled', {'CHATBOT_ENABLED': 'false', 'CHATBOT_PRELOAD': 'false'}, 'none'),
+    ('chatbot lazy', {'CHATBOT_ENABLED': 'true', 'CHATBOT_PRELOAD': 'false'}, 'none'),
+    ('chatbot preload', {'CHATBOT_ENABLED': 'true', 'CHATBOT_PRELOAD': 'true'}, 'none'),
+    ('preload + warm-up', {'CHATBOT_ENABLED': 'true', 'CHATBOT_PRELOAD': 'true'}, 'warmup'),
+]
+
+
+def run_case(env_overrides, mode):
+    env = dict(os.environ, **env_overrides)
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, mode],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'case':<20} {'import_s':>9} {'create_s':>9} {'warmup_s':>9} {'rss_mb':>8}")
+    for name, env, mode in CASES:
+        runs = [run_case(env, mode) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['import_s'] + r['create_s'])
+        warmup = f"{best['warmup_s']:.2f}" if best['warmup_s'] is not None else '-'
+        print(f"{name:<20} {best['import_s']:>9.2f} {best['create_s']:>9.2f} {warmup:>9} {best['rss_mb']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
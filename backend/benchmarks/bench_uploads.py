@@ -0,0 +1,134 @@
+"""
+Benchmark: requests/sec khi phục vụ ảnh upload, trước và sau khi đổi cách phục vụ
+
+- before: send_from_directory + một dòng log mỗi request (cách cũ)
+- after: send_static (ETag mạnh, Cache-Control immutable)
+- after_304: trình duyệt đã có ảnh, gửi If-None-Match -> 304 không có body
+- after_accel: X-Accel-Redirect, nginx gửi file thay cho worker
+
+Chạy trong process bằng Flask test client nên chỉ đo chi phí của worker Python
+(không tính mạng). Để đo qua HTTP thật, chạy gunicorn rồi dùng --url.
+
+Chạy từ thư mục backend:
+    python benchmarks/bench_uploads.py --size 200 --requests 2000
+    python benchmarks/bench_uploads.py --url http://localhost:5000/uploads/<file> --concurrency 8
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, send_from_directory  # noqa: E402
+
+from app.utils.static_files import send_static  # noqa: E402
+
+FILENAME = '0123456789abcdef0123456789abcdef.jpg'
+
+
+def build_app(directory):
+    app = Flask(__name__)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app.logger.setLevel(logging.INFO)
+    app.logger.handlers = [logging.NullHandler()]
+    app.logger.propagate = False
+
+    @app.route('/before/<path:filename>')
+    def before(filename):
+        app.logger.info(f"Serving file: {filename}")
+        return send_from_directory(directory, filename)
+
+    @app.route('/after/<path:filename>')
+    def after(filename):
+        return send_static(directory, filename)
+
+    @app.route('/accel/<path:filename>')
+    def accel(filename):
+        return send_static(directory, filename, accel_prefix='/_uploads/')
+
+    return app
+
+
+def run(client, path, requests_count, headers=None):
+    start = time.perf_counter()
+    status = None
+    for _ in range(requests_count):
+        response = client.get(path, headers=headers or {})
+        response.get_data()
+        status = response.status_code
+        response.close()
+    elapsed = time.perf_counter() - start
+    return requests_count / elapsed, status
+
+
+def bench_in_process(size_kb, requests_count):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, FILENAME), 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+
+        app = build_app(directory)
+        client = app.test_client()
+        etag = client.get(f'/after/{FILENAME}').headers['ETag']
+
+        cases = [
+            ('before', f'/before/{FILENAME}', None),
+            ('after', f'/after/{FILENAME}', None),
+            ('after_304', f'/after/{FILENAME}', {'If-None-Match': etag}),
+            ('after_range', f'/after/{FILENAME}', {'Range': 'bytes=0-1023'}),
+            ('after_accel', f'/accel/{FILENAME}', None),
+        ]
+        print(f"file={size_kb}KB requests={requests_count}")
+        print(f"{'case':<12} {'status':>6} {'req/s':>10}")
+        for name, path, headers in cases:
+            rate, status = run(client, path, requests_count, headers)
+            print(f"{name:<12} {status:>6} {rate:>10.1f}")
+
+
+def bench_http(url, requests_count, concurrency, headers):
+    counts = [0] * concurrency
+    per_thread = max(1, requests_count // concurrency)
+
+    def worker(index):
+        for _ in range(per_thread):
+            request = urllib.request.Request(url, headers=headers)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+            except urllib.error.HTTPError as e:
+                if e.code != 304:
+                    raise
+            counts[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    print(f"{url} concurrency={concurrency}: {sum(counts) / elapsed:.1f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=200, help='file size in KB (in-process mode)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--url', help='benchmark a running server instead')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--if-none-match', help='send this ETag (HTTP mode)')
+    args = parser.parse_args()
+
+    if args.url:
+        headers = {'If-None-Match': args.if_none_match} if args.if_none_match else {}
+        bench_http(args.url, args.requests, args.concurrency, headers)
+    else:
+        bench_in_process(args.size, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,15 @@ set -e
 echo "Seeding database..."
 python seed_data.py
 
+# Build/update the chatbot vector index before the workers start, so they
+# load a ready version instead of embedding the knowledge base themselves.
+# Only new or changed knowledge base files are re-embedded (see rebuild_index.py).
+if [ "$(echo "${CHATBOT_ENABLED:-true}" | tr '[:upper:]' '[:lower:]')" = "true" ]; then
+    echo "Building chatbot index..."
+    python rebuild_index.py --no-test || echo "WARNING: chatbot index build failed, workers will retry on startup"
+fi
+
 # Start Gunicorn server
 echo "Starting application..."
-gunicorn -w 4 -b 0.0.0.0:5000 run:app
+# Số worker/thread, preload và warm-up chatbot: xem gunicorn.conf.py
+gunicorn -c gunicorn.conf.py run:app
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+"""
+Sinh biến thể responsive cho các ảnh sản phẩm chưa có image_variants.
+
+Ảnh upload mới được sinh biến thể trên worker nền; script dùng cho ảnh upload
+trước khi có image_variants hoặc khi worker bị dừng trước khi sinh xong:
+    cd /app && python generate_image_variants.py
+"""
+import os
+import sys
+
+os.environ.setdefault('CHATBOT_ENABLED', 'false')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app  # noqa: E402
+from app.services.image_service import ImageService  # noqa: E402
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        stored = ImageService.backfill_variants()
+        print(f"Stored variants for {stored} images")
@@ -0,0 +1,38 @@
+"""
+Cấu hình gunicorn
+
+preload_app: app (và embedding model của chatbot nếu CHATBOT_ENABLED) được tải
+một lần trong master trước khi fork, các worker dùng chung bộ nhớ copy-on-write
+thay vì mỗi worker tự tải model. Vector index và các thread pool được tạo trong
+từng worker sau khi fork (post_worker_init).
+
+worker_class: mặc định 'gthread'. Với GUNICORN_WORKER_CLASS=gevent mỗi worker
+giữ hàng nghìn kết nối, các request chờ LLM (nhất là /api/chatbot/ask/stream)
+không chiếm chỗ trong pool cố định workers x threads. gevent phải monkey-patch
+trước khi import app nên preload_app bị tắt trong chế độ này.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+# Mỗi worker phục vụ nhiều request, bcrypt (chạy trên pool riêng, nhả GIL) không chặn cả worker
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    preload_app = False
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Tokenizers của HuggingFace không an toàn khi fork sau khi đã dùng thread pool
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+if preload_app:
+    os.environ.setdefault('CHATBOT_PRELOAD', 'true')
+
+
+def post_worker_init(worker):
+    """Warm-up chatbot (vector index) trong nền ngay khi worker sẵn sàng"""
+    if os.environ.get('CHATBOT_WARMUP_ON_START', 'true').lower() != 'true':
+        return
+    from app.chatbot.loader import loader
+    loader.start_background()
@@ -0,0 +1,54 @@
+"""Add category closure table
+
+Revision ID: 3b8e5c1f9a27
+Revises: 0433e567776d
+Create Date: 2026-10-17 09:12:05.114362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b8e5c1f9a27'
+down_revision = '0433e567776d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.create_index('ix_category_closure_descendant', ['descendant_id', 'depth'], unique=False)
+
+    # Backfill from the existing parent_id adjacency list
+    connection = op.get_bind()
+    parents = dict(connection.execute(sa.text("SELECT id, parent_id FROM categories")).fetchall())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+            ancestor_id = parents.get(ancestor_id)
+            depth += 1
+    if rows:
+        closure = sa.table('category_closure',
+                           sa.column('ancestor_id', sa.Integer),
+                           sa.column('descendant_id', sa.Integer),
+                           sa.column('depth', sa.Integer))
+        op.bulk_insert(closure, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('category_closure', schema=None) as batch_op:
+        batch_op.drop_index('ix_category_closure_descendant')
+
+    op.drop_table('category_closure')
@@ -0,0 +1,41 @@
+"""Add product_search full-text table
+
+Revision ID: 8d2f4a6c1e39
+Revises: 5e1c9b7a3d28
+Create Date: 2026-10-18 09:12:37.402815
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4a6c1e39'
+down_revision = '5e1c9b7a3d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bảng cho SEARCH_BACKEND=database (app.search.DatabaseSearchBackend); MySQL không có backend này.
+    # IF NOT EXISTS: các bản trước tạo bảng lúc chạy ở lần tìm kiếm đầu tiên
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+            "USING fts5(name, category, description, tokenize='unicode61')"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS product_search ("
+            "product_id INTEGER PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_product_search_document "
+            "ON product_search USING GIN (document)"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('sqlite', 'postgresql'):
+        op.execute("DROP TABLE IF EXISTS product_search")
@@ -1,11 +1,17 @@
 #!/usr/bin/env python
 """
 Script to rebuild the vector store for the chatbot.
-This can be run manually when new knowledge base files are added.
+entrypoint.sh runs it (with --no-test) before starting gunicorn; it can also
+be run manually when new knowledge base files are added.
+
+Only new or modified knowledge base files are re-embedded; pass --full to
+re-embed everything (e.g. after changing the embeddings model). Running
+workers switch to the new index version without a restart.
 """
 
 import os
 import sys
+import argparse
 import logging
 from pathlib import Path
 
@@ -18,15 +24,39 @@ logger = logging.getLogger(__name__)
 backend_dir = Path(__file__).resolve().parent
 sys.path.insert(0, str(backend_dir))
 
+parser = argparse.ArgumentParser(description="Rebuild the chatbot vector store")
+parser.add_argument('--full', action='store_true', help="re-embed every knowledge base file")
+parser.add_argument('--no-test', action='store_true', help="skip the test question")
+args = parser.parse_args()
+
 try:
-    from app.chatbot.rag_model import get_chatbot_instance
+    from app.chatbot.rag_model import (
+        CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDINGS_INDEX_KEY, FAISS_INDEX_PATH, KNOWLEDGE_BASE_DIR,
+        get_chatbot_instance, get_embeddings
+    )
+    from app.chatbot.indexer import KnowledgeBaseIndexer
 
     logger.info("Starting vector store rebuild process...")
     
-    # Get a fresh instance with rebuild_index=True
-    chatbot = get_chatbot_instance(rebuild_index=True)
+    indexer = KnowledgeBaseIndexer(
+        KNOWLEDGE_BASE_DIR, FAISS_INDEX_PATH, get_embeddings(), EMBEDDINGS_INDEX_KEY,
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+    stats = indexer.update(full=args.full)
+    
+    if stats['created']:
+        logger.info(f"Vector store version {stats['version']} created in {stats['seconds']:.2f}s")
+        logger.info(f"Files added: {stats['files_added']}, changed: {stats['files_changed']}, "
+                    f"removed: {stats['files_removed']}, unchanged: {stats['files_unchanged']}")
+        logger.info(f"Chunks added: {stats['chunks_added']}, removed: {stats['chunks_removed']}, "
+                    f"total: {stats['total_chunks']}")
+    else:
+        logger.info(f"Knowledge base unchanged, keeping version {stats['version']}")
+    
+    if args.no_test:
+        sys.exit(0)
     
-    logger.info("Vector store rebuild completed successfully!")
+    chatbot = get_chatbot_instance()
     
     # Test the chatbot with a simple question
     test_question = "Làm thế nào để theo dõi đơn hàng?"
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""
+Hủy các đơn VNPay chưa thanh toán quá STOCK_RESERVATION_TIMEOUT và hoàn lại tồn kho.
+
+Các worker đã tự làm việc này khi có checkout (tối đa mỗi
+STOCK_RESERVATION_SWEEP_INTERVAL giây); script dùng để chạy định kỳ bằng cron
+khi ít checkout, ví dụ mỗi phút:
+    * * * * * cd /app && python release_reservations.py
+"""
+import os
+import sys
+
+os.environ.setdefault('CHATBOT_ENABLED', 'false')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app  # noqa: E402
+from app.services.inventory_service import InventoryService  # noqa: E402
+
+app = create_app()
+
+if __name__ == '__main__':
+    with app.app_context():
+        total = 0
+        while True:
+            expired = InventoryService.expire_reservations()
+            total += len(expired)
+            if not expired:
+                break
+        print(f"Released {total} expired reservations")
@@ -1,6 +1,6 @@
 from app import create_app, db
 from app.models.user import User
-from app.models.category import Category
+from app.models.category import Category, CategoryClosure
 from app.models.product import Product
 from app.utils.security import generate_password_hash
 import random
@@ -80,6 +80,8 @@ def seed_categories():
     
     db.session.commit()
     
+    CategoryClosure.rebuild()
+    
     print(f"Đã thêm {Category.query.count()} danh mục")
 
 def seed_products():
@@ -316,6 +318,7 @@ if __name__ == "__main__":
         # Xóa dữ liệu cũ
         print("Xóa dữ liệu cũ...")
         Product.query.delete()
+        CategoryClosure.query.delete()
         Category.query.delete()
         User.query.delete()
         db.session.commit()
@@ -0,0 +1,85 @@
+"""
+Fixture dùng chung cho test: app với SQLite tạm, client và dữ liệu mẫu
+
+Chạy từ thư mục backend:
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('CHATBOT_ENABLED', 'false')
+
+from app import create_app, db, search  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.models.category import Category  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.services.auth_service import AuthService  # noqa: E402
+from app.utils import security  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        QUERY_BUDGET_STRICT = True
+        CHATBOT_ENABLED = False
+        BCRYPT_LOG_ROUNDS = 4
+        BCRYPT_POOL_SIZE = 0
+
+    # Trạng thái dùng chung trong process (chỉ mục tìm kiếm, cache quyền admin) không được lẫn giữa các test
+    search._backend = None
+    security._admin_status_cache.clear()
+    application = create_app(TestConfig)
+    with application.app_context():
+        yield application
+        db.session.remove()
+    search._backend = None
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    counter = iter(range(1, 10 ** 6))
+
+    def make(is_admin=False):
+        n = next(counter)
+        user = User(name=f'User {n}', email=f'user-{n}@example.com', password_hash='-', is_admin=is_admin)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def auth_headers(app):
+    def headers(user):
+        return {'Authorization': f'Bearer {AuthService.create_access_token(user)}'}
+    return headers
+
+
+@pytest.fixture
+def make_products(app):
+    def make(count, sizes=None, stock=100, name='Áo thun'):
+        category = Category(name=f'Danh mục {Category.query.count() + 1}')
+        db.session.add(category)
+        db.session.flush()
+        products = []
+        for i in range(count):
+            product = Product(name=f'{name} {i}', price=100000 + i, stock=stock, category_id=category.id)
+            product.set_sizes(sizes)
+            products.append(product)
+        db.session.add_all(products)
+        db.session.commit()
+        return products
+    return make
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from app import db
+from app.models.product import Product
+from app.services.auth_service import AuthService
+from app.utils.query_counter import assert_query_budget
+
+PRODUCT = {'name': 'Áo sơ mi', 'price': 250000, 'category_id': None, 'sizes': ['S', 'M']}
+
+
+def test_create_and_update_product_as_admin(client, make_user, make_products, auth_headers):
+    category_id = make_products(1)[0].category_id
+    headers = auth_headers(make_user(is_admin=True))
+
+    response = client.post('/api/products', json={**PRODUCT, 'category_id': category_id}, headers=headers)
+    assert response.status_code == 201
+    product_id = response.get_json()['id']
+
+    response = client.put(f'/api/products/{product_id}', json={'price': 200000}, headers=headers)
+    assert response.status_code == 200
+    assert db.session.get(Product, product_id).price == 200000
+
+
+def test_product_writes_require_admin(client, make_user, auth_headers):
+    headers = auth_headers(make_user())
+    assert client.post('/api/products', json=PRODUCT, headers=headers).status_code == 403
+    assert client.put('/api/products/1', json={'price': 1}, headers=headers).status_code == 403
+
+
+def test_demoted_admin_token_is_revoked(client, make_user, make_products, auth_headers):
+    product = make_products(1)[0]
+    admin = make_user(is_admin=True)
+    headers = auth_headers(admin)
+    assert client.put(f'/api/products/{product.id}', json={'stock': 5}, headers=headers).status_code == 200
+
+    AuthService.set_admin_status(admin, False)
+    response = client.put(f'/api/products/{product.id}', json={'stock': 6}, headers=headers)
+    assert response.status_code == 403
+    response = client.post('/api/products', json={**PRODUCT, 'category_id': product.category_id}, headers=headers)
+    assert response.status_code == 403
+
+    # Cấp lại quyền: token cũ vẫn bị thu hồi vì token_version đã đổi
+    AuthService.set_admin_status(admin, True)
+    response = client.put(f'/api/products/{product.id}', json={'stock': 6}, headers=headers)
+    assert response.status_code == 401
+    assert client.put(f'/api/products/{product.id}', json={'stock': 6}, headers=auth_headers(admin)).status_code == 200
+
+
+def test_update_missing_product_is_not_found(client, make_user, auth_headers):
+    response = client.put('/api/products/999', json={'price': 1}, headers=auth_headers(make_user(is_admin=True)))
+    assert response.status_code == 404
+
+
+def test_admin_check_uses_cached_status(client, make_user, auth_headers):
+    headers = auth_headers(make_user(is_admin=True))
+    assert client.get('/api/admin/check', headers=headers).get_json()['is_admin']
+
+    # Trạng thái admin đã cache: không truy vấn bảng users
+    with assert_query_budget(0):
+        response = client.get('/api/admin/check', headers=headers)
+    assert response.status_code == 200
+    assert 'user' not in response.get_json()
+
+    payload = client.get('/api/admin/check?include=user', headers=headers).get_json()
+    assert payload['user']['email'] == 'user-1@example.com'
+
+
+def test_admin_check_rejects_non_admin_and_revoked_token(client, make_user, auth_headers):
+    assert client.get('/api/admin/check', headers=auth_headers(make_user())).status_code == 403
+
+    admin = make_user(is_admin=True)
+    headers = auth_headers(admin)
+    AuthService.set_admin_status(admin, False)
+    AuthService.set_admin_status(admin, True)
+    assert client.get('/api/admin/check', headers=headers).status_code == 401
+
+
+def size_stock(product_id):
+    product = db.session.get(Product, product_id)
+    return product.stock, {row.size: row.stock for row in product.size_rows}
+
+
+@pytest.mark.parametrize('form', [False, True])
+def test_stock_follows_per_size_stock(client, make_user, make_products, auth_headers, form):
+    product_id = make_products(1)[0].id
+    headers = auth_headers(make_user(is_admin=True))
+    url = f'/api/admin/products/{product_id}' if form else f'/api/products/{product_id}'
+
+    def put(data):
+        if form:
+            data = {key: json.dumps(value) if key == 'sizes' else str(value) for key, value in data.items()}
+            return client.put(url, data=data, headers=headers)
+        return client.put(url, json=data, headers=headers)
+
+    assert put({'sizes': {'S': 2, 'M': 3}}).status_code == 200
+    assert size_stock(product_id) == (5, {'S': 2, 'M': 3})
+
+    # Tồn kho tổng không được ghi riêng khi mỗi size có tồn kho
+    response = put({'stock': 50})
+    assert response.status_code == 400
+    assert 'sizes' in response.get_json()['error']
+    db.session.expire_all()
+    assert size_stock(product_id) == (5, {'S': 2, 'M': 3})
+
+    assert put({'sizes': {'S': 4, 'M': 3}, 'stock': 7}).status_code == 200
+    assert size_stock(product_id) == (7, {'S': 4, 'M': 3})
+    assert put({'sizes': {'S': 1, 'M': 1}, 'stock': 7}).status_code == 400
+
+    # Size không có tồn kho riêng dùng tồn kho của sản phẩm
+    assert put({'sizes': ['S', 'M'], 'stock': 9}).status_code == 200
+    assert size_stock(product_id) == (9, {'S': None, 'M': None})
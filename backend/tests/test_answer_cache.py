@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.chatbot import answer_cache
+from app.chatbot.answer_cache import SemanticAnswerCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_expired_best_match_falls_back_to_valid_entry(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, 'monotonic', clock)
+    cache = SemanticAnswerCache(threshold=0.9, ttl=60)
+
+    cache.store([1.0, 0.3, 0.0], 'phí vận chuyển là bao nhiêu', 'cũ')
+    clock.now += 30
+    cache.store([1.0, -0.3, 0.0], 'phí ship bao nhiêu', 'mới')
+    question = np.array([1.0, 0.1, 0.0])
+    assert cache.lookup(question)['answer'] == 'cũ'
+
+    # Câu gần nhất hết hạn: dùng câu gần thứ hai còn hạn thay vì trả về miss
+    clock.now += 31
+    result = cache.lookup(question)
+    assert result is not None and result['answer'] == 'mới'
+
+    clock.now += 30
+    assert cache.lookup(question) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
@@ -0,0 +1,75 @@
+import pytest
+
+from app import db
+from app.models.cart import Cart, CartItem
+from app.models.product import Product
+
+
+@pytest.fixture
+def duplicate_lines(make_user, make_products):
+    """Giỏ có hai dòng cùng (product_id, size), như dữ liệu ghi trước khi add_item gộp dòng"""
+    user = make_user()
+    product = make_products(1, sizes=['M'], stock=5)[0]
+    cart = Cart(user_id=user.id)
+    db.session.add(cart)
+    db.session.flush()
+    rows = [CartItem(user_id=user.id, cart_id=cart.id, product_id=product.id, size='M', quantity=2) for _ in range(2)]
+    db.session.add_all(rows)
+    db.session.commit()
+    Cart.recalculate([cart.id])
+    db.session.commit()
+    return user, product.id, [row.id for row in rows]
+
+
+def patch(client, headers, operations):
+    return client.patch('/api/cart/items', json={'operations': operations}, headers=headers)
+
+
+@pytest.mark.parametrize('operation', [
+    {'op': 'remove'},
+    {'op': 'size', 'size': 'M'},
+])
+def test_operation_on_duplicate_line(client, auth_headers, duplicate_lines, operation):
+    user, _, item_ids = duplicate_lines
+    response = patch(client, auth_headers(user), [dict(operation, item_id=item_ids[0])])
+    assert response.status_code == 200, response.get_json()
+    payload = response.get_json()
+    assert [item['id'] for item in payload['items']] == [item_ids[1]]
+    assert payload['total_items'] == (2 if operation['op'] == 'remove' else 4)
+
+
+def test_stock_check_sums_duplicate_lines(client, auth_headers, duplicate_lines):
+    user, product_id, item_ids = duplicate_lines
+    headers = auth_headers(user)
+
+    # 2 + 2 + 2 > 5: mỗi dòng riêng lẻ vẫn dưới tồn kho
+    response = patch(client, headers, [{'op': 'add', 'product_id': product_id, 'quantity': 2, 'size': 'M'}])
+    assert response.status_code == 400
+    assert 'stock' in response.get_json()['error']
+    response = patch(client, headers, [{'op': 'update', 'item_id': item_ids[0], 'quantity': 4}])
+    assert response.status_code == 400
+
+    response = patch(client, headers, [{'op': 'add', 'product_id': product_id, 'quantity': 1, 'size': 'M'}])
+    assert response.status_code == 200
+    assert response.get_json()['total_items'] == 5
+
+
+def test_untouched_line_over_stock_does_not_block_other_operations(client, auth_headers, make_user, make_products):
+    user = make_user()
+    first, second = make_products(2, sizes=['M'], stock=5)
+    headers = auth_headers(user)
+    for product in (first, second):
+        response = patch(client, headers, [{'op': 'add', 'product_id': product.id, 'quantity': 3, 'size': 'M'}])
+        assert response.status_code == 200
+    item_ids = {item['product_id']: item['id'] for item in response.get_json()['items']}
+
+    # Tồn kho của sản phẩm thứ nhất giảm xuống dưới số lượng trong giỏ
+    db.session.get(Product, first.id).stock = 1
+    db.session.commit()
+
+    response = patch(client, headers, [{'op': 'remove', 'item_id': item_ids[second.id]}])
+    assert response.status_code == 200, response.get_json()
+    response = patch(client, headers, [{'op': 'update', 'item_id': item_ids[first.id], 'quantity': 2}])
+    assert response.status_code == 200, response.get_json()
+    response = patch(client, headers, [{'op': 'update', 'item_id': item_ids[first.id], 'quantity': 3}])
+    assert response.status_code == 400
@@ -0,0 +1,67 @@
+import zlib
+
+import numpy as np
+import pytest
+
+from app import db
+from app.chatbot.catalog import CatalogIndex
+from app.models.catalog_change import CatalogChange
+from app.models.product import Product
+
+
+class FakeEmbeddings:
+    """Vector cố định theo nội dung văn bản, không cần model"""
+
+    def embed_query(self, text):
+        return np.random.default_rng(zlib.crc32(text.encode('utf-8'))).random(8).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def rename(product_id, name, change_id):
+    """Đổi tên sản phẩm và ghi thay đổi với id cho trước (id do sequence cấp lúc INSERT)"""
+    db.session.get(Product, product_id).name = name
+    db.session.add(CatalogChange(id=change_id, product_id=product_id, op=CatalogChange.UPSERT))
+    db.session.commit()
+
+
+def found(index, question):
+    return {product_id for product_id, _ in index.keywords.search(question, limit=10)}
+
+
+@pytest.fixture
+def catalog(app, make_products):
+    first, second = make_products(2)
+    index = CatalogIndex(FakeEmbeddings())
+    index.rebuild()
+    return index, first.id, second.id
+
+
+def test_sync_applies_change_committed_after_a_higher_id(catalog):
+    index, first_id, second_id = catalog
+
+    # Giao dịch giữ id 11 commit trước giao dịch giữ id 10
+    rename(first_id, 'Quần jeans', change_id=11)
+    assert index.sync(force=True) == 1
+    assert index.last_change_id == 11
+
+    rename(second_id, 'Áo khoác', change_id=10)
+    assert index.sync(force=True) == 1
+    assert found(index, 'jeans') == {first_id}
+    assert found(index, 'khoac') == {second_id}
+
+    # Đã áp dụng thì không đọc lại
+    assert index.sync(force=True) == 0
+
+
+def test_rebuild_does_not_skip_change_committed_late(catalog):
+    index, first_id, second_id = catalog
+    rename(first_id, 'Quần jeans', change_id=11)
+    index.rebuild()
+    assert index.last_change_id == 11
+
+    rename(second_id, 'Áo khoác', change_id=10)
+    assert index.sync(force=True) == 1
+    assert found(index, 'khoac') == {second_id}
+    assert index.sync(force=True) == 0
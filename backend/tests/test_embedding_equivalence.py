@@ -0,0 +1,63 @@
+"""
+Top-k chunk của knowledge base tìm bằng từng embedding backend phải gần như
+trùng với torch (cùng phép đo overlap@k với benchmarks/bench_embeddings.py)
+
+Bỏ qua khi thiếu torch / sentence-transformers / onnxruntime hoặc không tải
+được model (máy không có mạng và chưa có cache).
+"""
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from app.chatbot import rag_model
+from app.chatbot.embeddings import BACKENDS, ONNX, ONNX_INT8, TORCH, create_embeddings
+
+K = 5
+MIN_OVERLAP = 0.9
+
+pytest.importorskip('torch')
+pytest.importorskip('sentence_transformers')
+pytest.importorskip('langchain')
+
+
+def load_benchmark():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'bench_embeddings.py')
+    spec = importlib.util.spec_from_file_location('bench_embeddings', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+bench = load_benchmark()
+
+
+def embed(backend, chunks):
+    try:
+        embeddings = create_embeddings(backend, rag_model.EMBEDDINGS_MODEL, str(rag_model.EMBEDDINGS_CACHE_DIR))
+    except Exception as e:
+        pytest.skip(f"{backend} model unavailable: {e}")
+    documents = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    queries = np.asarray([embeddings.embed_query(question) for question in bench.QUESTIONS], dtype=np.float32)
+    return documents, queries
+
+
+@pytest.fixture(scope='module')
+def chunks():
+    return bench.knowledge_base_chunks()
+
+
+@pytest.fixture(scope='module')
+def baseline(chunks):
+    return bench.top_k(*embed(TORCH, chunks), min(K, len(chunks)))
+
+
+@pytest.mark.parametrize('backend', [backend for backend in BACKENDS if backend != TORCH])
+def test_top_k_overlap_with_torch(backend, chunks, baseline):
+    if backend in (ONNX, ONNX_INT8):
+        pytest.importorskip('onnxruntime')
+    k = min(K, len(chunks))
+    ranked = bench.top_k(*embed(backend, chunks), k)
+    overlap = np.mean([len(set(row) & set(base_row)) / k for row, base_row in zip(ranked, baseline)])
+    assert overlap >= MIN_OVERLAP, f"{backend}: overlap@{k} = {overlap:.3f}"
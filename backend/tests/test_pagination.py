@@ -0,0 +1,58 @@
+import pytest
+
+from app.search import get_search_backend
+from app.utils.pagination import MAX_CURSOR_LIMIT
+
+
+@pytest.mark.parametrize('limit', [0, -3, MAX_CURSOR_LIMIT + 1])
+def test_cursor_limit_out_of_range(client, make_products, limit):
+    make_products(3)
+    response = client.get(f'/api/products?cursor=&limit={limit}')
+    assert response.status_code == 400
+    assert 'limit' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('url', [
+    '/api/admin/orders?cursor=&limit=0',
+    '/api/admin/users?cursor=&limit=-3',
+])
+def test_admin_cursor_limit_out_of_range(client, make_user, auth_headers, url):
+    response = client.get(url, headers=auth_headers(make_user(is_admin=True)))
+    assert response.status_code == 400
+
+
+def test_cursor_pages_cover_every_product(client, make_products):
+    ids = {product.id for product in make_products(7)}
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        payload = client.get(f'/api/products?cursor={cursor}&limit=3&sort=price_asc').get_json()
+        seen += [item['id'] for item in payload['items']]
+        cursor = payload['next_cursor']
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(ids)
+
+
+def test_invalid_cursor(client, make_products):
+    make_products(1)
+    assert client.get('/api/products?cursor=not-a-cursor&limit=3').status_code == 400
+
+
+def test_search_cursor_pages_follow_relevance(client, make_products):
+    make_products(3, name='Áo thun thun')
+    make_products(4, name='Áo thun trắng dài tay')
+    make_products(2, name='Quần jeans')
+    with client.application.app_context():
+        expected = [product_id for product_id, _ in get_search_backend().search('thun')]
+    assert len(expected) == 7
+
+    # ?search= mặc định sort=relevance: cursor mang (thứ hạng, id)
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get(f'/api/products?search=thun&cursor={cursor}&limit=3')
+        assert response.status_code == 200, response.get_json()
+        payload = response.get_json()
+        seen += [item['id'] for item in payload['items']]
+        cursor = payload['next_cursor']
+    assert seen == expected
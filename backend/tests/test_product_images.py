@@ -0,0 +1,116 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app import db
+from app.models.product import Product
+from app.services.image_service import ImageService
+from app.services.product_service import ProductService
+
+
+@pytest.fixture
+def product_with_image(app, make_products):
+    product = make_products(1)[0]
+    path = os.path.join(app.config['UPLOAD_FOLDER'], 'old-image.jpg')
+    with open(path, 'wb') as f:
+        f.write(b'old')
+    product.image_url = 'uploads/old-image.jpg'
+    db.session.commit()
+    return product, path
+
+
+def failing_commit(monkeypatch):
+    def commit():
+        raise RuntimeError('commit failed')
+    monkeypatch.setattr(db.session, 'commit', commit)
+
+
+def test_delete_product_keeps_image_when_commit_fails(monkeypatch, product_with_image):
+    product, path = product_with_image
+    product_id = product.id
+    failing_commit(monkeypatch)
+    with pytest.raises(RuntimeError):
+        ProductService.delete_product(product_id)
+    assert os.path.exists(path)
+
+    monkeypatch.undo()
+    db.session.rollback()
+    ProductService.delete_product(product_id)
+    assert not os.path.exists(path)
+    assert db.session.get(Product, product_id) is None
+
+
+def test_update_product_keeps_old_image_when_commit_fails(monkeypatch, product_with_image):
+    product, path = product_with_image
+    product_id = product.id
+    image = FileStorage(io.BytesIO(b'new'), filename='new.jpg')
+    save_upload = staticmethod(lambda image_file: 'new-image.jpg')
+
+    monkeypatch.setattr(ImageService, 'save_upload', save_upload)
+    failing_commit(monkeypatch)
+    with pytest.raises(RuntimeError):
+        ProductService.update_product(product_id, {}, image)
+    assert os.path.exists(path)
+
+    monkeypatch.undo()
+    monkeypatch.setattr(ImageService, 'save_upload', save_upload)
+    db.session.rollback()
+    ProductService.update_product(product_id, {}, image)
+    assert not os.path.exists(path)
+    assert db.session.get(Product, product_id).image_url == 'uploads/new-image.jpg'
+
+
+def png_upload(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (500, 300), color).save(buffer, format='PNG')
+    buffer.seek(0)
+    return FileStorage(buffer, filename='photo.png')
+
+
+@pytest.fixture
+def run_variants_inline(monkeypatch):
+    """Sinh biến thể ngay trong lời gọi thay vì trên worker nền"""
+    class Inline:
+        def submit(self, task):
+            task()
+    monkeypatch.setattr(ImageService, '_get_executor', staticmethod(lambda: Inline()))
+
+
+def test_upload_stores_variant_map(app, make_products, run_variants_inline):
+    category_id = make_products(1)[0].category_id
+    product = ProductService.create_product('Áo khoác', 300000, category_id, image_file=png_upload())
+
+    srcset = product.to_dict()['image_srcset']
+    assert sorted(srcset) == ['jpeg', 'webp']
+    assert sorted(srcset['webp']) == ['200', '400', '500']
+    assert all(os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], path.replace('uploads/', '', 1)))
+               for path in srcset['webp'].values())
+
+    # Ảnh mới: bản đồ biến thể của ảnh cũ bị bỏ cho tới khi biến thể mới sẵn sàng
+    product = ProductService.update_product(product.id, {}, png_upload('blue'))
+    assert product.image_variants is not None
+    assert product.to_dict()['image_srcset'] != srcset
+
+
+def test_serializing_products_does_not_touch_image_files(monkeypatch, client, product_with_image):
+    def fail(*args, **kwargs):
+        raise AssertionError('filesystem access while serializing')
+    monkeypatch.setattr(ImageService, 'schedule_variants', staticmethod(fail))
+    monkeypatch.setattr(os.path, 'exists', fail)
+    monkeypatch.setattr('builtins.open', fail)
+
+    payload = client.get('/api/products').get_json()
+    assert payload['items'][0]['image_srcset'] is None
+
+
+def test_backfill_generates_missing_variants(app, product_with_image):
+    product, path = product_with_image
+    Image.new('RGB', (300, 200), 'green').save(path, format='JPEG')
+
+    assert ImageService.backfill_variants() == 1
+    db.session.expire_all()
+    assert sorted(db.session.get(Product, product.id).to_dict()['image_srcset']['jpeg']) == ['200', '300']
+    assert ImageService.backfill_variants() == 0
@@ -0,0 +1,108 @@
+"""
+Số query của các endpoint danh sách không phụ thuộc số bản ghi trả về
+
+App chạy với QUERY_BUDGET_STRICT nên route vượt @query_budget trả về 500
+ngay ở request đầu (cache nguội); request thứ hai được đo lại bằng
+assert_query_budget với ngân sách khai báo trên route.
+"""
+import pytest
+
+from app import db
+from app.models.cart import CartItem
+from app.models.user import User
+from app.services.cart_service import CartService
+from app.services.order_service import OrderService
+from app.utils.query_counter import assert_query_budget
+
+SHIPPING = {
+    'shipping_address': '1 Đường Lê Lợi, Hà Nội',
+    'shipping_city': 'Hà Nội',
+    'shipping_phone': '0900000000',
+    'payment_method': 'cod',
+}
+
+
+def place_orders(user_id, product_ids, count):
+    for i in range(count):
+        CartService.add_item(user_id, product_ids[i % len(product_ids)], quantity=1, size='M')
+        cart_items = CartItem.query.filter_by(user_id=user_id).all()
+        OrderService.create_order_from_cart(user_id=user_id, cart_items=cart_items, **SHIPPING)
+        # Mỗi request dùng một session mới (các dòng giỏ đã bị xóa bằng DELETE trực tiếp)
+        db.session.remove()
+
+
+@pytest.fixture
+def catalog(make_products):
+    return make_products(30, sizes=['S', 'M', 'L'])
+
+
+@pytest.fixture
+def shopper(make_user, catalog):
+    user_id = make_user().id
+    product_ids = [product.id for product in catalog]
+    place_orders(user_id, product_ids, 12)
+    for product_id in product_ids[:10]:
+        CartService.add_item(user_id, product_id, quantity=1, size='S')
+    return db.session.get(User, user_id)
+
+
+@pytest.fixture
+def admin(make_user):
+    return make_user(is_admin=True)
+
+
+def assert_within_budget(app, client, url, headers=None):
+    """Request nguội phải thành công (strict mode), request ấm đo lại bằng assert_query_budget"""
+    adapter = app.url_map.bind('localhost')
+    endpoint, _ = adapter.match(url.split('?')[0], method='GET')
+    budget = app.view_functions[endpoint].query_budget
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    db.session.remove()
+
+    with assert_query_budget(budget):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.mark.parametrize('url', [
+    '/api/products?limit=50',
+    '/api/products?limit=50&sort=price_asc',
+    '/api/products?limit=50&search=ao thun',
+    '/api/products?limit=50&search=thun&sort=name_desc',
+    '/api/products?limit=50&cursor=&count=exact',
+])
+def test_product_list_budget(app, client, catalog, url):
+    payload = assert_within_budget(app, client, url)
+    assert len(payload['items']) == 30
+    assert payload['items'][0]['sizes'] == ['S', 'M', 'L']
+
+
+def test_product_search_on_cold_worker(app, client, catalog):
+    # Lần tìm kiếm đầu tiên dựng chỉ mục; chi phí đó không tính vào ngân sách của request
+    response = client.get('/api/products?search=thun&limit=5')
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['total'] == 30
+
+
+def test_cart_budget(app, client, shopper, auth_headers):
+    payload = assert_within_budget(app, client, '/api/cart', auth_headers(shopper))
+    assert payload['total_items'] == 10
+
+
+def test_orders_budget(app, client, shopper, auth_headers):
+    payload = assert_within_budget(app, client, '/api/orders?limit=20', auth_headers(shopper))
+    assert len(payload['items']) == 12
+
+
+@pytest.mark.parametrize('url', [
+    '/api/orders/admin?limit=20',
+    '/api/admin/products?limit=50',
+    '/api/admin/orders?limit=20',
+    '/api/admin/dashboard',
+    '/api/admin/dashboard/timeseries?days=30',
+])
+def test_admin_budget(app, client, shopper, admin, auth_headers, url):
+    assert_within_budget(app, client, url, auth_headers(admin))
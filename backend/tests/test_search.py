@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.models.product import Product
+from app.search import get_search_backend
+from app.search.memory_index import InvertedIndex
+
+
+def found(backend, query):
+    return {product_id for product_id, _ in backend.search(query)}
+
+
+def test_local_write_does_not_hide_other_workers_changes(app, make_products):
+    first, second = make_products(2)
+    first_id, second_id = first.id, second.id
+    backend = get_search_backend()
+    backend.refresh_interval = 0
+    assert found(backend, 'thun') == {first_id, second_id}
+
+    # Worker khác đổi tên sản phẩm thứ nhất (chỉ mục của worker này không biết)
+    db.session.execute(
+        db.update(Product).where(Product.id == first_id)
+        .values(name='Quần jeans', updated_at=datetime.utcnow() + timedelta(seconds=1))
+    )
+    db.session.commit()
+
+    # Worker này ghi sản phẩm thứ hai và cập nhật chỉ mục tại chỗ
+    second = db.session.get(Product, second_id)
+    second.name = 'Áo khoác'
+    db.session.commit()
+    backend.index_product(second)
+
+    assert found(backend, 'jeans') == {first_id}
+    assert found(backend, 'khoac') == {second_id}
+
+
+def test_index_errors_do_not_raise_into_write_path(app, make_products):
+    make_products(1)
+    backend = get_search_backend()
+    backend.search('thun')
+
+    backend.index_products([object()])
+    assert not backend._built
+    backend.search('thun')
+    assert backend._built
+
+    backend.index.remove = None
+    backend.remove_product(1)
+    assert not backend._built
+
+
+def test_rebuild_swaps_in_a_complete_index(app, make_products, monkeypatch):
+    make_products(3)
+    backend = get_search_backend()
+    assert len(found(backend, 'thun')) == 3
+    live = backend.index
+
+    # Trong lúc dựng, chỉ mục đang phục vụ không bị xóa hay sửa
+    seen_during_build = []
+    original_add = InvertedIndex.add
+
+    def add(index, doc_id, fields):
+        seen_during_build.append(len(live.search('thun')))
+        return original_add(index, doc_id, fields)
+    monkeypatch.setattr(InvertedIndex, 'add', add)
+    backend.rebuild()
+
+    assert seen_during_build == [3, 3, 3]
+    assert backend.index is not live
+    assert len(found(backend, 'thun')) == 3
@@ -0,0 +1,47 @@
+import importlib.util
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app import db, search
+from app.search import get_search_backend
+from app.search.backends import DatabaseSearchBackend, InMemorySearchBackend
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'migrations', 'versions', '8d2f4a6c1e39_add_product_search_table.py'
+)
+
+
+def run_migration(step):
+    spec = importlib.util.spec_from_file_location('product_search_migration', MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with db.engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            getattr(module, step)()
+
+
+def use_backend(app, name):
+    app.config['SEARCH_BACKEND'] = name
+    search._backend = None
+    return get_search_backend()
+
+
+def test_database_backend_requires_migration(app, make_products):
+    make_products(2)
+    backend = use_backend(app, 'database')
+    assert isinstance(backend, InMemorySearchBackend)
+    assert not db.inspect(db.engine).has_table('product_search')
+
+
+def test_database_backend_after_migration(app, make_products):
+    products = make_products(2)
+    run_migration('upgrade')
+    backend = use_backend(app, 'database')
+    assert isinstance(backend, DatabaseSearchBackend)
+    assert {product_id for product_id, _ in backend.search('thun')} == {product.id for product in products}
+
+    run_migration('downgrade')
+    assert not db.inspect(db.engine).has_table('product_search')
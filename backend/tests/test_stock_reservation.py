@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.cart import CartItem
+from app.models.order import Order, OrderStatus, PaymentStatus
+from app.models.product import Product
+from app.services.cart_service import CartService
+from app.services.inventory_service import InventoryService
+from app.services.order_service import OrderService
+from app.services.payment_service import PaymentService
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SHIPPING = {
+    'shipping_address': '1 Đường Lê Lợi, Hà Nội',
+    'shipping_city': 'Hà Nội',
+    'shipping_phone': '0900000000',
+    'payment_method': 'vnpay',
+}
+
+
+@pytest.fixture
+def expired_order(make_user, make_products):
+    """Đơn VNPay 2 sản phẩm đã quá hạn thanh toán; tồn kho còn 3"""
+    user_id = make_user().id
+    product_id = make_products(1, stock=5)[0].id
+    CartService.add_item(user_id, product_id, quantity=2)
+    cart_items = CartItem.query.filter_by(user_id=user_id).all()
+    order_id = OrderService.create_order_from_cart(user_id=user_id, cart_items=cart_items, **SHIPPING).id
+    db.session.execute(
+        db.update(Order).where(Order.id == order_id).values(reserved_until=datetime.utcnow() - timedelta(minutes=1))
+    )
+    db.session.commit()
+    db.session.remove()
+    return order_id, product_id
+
+
+def stock(product_id):
+    return db.session.query(Product.stock).filter(Product.id == product_id).scalar()
+
+
+def sweep_in_other_worker(app):
+    result = []
+
+    def run():
+        with app.app_context():
+            result.extend(InventoryService.expire_reservations())
+            db.session.remove()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result
+
+
+def test_payment_after_sweep_reads_current_order(app, expired_order):
+    order_id, product_id = expired_order
+    # Request thanh toán đã đọc đơn (còn giữ hàng) trước khi lượt quét hủy đơn
+    loaded = db.session.get(Order, order_id)
+    assert loaded.stock_reserved
+    assert sweep_in_other_worker(app) == [order_id]
+
+    order = PaymentService.process_payment_result(order_id, True, 'TXN-1')
+    assert order is loaded
+    assert order.payment_status == PaymentStatus.PAID.value
+    assert order.status == OrderStatus.PENDING.value
+    assert order.stock_reserved and not order.reservation_expired
+    assert stock(product_id) == 3
+
+
+def test_sweep_skips_paid_order(app, expired_order):
+    order_id, product_id = expired_order
+    PaymentService.process_payment_result(order_id, True, 'TXN-1')
+    assert sweep_in_other_worker(app) == []
+    order = db.session.get(Order, order_id)
+    assert order.status == OrderStatus.PENDING.value and order.stock_reserved
+    assert stock(product_id) == 3
+
+
+def test_late_payment_does_not_reopen_order_cancelled_by_customer(app, expired_order):
+    order_id, product_id = expired_order
+    OrderService.update_order_status(order_id, OrderStatus.CANCELLED.value)
+    db.session.remove()
+
+    order = PaymentService.process_payment_result(order_id, True, 'TXN-1')
+    assert order.payment_status == PaymentStatus.PAID.value
+    assert order.status == OrderStatus.CANCELLED.value
+    assert not order.stock_reserved
+    assert stock(product_id) == 5
+
+
+def test_concurrent_checkout_does_not_oversell():
+    result = subprocess.run(
+        [sys.executable, 'benchmarks/stress_stock.py', '--buyers', '40', '--threads', '8', '--stock', '10',
+         '--sizes', 'S', 'M'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert 'No oversell' in result.stdout
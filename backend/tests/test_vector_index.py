@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.chatbot.indexer import VectorIndex
+
+
+def docs(ids):
+    return [{'text': f'chunk {chunk_id}', 'source': 'a.txt'} for chunk_id in ids]
+
+
+def brute_force(vectors, ids, query, k):
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:k]
+    return [f'chunk {ids[position]}' for position in order], distances[order]
+
+
+def test_search_matches_brute_force_after_remove():
+    rng = np.random.default_rng(0)
+    vectors = rng.random((40, 16), dtype=np.float32)
+    ids = np.arange(1, 41)
+    index = VectorIndex.empty(16)
+    index.add(list(ids), vectors, docs(ids))
+    index.remove([5, 6, 7])
+
+    keep = ~np.isin(ids, [5, 6, 7])
+    queries = rng.random((3, 16), dtype=np.float32)
+    for query, hits in zip(queries, index.search_batch(queries, 5)):
+        texts, distances = brute_force(vectors[keep], ids[keep], query, 5)
+        assert [hit['text'] for hit in hits] == texts
+        assert np.allclose([hit['score'] for hit in hits], distances, atol=1e-4)
+    assert len(index.search(queries[0], 100)) == 37
+    assert np.allclose(index.reconstruct(10), vectors[9])
+
+
+def test_saved_index_is_memory_mapped(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.random((20, 8), dtype=np.float32)
+    ids = list(range(1, 21))
+    index = VectorIndex.empty(8)
+    index.add(ids, vectors, docs(ids))
+    index.save(tmp_path)
+
+    shared = VectorIndex.load(tmp_path)
+    assert isinstance(shared.vectors, np.memmap)
+    assert not shared.vectors.flags.writeable
+    query = rng.random(8, dtype=np.float32)
+    assert shared.search(query, 3) == index.search(query, 3)
+
+    # Bản sao riêng (indexer) sửa được, version đang mở không đổi
+    private = VectorIndex.load(tmp_path, mmap=False)
+    private.remove([1])
+    private.add([99], query.reshape(1, -1), docs([99]))
+    assert private.search(query, 1)[0]['text'] == 'chunk 99'
+    assert shared.size == 20 and private.size == 20
+
+
+def test_empty_index_round_trip(tmp_path):
+    VectorIndex.empty(8).save(tmp_path)
+    index = VectorIndex.load(tmp_path)
+    assert index.size == 0
+    assert index.search(np.ones(8, dtype=np.float32), 3) == []
@@ -1,5 +1,5 @@
 from app import create_app, db
-from app.models.category import Category
+from app.models.category import Category, CategoryClosure
 from app.models.product import Product
 
 app = create_app()
@@ -16,6 +16,7 @@ def update_categories():
             db.session.commit()
             
             print("Xóa các danh mục hiện có...")
+            CategoryClosure.query.delete()
             Category.query.delete()
             db.session.commit()
         except Exception as e:
@@ -254,6 +255,9 @@ def update_categories():
         db.session.add_all(products)
         db.session.commit()
         
+        # Dựng lại closure table cho cây danh mục mới
+        CategoryClosure.rebuild()
+        
         print(f"Đã tạo thành công {Category.query.count()} danh mục và {Product.query.count()} sản phẩm!")
         print("Hệ thống đã được cập nhật thành cửa hàng quần áo nam!")
 
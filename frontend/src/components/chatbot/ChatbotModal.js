@@ -3,6 +3,7 @@ import { Modal, Button, Form, Spinner } from 'react-bootstrap';
 import { FaRobot, FaPaperPlane, FaTrash } from 'react-icons/fa';
 import './ChatbotModal.css';
 import axios from 'axios';
+import { streamChatMessage } from '../../services/chatbotService';
 
 // API URL constant - adjust if you have it in a constants file
 const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
@@ -186,28 +187,54 @@ const ChatbotModal = ({ show, onHide }) => {
     setIsLoading(true);
     setError(null);
 
+    // Tin nhắn của bot được hiển thị dần theo từng token
+    const botTimestamp = new Date();
+    let streamed = '';
+    const updateBotMessage = (fields) => {
+      setMessages(prev => prev.map(msg => (msg.timestamp === botTimestamp ? { ...msg, ...fields } : msg)));
+    };
+
     try {
-      // Send request to backend with session ID if available
-      console.log(`Sending question to ${API_URL}/chatbot/ask with session ID: ${backendSessionId}`);
-      const response = await axios.post(`${API_URL}/chatbot/ask`, {
-        question: userMessage.text,
-        session_id: backendSessionId || undefined
-      });
+      let result;
+      try {
+        result = await streamChatMessage(API_URL, userMessage.text, backendSessionId, (text) => {
+          if (!streamed) {
+            setIsLoading(false);
+            setMessages(prev => [...prev, { text: '', sender: 'bot', timestamp: botTimestamp, sources: [] }]);
+          }
+          streamed += text;
+          updateBotMessage({ text: streamed });
+        });
+      } catch (streamError) {
+        if (streamed) throw streamError;
+        // Trình duyệt hoặc server không hỗ trợ streaming: gọi API thường
+        console.warn('Streaming unavailable, falling back to /chatbot/ask:', streamError);
+        const response = await axios.post(`${API_URL}/chatbot/ask`, {
+          question: userMessage.text,
+          session_id: backendSessionId || undefined
+        });
+        result = response.data;
+      }
 
-      console.log('Chatbot response:', response.data);
+      console.log('Chatbot response:', result);
       
       // Save or update backend session ID if provided in response
-      if (response.data.session_id) {
-        setBackendSessionId(response.data.session_id);
+      if (result.session_id) {
+        setBackendSessionId(result.session_id);
       }
 
-      // Add bot response to chat
-      setMessages(prev => [...prev, {
-        text: response.data.answer,
+      const botMessage = {
+        text: result.answer,
         sender: 'bot',
-        timestamp: new Date(),
-        sources: response.data.sources || []
-      }]);
+        timestamp: botTimestamp,
+        sources: result.sources || [],
+        isError: result.isError && !(result.sources || []).length
+      };
+      if (streamed) {
+        updateBotMessage(botMessage);
+      } else {
+        setMessages(prev => [...prev, botMessage]);
+      }
     } catch (err) {
       console.error('Error getting chatbot response:', err);
       setError('Xin lỗi, tôi không thể xử lý câu hỏi của bạn lúc này. Vui lòng thử lại sau.');
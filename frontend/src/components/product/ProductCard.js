@@ -1,6 +1,6 @@
 import React, { useState, useCallback, useEffect, useContext } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { formatImageUrl } from '../../utils/imageUtils';
+import { formatImageUrl, buildSrcSet } from '../../utils/imageUtils';
 import { CartContext } from '../../context/CartContext';
 import { AuthContext } from '../../context/AuthContext';
 import { toast } from 'react-toastify';
@@ -9,6 +9,8 @@ import './ProductCard.css';
 
 // Ảnh mặc định khi không có ảnh
 const DEFAULT_IMAGE = 'https://via.placeholder.com/300x400?text=No+Image';
+// Chiều rộng hiển thị của ảnh trong thẻ sản phẩm, để trình duyệt chọn biến thể phù hợp
+const CARD_IMAGE_SIZES = '(max-width: 576px) 50vw, (max-width: 992px) 33vw, 25vw';
 // Sizes mặc định nếu sản phẩm không có sizes cụ thể
 const DEFAULT_SIZES = ['S', 'M', 'L', 'XL', 'XXL'];
 
@@ -36,6 +38,12 @@ const ProductCard = React.memo(({ product }) => {
     }
   }, [product.image_url]);
   
+  // Biến thể responsive (WebP + JPEG) nếu backend đã sinh xong
+  const srcset = product.image_srcset;
+  const useVariants = Boolean(srcset) && imageSrc !== DEFAULT_IMAGE;
+  const webpSrcSet = useVariants ? buildSrcSet(srcset.webp) : '';
+  const jpegSrcSet = useVariants ? buildSrcSet(srcset.jpeg) : '';
+  
   // Xử lý sự kiện khi ảnh tải xong
   const handleImageLoad = useCallback(() => {
     setImageLoaded(true);
@@ -101,13 +109,19 @@ const ProductCard = React.memo(({ product }) => {
               </div>
             </div>
           )}
-          <img 
-            src={imageSrc}
-            className={`card-img-top ${imageLoaded ? 'visible' : 'hidden'}`}
-            alt={product.name}
-            onLoad={handleImageLoad}
-            onError={handleImageError}
-          />
+          <picture>
+            {webpSrcSet && <source type="image/webp" srcSet={webpSrcSet} sizes={CARD_IMAGE_SIZES} />}
+            <img 
+              src={imageSrc}
+              srcSet={jpegSrcSet || undefined}
+              sizes={jpegSrcSet ? CARD_IMAGE_SIZES : undefined}
+              loading="lazy"
+              className={`card-img-top ${imageLoaded ? 'visible' : 'hidden'}`}
+              alt={product.name}
+              onLoad={handleImageLoad}
+              onError={handleImageError}
+            />
+          </picture>
         </div>
         <div className="card-body d-flex flex-column">
           <h5 className="card-title">{product.name}</h5>
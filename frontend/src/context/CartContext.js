@@ -1,5 +1,5 @@
-import React, { createContext, useState, useEffect, useCallback, useContext } from 'react';
-import { getCart, addToCart, updateCartItem, removeFromCart, clearCart as clearCartAPI, updateCartItemSize } from '../services/cartService';
+import React, { createContext, useState, useEffect, useCallback, useContext, useRef } from 'react';
+import { getCart, addToCart, updateCartItem, updateCartItems, removeFromCart, clearCart as clearCartAPI, updateCartItemSize } from '../services/cartService';
 import { getProductById } from '../services/productService';
 import { AuthContext } from './AuthContext';
 import NotificationModal from '../components/common/NotificationModal';
@@ -12,6 +12,48 @@ export const CartProvider = ({ children }) => {
   const [loading, setLoading] = useState(true);
   const [tempCart, setTempCart] = useState(null); // Giỏ hàng tạm thời cho người dùng chưa đăng nhập
   const { isAuthenticated, user } = useContext(AuthContext);
+  // Version của giỏ hàng trên server mà state hiện tại phản ánh (null: chưa biết)
+  const cartVersion = useRef(null);
+
+  // Thay toàn bộ giỏ hàng bằng dữ liệu từ GET /cart
+  const setFullCart = useCallback((cartData) => {
+    cartVersion.current = cartData && cartData.version !== undefined ? cartData.version : null;
+    setCart(cartData);
+  }, []);
+
+  // Áp dụng phản hồi delta của một thao tác (dòng thay đổi, dòng bị xóa, tổng mới, version mới).
+  // Nếu version không nối tiếp version đang giữ (thao tác từ tab khác, phản hồi đến lệch thứ tự)
+  // thì tải lại toàn bộ giỏ hàng.
+  const syncCart = useCallback(async (delta) => {
+    if (!delta || delta.version === undefined) return;
+
+    if (cartVersion.current === null || delta.version !== cartVersion.current + 1) {
+      const cartData = await getCart();
+      if (cartData && cartData.items) {
+        setFullCart(cartData);
+      }
+      return;
+    }
+
+    cartVersion.current = delta.version;
+    const removedIds = delta.removed_ids || [];
+    setCart(prevCart => {
+      let items = (prevCart.items || []).filter(item => !removedIds.includes(item.id));
+      if (delta.item) {
+        const index = items.findIndex(item => item.id === delta.item.id);
+        items = index === -1
+          ? [...items, delta.item]
+          : items.map(item => (item.id === delta.item.id ? delta.item : item));
+      }
+      return {
+        ...prevCart,
+        items,
+        total: delta.total,
+        total_items: delta.total_items,
+        version: delta.version
+      };
+    });
+  }, [setFullCart]);
   
   // State for notification modal
   const [notification, setNotification] = useState({
@@ -128,7 +170,7 @@ export const CartProvider = ({ children }) => {
               });
             }
             
-            setCart(cartData);
+            setFullCart(cartData);
             
             // Nếu có giỏ hàng tạm thời, đồng bộ với giỏ hàng từ API
             const localCart = localStorage.getItem('tempCart');
@@ -177,9 +219,15 @@ export const CartProvider = ({ children }) => {
     const syncTempCart = async () => {
       if (isAuthenticated && tempCart && tempCart.items && tempCart.items.length > 0) {
         try {
-          // Thêm từng sản phẩm trong giỏ hàng tạm thời vào giỏ hàng chính
-          for (const item of tempCart.items) {
-            await addToCart(item.product_id, item.quantity);
+          // Thêm mọi sản phẩm trong giỏ hàng tạm thời vào giỏ hàng chính trong một request
+          const cartData = await updateCartItems(tempCart.items.map(item => ({
+            op: 'add',
+            product_id: item.product_id,
+            quantity: item.quantity,
+            size: item.size || ''
+          })));
+          if (cartData && cartData.items) {
+            setFullCart(cartData);
           }
           
           // Xóa giỏ hàng tạm thời
@@ -194,13 +242,13 @@ export const CartProvider = ({ children }) => {
     if (isAuthenticated && tempCart) {
       syncTempCart();
     }
-  }, [isAuthenticated, tempCart]);
+  }, [isAuthenticated, tempCart, setFullCart]);
 
   // Lắng nghe sự kiện user-logout để xóa giỏ hàng
   useEffect(() => {
     const handleLogout = () => {
       console.log('Logout detected, clearing cart data');
-      setCart({ items: [], total: 0, total_items: 0 });
+      setFullCart({ items: [], total: 0, total_items: 0 });
       localStorage.removeItem('cart');
       localStorage.removeItem('tempCart');
     };
@@ -278,15 +326,8 @@ export const CartProvider = ({ children }) => {
         // Then make API call in background
         updateCartItem(existingItem.id, newQuantity)
           .then(response => {
-            // If API response is different from our optimistic update, correct it
-            if (response && response.items) {
-              setCart(prevCart => ({
-                ...prevCart,
-                items: response.items,
-                total: response.total || 0,
-                total_items: response.total_items || 0
-              }));
-            }
+            // Thay dữ liệu optimistic bằng dòng và tổng từ server
+            syncCart(response);
           })
           .catch(err => {
             console.error('Error updating cart item:', err);
@@ -308,16 +349,9 @@ export const CartProvider = ({ children }) => {
         
         console.log('Add to cart response:', response);
         
-        // Cập nhật giỏ hàng
-        if (response && response.items) {
-          console.log('Updating cart with new items:', response.items);
-          
-          setCart(prevCart => ({
-            ...prevCart,
-            items: response.items,
-            total: response.total || 0,
-            total_items: response.total_items || 0
-          }));
+        // Cập nhật giỏ hàng với dòng vừa thêm
+        if (response && response.item) {
+          await syncCart(response);
           
           return Promise.resolve({ success: true });
         } else {
@@ -343,7 +377,7 @@ export const CartProvider = ({ children }) => {
     } finally {
       setLoading(false);
     }
-  }, [isAuthenticated, cart, updateCartItem]);
+  }, [isAuthenticated, cart, syncCart]);
 
   const updateItem = useCallback(async (itemId, quantity) => {
     if (!isAuthenticated || quantity < 1) return;
@@ -374,15 +408,8 @@ export const CartProvider = ({ children }) => {
         // Then perform API call in background without blocking UI
         updateCartItem(itemId, quantity)
           .then(response => {
-            // If API response is different from our optimistic update, correct the state
-            if (response && response.items) {
-              setCart(prevCart => ({
-                ...prevCart,
-                items: response.items,
-                total: response.total || 0,
-                total_items: response.total_items || 0
-              }));
-            }
+            // Thay dữ liệu optimistic bằng dòng và tổng từ server
+            syncCart(response);
           })
           .catch(err => {
             console.error('Error updating cart item:', err);
@@ -400,22 +427,14 @@ export const CartProvider = ({ children }) => {
         // Item not found in local cart, force API call and wait for response
         setLoading(true);
         const response = await updateCartItem(itemId, quantity);
-        
-        if (response && response.items) {
-          setCart(prevCart => ({
-            ...prevCart,
-            items: response.items,
-            total: response.total || 0,
-            total_items: response.total_items || 0
-          }));
-        }
+        await syncCart(response);
         setLoading(false);
       }
     } catch (err) {
       console.error('Error updating cart item:', err);
       toast.error('Không thể cập nhật sản phẩm');
     }
-  }, [isAuthenticated, cart]);
+  }, [isAuthenticated, cart, syncCart]);
 
   // Cập nhật kích thước của sản phẩm trong giỏ hàng
   const updateItemSize = useCallback(async (itemId, newSize) => {
@@ -445,14 +464,9 @@ export const CartProvider = ({ children }) => {
         // Call API to update the size
         const response = await updateCartItemSize(itemId, newSize);
         
-        if (response && response.items) {
-          // Update cart with the response from API
-          setCart(prevCart => ({
-            ...prevCart,
-            items: response.items,
-            total: response.total || 0,
-            total_items: response.total_items || 0
-          }));
+        if (response && response.version !== undefined) {
+          // Dòng đã đổi size (có thể đã gộp vào dòng khác cùng size) và tổng mới
+          await syncCart(response);
           
           toast.success('Đã cập nhật kích thước sản phẩm');
         }
@@ -467,13 +481,13 @@ export const CartProvider = ({ children }) => {
       try {
         const cartData = await getCart();
         if (cartData && cartData.items) {
-          setCart(cartData);
+          setFullCart(cartData);
         }
       } catch (reloadErr) {
         console.error('Error reloading cart after update failure:', reloadErr);
       }
     }
-  }, [isAuthenticated, cart]);
+  }, [isAuthenticated, cart, syncCart, setFullCart]);
 
   const removeItem = useCallback(async (itemId) => {
     if (!isAuthenticated) return;
@@ -501,15 +515,8 @@ export const CartProvider = ({ children }) => {
         // Then perform API call in background
         removeFromCart(itemId)
           .then(response => {
-            // If API response is different from our optimistic update, correct it
-            if (response && response.items) {
-              setCart(prevCart => ({
-                ...prevCart,
-                items: response.items,
-                total: response.total || 0,
-                total_items: response.total_items || 0
-              }));
-            }
+            // Tổng mới từ server
+            syncCart(response);
             
             // Show success message after API call completes
             toast.success('Đã xóa sản phẩm khỏi giỏ hàng');
@@ -534,100 +541,57 @@ export const CartProvider = ({ children }) => {
       console.error('Error removing item from cart:', err);
       toast.error('Không thể xóa sản phẩm');
     }
-  }, [isAuthenticated, cart.items]);
+  }, [isAuthenticated, cart.items, syncCart]);
 
-  // Xóa những sản phẩm đã chọn khỏi giỏ hàng (sau khi thanh toán)
+  // Bỏ những sản phẩm đã đặt khỏi giỏ hàng (sau khi thanh toán).
+  // Server đã xóa các dòng này khi tạo đơn (OrderService.create_order_from_cart), nên chỉ
+  // cập nhật giao diện ngay rồi tải lại giỏ hàng để lấy tổng và version mới, không gửi thao tác xóa.
   const removeSelectedItems = useCallback(async (itemIds, silent = false) => {
     if (!isAuthenticated || !itemIds || itemIds.length === 0) return;
 
+    // Chuyển đổi tất cả IDs sang chuỗi để so sánh nhất quán
+    const stringItemIds = itemIds.map(id => String(id));
+    const itemsToKeep = cart.items.filter(item => !stringItemIds.includes(String(item.id)));
+    let cartData = {
+      items: itemsToKeep,
+      total: itemsToKeep.reduce((sum, item) => sum + (item.product?.price || 0) * item.quantity, 0),
+      total_items: itemsToKeep.reduce((sum, item) => sum + item.quantity, 0)
+    };
+
     try {
-      // Chuyển đổi tất cả IDs sang chuỗi để so sánh nhất quán
-      const stringItemIds = itemIds.map(id => String(id));
-      
-      // Lưu lại danh sách các sản phẩm trước khi xóa để có thể khôi phục nếu có lỗi
-      const originalItems = [...cart.items];
-      
-      // Tách riêng các sản phẩm cần xóa và các sản phẩm cần giữ lại
-      const itemsToRemove = cart.items.filter(item => stringItemIds.includes(String(item.id)));
-      const itemsToKeep = cart.items.filter(item => !stringItemIds.includes(String(item.id)));
-      
-      // Ghi log để debug
-      console.log(`Removing ${itemsToRemove.length} items, keeping ${itemsToKeep.length} items`);
-      
-      // Đếm chính xác số lượng sản phẩm còn lại
-      const newTotalItems = itemsToKeep.reduce((sum, item) => sum + item.quantity, 0);
-      console.log(`New total items count: ${newTotalItems}`);
-      
-      // Gọi API để xóa từng sản phẩm đã chọn
-      const removePromises = itemsToRemove.map(item => 
-        removeFromCart(item.id).catch(error => {
-          console.error(`Lỗi khi xóa sản phẩm ${item.id}:`, error);
-          return null;
-        })
-      );
-      
-      // Chờ tất cả các API call hoàn thành
-      await Promise.all(removePromises);
-      
-      // Sau khi xóa trên server, cập nhật state với thông tin chính xác
-      setCart({
-        items: itemsToKeep,
-        total: itemsToKeep.reduce((sum, item) => sum + (item.product?.price || 0) * item.quantity, 0),
-        total_items: newTotalItems
-      });
-      
-      // Lưu vào localStorage để đồng bộ
-      localStorage.setItem('cart', JSON.stringify({
-        items: itemsToKeep,
-        total: itemsToKeep.reduce((sum, item) => sum + (item.product?.price || 0) * item.quantity, 0),
-        total_items: newTotalItems
-      }));
-      
-      // Phát một event để cập nhật badge số lượng giỏ hàng
-      window.dispatchEvent(new CustomEvent('cart-updated', { 
-        detail: { count: newTotalItems } 
-      }));
-      
-      // Thông báo thành công nếu không ở chế độ im lặng
-      if (!silent) {
-        toast.success('Đã xóa sản phẩm đã mua khỏi giỏ hàng');
+      const serverCart = await getCart();
+      if (serverCart && serverCart.items) {
+        cartData = serverCart;
       }
-      
     } catch (err) {
-      console.error('Error removing selected items from cart:', err);
-      
-      // Chỉ hiển thị thông báo lỗi nếu không ở chế độ im lặng
-      if (!silent) {
-        toast.error('Không thể xóa sản phẩm đã chọn, vui lòng thử lại');
-      }
-      
-      // Tải lại giỏ hàng để đồng bộ với server
-      try {
-        const cartData = await getCart();
-        if (cartData && cartData.items) {
-          setCart(cartData);
-          
-          // Cập nhật badge giỏ hàng
-          const newCount = cartData.total_items || 0;
-          window.dispatchEvent(new CustomEvent('cart-updated', { 
-            detail: { count: newCount } 
-          }));
-        }
-      } catch (reloadErr) {
-        console.error('Error reloading cart after removal failure:', reloadErr);
-      }
+      console.error('Error reloading cart after checkout:', err);
+    }
+
+    setFullCart(cartData);
+    
+    // Lưu vào localStorage để đồng bộ
+    localStorage.setItem('cart', JSON.stringify(cartData));
+    
+    // Phát một event để cập nhật badge số lượng giỏ hàng
+    window.dispatchEvent(new CustomEvent('cart-updated', { 
+      detail: { count: cartData.total_items || 0 } 
+    }));
+    
+    // Thông báo thành công nếu không ở chế độ im lặng
+    if (!silent) {
+      toast.success('Đã xóa sản phẩm đã mua khỏi giỏ hàng');
     }
-  }, [isAuthenticated, cart, removeFromCart, getCart]);
+  }, [isAuthenticated, cart, setFullCart]);
 
   const clearCartItems = useCallback(async (silent = false) => {
     if (!isAuthenticated) return;
 
     try {
       setLoading(true);
-      await clearCartAPI();
+      const response = await clearCartAPI();
       
       // Reset state
-      setCart({ items: [], total: 0, total_items: 0 });
+      setFullCart({ items: [], total: 0, total_items: 0, version: response ? response.version : undefined });
       
       // Only show notification if not in silent mode
       if (!silent) {
@@ -644,7 +608,7 @@ export const CartProvider = ({ children }) => {
     } finally {
       setLoading(false);
     }
-  }, [isAuthenticated]);
+  }, [isAuthenticated, setFullCart]);
 
   return (
     <CartContext.Provider
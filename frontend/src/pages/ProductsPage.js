@@ -496,6 +496,7 @@ const ProductsPage = () => {
                   onChange={(e) => handleFilterChange('sort', e.target.value)}
                   className="mb-3"
                 >
+                  {filters.search && <option value="relevance">Liên quan nhất</option>}
                   <option value="newest">Mới nhất</option>
                   <option value="price_asc">Giá tăng dần</option>
                   <option value="price_desc">Giá giảm dần</option>
@@ -570,6 +571,7 @@ const ProductsPage = () => {
                           onClick={() => handleFilterChange('sort', 'newest')}
                         >
                           Sắp xếp: {
+                            filters.sort === 'relevance' ? 'Liên quan nhất' :
                             filters.sort === 'price_asc' ? 'Giá tăng dần' :
                             filters.sort === 'price_desc' ? 'Giá giảm dần' :
                             filters.sort === 'name_asc' ? 'Tên A-Z' :
@@ -609,6 +611,7 @@ const ProductsPage = () => {
                 className="form-select-sm"
                 style={{ width: 'auto' }}
               >
+                {filters.search && <option value="relevance">Liên quan nhất</option>}
                 <option value="newest">Mới nhất</option>
                 <option value="price_asc">Giá tăng dần</option>
                 <option value="price_desc">Giá giảm dần</option>
@@ -25,12 +25,20 @@ const AdminLayout = () => {
           const response = await api.get('/admin/check');
           
           if (response && response.is_admin) {
+            // /admin/check không trả thông tin người dùng: dùng bản đã lưu lúc đăng nhập
+            let adminUser = null;
+            try {
+              adminUser = JSON.parse(localStorage.getItem('adminUser'));
+            } catch (e) {
+              adminUser = null;
+            }
+            adminUser = response.user || adminUser || { name: 'Admin', is_admin: true };
             setIsLoggedIn(true);
-            setUser(response.user || { name: 'Admin', is_admin: true });
+            setUser(adminUser);
             
             // Cập nhật thông tin admin trong localStorage
             localStorage.setItem('adminLoggedIn', 'true');
-            localStorage.setItem('adminUser', JSON.stringify(response.user || { name: 'Admin', is_admin: true }));
+            localStorage.setItem('adminUser', JSON.stringify(adminUser));
           } else {
             throw new Error('Không có quyền admin');
           }
@@ -35,7 +35,8 @@ const AdminLogin = () => {
         
         // Kiểm tra quyền admin
         try {
-          const adminCheck = await api.get('/admin/check');
+          // Lấy kèm thông tin người dùng một lần khi đăng nhập; các lần kiểm tra sau không cần
+          const adminCheck = await api.get('/admin/check?include=user');
           
           if (adminCheck && adminCheck.is_admin) {
             // Lưu thông tin admin
@@ -182,7 +182,7 @@ export const checkAdminStatus = async () => {
     }
     
     console.log('Checking admin status with token:', cleanToken.substring(0, 10) + '...');
-    const response = await api.get('/admin/check');
+    const response = await api.get('/admin/check?include=user');
     console.log('Admin check response:', response);
     
     // Kiểm tra cấu trúc response
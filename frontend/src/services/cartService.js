@@ -109,6 +109,19 @@ export const updateCartItem = async (itemId, quantity) => {
   }
 };
 
+// Nhiều thao tác trong một request: [{ op: 'add', product_id, quantity, size }, { op: 'update', item_id, quantity },
+// { op: 'size', item_id, size }, { op: 'remove', item_id }]; trả về toàn bộ giỏ hàng sau khi áp dụng
+export const updateCartItems = async (operations) => {
+  try {
+    const response = await api.patch('/cart/items', { operations });
+    console.log('Batch cart update response:', response);
+    return response;
+  } catch (error) {
+    console.error('Batch cart update error:', error);
+    throw error;
+  }
+};
+
 export const updateCartItemSize = async (itemId, size) => {
   try {
     const response = await api.put(`/cart/items/${itemId}/size`, { size });
@@ -15,6 +15,62 @@ export const sendChatMessage = async (question) => {
   }
 };
 
+/**
+ * Ask the chatbot and receive the answer as it is generated (Server-Sent Events)
+ * @param {string} baseUrl - API base URL (e.g. http://localhost:5000/api)
+ * @param {string} question - The user's question
+ * @param {string} [sessionId] - Backend chat session ID
+ * @param {Function} onToken - Called with each piece of the answer
+ * @returns {Promise<Object>} Final "done"/"error" event: answer, sources, session_id, timings
+ */
+export const streamChatMessage = async (baseUrl, question, sessionId, onToken) => {
+  const response = await fetch(`${baseUrl}/chatbot/ask/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ question, session_id: sessionId || undefined })
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Mỗi event kết thúc bằng một dòng trống
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      raw.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'token') {
+        onToken(payload.text);
+      } else if (event === 'done' || event === 'error') {
+        result = { ...payload, isError: event === 'error' };
+      }
+    }
+  }
+
+  if (!result) {
+    throw new Error('Stream ended without an answer');
+  }
+  return result;
+};
+
 export default {
-  sendChatMessage
-}; 
\ No newline at end of file
+  sendChatMessage,
+  streamChatMessage
+};
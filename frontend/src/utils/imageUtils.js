@@ -39,9 +39,27 @@ export const formatImageUrl = (imageUrl, fallbackUrl = 'https://via.placeholder.
     finalUrl = `${apiUrl}/uploads/${trimmedUrl}`;
   }
   
-  // Thêm timestamp để tránh cache
-  const timestamp = new Date().getTime();
-  return `${finalUrl}?t=${timestamp}`;
+  // Không thêm timestamp: file upload có tên duy nhất (hash nội dung/uuid) và được cache immutable
+  return finalUrl;
+};
+
+/**
+ * Tạo chuỗi srcset từ bản đồ biến thể ảnh của backend ({ '200': 'uploads/variants/...', ... })
+ * Biến thể được đặt tên theo hash nội dung nên không cần thêm timestamp chống cache
+ *
+ * @param {Object} variants - Bản đồ chiều rộng -> URL của một định dạng
+ * @returns {string} - Chuỗi srcset, rỗng nếu không có biến thể
+ */
+export const buildSrcSet = (variants) => {
+  if (!variants || typeof variants !== 'object') {
+    return '';
+  }
+
+  const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+  return Object.entries(variants)
+    .sort(([a], [b]) => Number(a) - Number(b))
+    .map(([width, url]) => `${apiUrl}/${url.replace(/^\/+/, '')} ${width}w`)
+    .join(', ');
 };
 
 /**